@@ -0,0 +1,396 @@
+"""Benchmark of the evaluation hot paths on synthetic pages.
+
+Generates DIBCO-like pages (black text on white, grayscale) and MSBin-like pages (color coded ground truth with two
+foreground classes and uncertain regions) at several resolutions and measures for each FGType:
+    images_per_sec    throughput of FolderMeasure.batch_measure (the fastest of --repeat runs)
+    peak_rss_mb       peak resident memory of the (fresh) process, which evaluated the case
+    stages            time per image of decode, masking, counting and aggregation (the steps of
+                      f_measure.PerformanceMeasure), or decode (including the weights) and scoring for the DIBCO metrics
+
+Additionally, the import time of the evaluation modules is measured (the startup of short evaluation tasks). Importing
+them must not load the modules, which are only needed on demand (LAZY_MODULES).
+
+The results are written as JSON. A later run can be compared against such a baseline with --compare, which reports
+the cases whose throughput dropped (or whose memory grew) by more than the tolerance.
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import math
+import shutil
+import platform
+import subprocess
+import argparse
+import tempfile
+import contextlib
+import multiprocessing
+import concurrent.futures
+import cv2
+import numpy as np
+import constants
+import f_measure
+import dibco_measure
+import dibco_weights
+import binar_eval
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows:
+    resource = None
+
+BENCHMARK_VERSION = 1
+DEFAULT_MEGAPIXELS = [1, 10, 100]
+DEFAULT_NUM_PAGES = 3
+DEFAULT_REPEAT = 3
+DEFAULT_TOLERANCE = 0.1
+
+DATASET_DIBCO = 'dibco'
+DATASET_MSBIN = 'msbin'
+# The FGTypes evaluated on the pages of each dataset:
+DATASET_FG_TYPES = {DATASET_DIBCO: [constants.FGType.REGULAR],
+                    DATASET_MSBIN: [constants.FGType.MSBIN_FG_1, constants.FGType.MSBIN_FG_2]}
+
+# The startup time is measured for importing these modules, which must not load the modules in LAZY_MODULES (see
+# binar_eval.FolderMeasure.batch_measure):
+STARTUP_MODULES = ['f_measure', 'binar_eval']
+LAZY_MODULES = ['matplotlib', 'tqdm', 'dibco_measure', 'tiled_measure']
+STARTUP_CODE = 'import sys, time; t = time.perf_counter(); import %s; print(time.perf_counter() - t); print(" ".join(sys.modules))'
+
+# Colors (BGR) of the MSBin ground truth, see f_measure.gt_masks:
+MSBIN_FG_1_COLOR = (255, 255, 255)
+MSBIN_FG_2_COLOR = (122, 122, 122)
+MSBIN_IGNORE_COLOR = (255, 0, 0)
+
+# A4 aspect ratio:
+PAGE_ASPECT = math.sqrt(2)
+TEXT_TILE_SIZE = 1024
+NOISE_TILE_SIZE = 1024
+
+def page_shape(megapixels: float):
+    h = int(round(math.sqrt(megapixels * 1e6 * PAGE_ASPECT)))
+    return h, int(round(megapixels * 1e6 / h))
+
+def text_tile(rng, size: int = TEXT_TILE_SIZE):
+    # Boolean foreground of random text lines:
+    tile = np.zeros((size, size), np.uint8)
+    letters = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    for y in range(40, size, 48):
+        words = [''.join(rng.choice(list(letters), rng.integers(2, 9))) for _ in range(12)]
+        cv2.putText(tile, ' '.join(words), (int(rng.integers(0, 40)), y), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 255, 2)
+    # putText antialiases the strokes:
+    return tile > 127
+
+def tiled(tile, shape, rng):
+    # Repeats the tile over the page, starting at a random offset:
+    reps = (shape[0] // tile.shape[0] + 2, shape[1] // tile.shape[1] + 2)
+    y, x = rng.integers(0, tile.shape[0]), rng.integers(0, tile.shape[1])
+    return np.tile(tile, reps)[y:y + shape[0], x:x + shape[1]]
+
+def result_mask(gt, rng):
+    """Simulates a binarization result: the strokes are thickened or thinned and speckle noise is added."""
+    kernel = np.ones((3, 3), np.uint8)
+    if rng.random() < 0.5:
+        fg = cv2.dilate(gt.view(np.uint8), kernel) > 0
+    else:
+        fg = cv2.erode(gt.view(np.uint8), kernel) > 0
+    noise = rng.random((NOISE_TILE_SIZE, NOISE_TILE_SIZE)) < 0.002
+    fg ^= tiled(noise, gt.shape, rng)
+
+    return fg
+
+def dibco_page(shape, rng):
+    """Returns the DIBCO-like pair (img, gt) of grayscale images with black foreground."""
+    gt = tiled(text_tile(rng), shape, rng)
+    img = result_mask(gt, rng)
+
+    return np.where(img, 0, 255).astype(np.uint8), np.where(gt, 0, 255).astype(np.uint8)
+
+def msbin_page(shape, rng):
+    """
+    Returns the MSBin-like pair (img, gt) of color images.
+
+    The ground truth encodes both foreground classes and the uncertain (blue) regions. The result image holds the
+    binarization of the first foreground in the green and of the second foreground in the red channel.
+    """
+    text = tiled(text_tile(rng), shape, rng)
+    # The upper quarter of every text tile belongs to the second foreground class:
+    fg_2 = np.zeros(shape, bool)
+    for y in range(0, shape[0], TEXT_TILE_SIZE):
+        fg_2[y:y + TEXT_TILE_SIZE // 4] = True
+    fg_2 &= text
+    fg_1 = text & ~fg_2
+    ignore = np.zeros(shape, bool)
+    ignore[:, :shape[1] // 20] = True
+
+    gt = np.zeros(shape + (3,), np.uint8)
+    gt[fg_1] = MSBIN_FG_1_COLOR
+    gt[fg_2] = MSBIN_FG_2_COLOR
+    gt[ignore] = MSBIN_IGNORE_COLOR
+
+    img = np.zeros(shape + (3,), np.uint8)
+    img[:, :, 1] = np.where(result_mask(fg_1, rng), 255, 0)
+    img[:, :, 2] = np.where(result_mask(fg_2, rng), 255, 0)
+
+    return img, gt
+
+def generate_pages(path, dataset: str, megapixels: float, num_pages: int, seed: int = 0, write_weights: bool = False):
+    """
+    Writes num_pages synthetic pages to path/img and path/gt and returns the two folders.
+
+    If write_weights is set, the weight files required by the DIBCO tool are written next to the ground truth.
+    """
+    rng = np.random.default_rng(seed)
+    path_img = os.path.join(path, 'img')
+    path_gt = os.path.join(path, 'gt')
+    os.makedirs(path_img, exist_ok=True)
+    os.makedirs(path_gt, exist_ok=True)
+    shape = page_shape(megapixels)
+    for idx in range(num_pages):
+        if dataset == DATASET_DIBCO:
+            img, gt = dibco_page(shape, rng)
+        else:
+            img, gt = msbin_page(shape, rng)
+        name = 'page%d' % idx
+        cv2.imwrite(os.path.join(path_img, name + '.png'), img)
+        cv2.imwrite(os.path.join(path_gt, name + '.png'), gt)
+        if write_weights:
+            postfixes = [binar_eval.FolderMeasure.PSEUDO_RECALL_POSTFIX, binar_eval.FolderMeasure.PSEUDO_PRECISION_POSTFIX]
+            for w, postfix in zip(dibco_weights.compute_weights(gt < 128), postfixes):
+                w.astype(np.float64).tofile(os.path.join(path_gt, name + postfix), sep=' ')
+
+    return path_img, path_gt
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is given in bytes on macOS and in kilobytes on Linux:
+    return rss / (1 << 20) if sys.platform == 'darwin' else rss / (1 << 10)
+
+def fm_stages(path_img, path_gt, fg_type: constants.FGType, invert_img: bool):
+    """Returns the time per image of the stages of f_measure.PerformanceMeasure."""
+    times = {'decode': 0.0, 'masking': 0.0, 'counting': 0.0, 'aggregation': 0.0}
+    img_names = binar_eval.get_image_files(path_img)
+    results = []
+    for img_name in img_names:
+        t0 = time.perf_counter()
+        img = f_measure.read_img(img_name, fg_type)
+        gt = f_measure.read_gt(os.path.join(path_gt, os.path.basename(img_name)), fg_type)
+        t1 = time.perf_counter()
+        gt, ignore = f_measure.gt_masks(gt, fg_type)
+        img = f_measure.img_mask(img, invert_img, ignore)
+        t2 = time.perf_counter()
+        counts = f_measure.confusion_counts(img, gt)
+        t3 = time.perf_counter()
+        results.append(f_measure.PerformanceResult.from_counts(*counts))
+        t4 = time.perf_counter()
+        times['decode'] += t1 - t0
+        times['masking'] += t2 - t1
+        times['counting'] += t3 - t2
+        times['aggregation'] += t4 - t3
+
+    # The aggregation includes the computation of the folder means:
+    t0 = time.perf_counter()
+    binar_eval.FolderMeasure(path_img, path_gt).store_results(img_names, results)
+    times['aggregation'] += time.perf_counter() - t0
+
+    return {stage: t / len(img_names) for stage, t in times.items()}
+
+def dibco_stages(path_img, path_gt, weight_cache_dir):
+    """Returns the time per image of loading (decoding and weights) and scoring in dibco_measure.DibcoMeasure."""
+    times = {'decode': 0.0, 'scoring': 0.0}
+    measure = dibco_measure.DibcoMeasure(weight_cache_dir)
+    img_names = binar_eval.get_image_files(path_img)
+    for img_name in img_names:
+        t0 = time.perf_counter()
+        loaded = measure.load(img_name, os.path.join(path_gt, os.path.basename(img_name)))
+        t1 = time.perf_counter()
+        measure.score(*loaded)
+        times['decode'] += t1 - t0
+        times['scoring'] += time.perf_counter() - t1
+
+    return {stage: t / len(img_names) for stage, t in times.items()}
+
+def run_case(case: dict) -> dict:
+    """Evaluates a single case, which is run in a fresh process to obtain its peak memory."""
+    fg_type = constants.FGType[case['fg_type']]
+    path_img, path_gt = case['path_img'], case['path_gt']
+    metric = case['metric']
+    weight_cache_dir = os.path.join(case['path'], 'weights')
+    base_rss = peak_rss_mb()
+
+    if metric == 'fm':
+        # DIBCO-like result images have a black foreground:
+        invert_img = fg_type == constants.FGType.REGULAR
+        stages = fm_stages(path_img, path_gt, fg_type, invert_img)
+        measure = binar_eval.FolderMeasure(path_img, path_gt, invert_imgs=invert_img)
+    elif metric == 'dibco_native':
+        stages = dibco_stages(path_img, path_gt, weight_cache_dir)
+        measure = binar_eval.FolderMeasure(path_img, path_gt, dibco_native=True, weight_cache_dir=weight_cache_dir)
+    else:
+        stages = {}
+        measure = binar_eval.FolderMeasure(path_img, path_gt, use_dibco_tool=True, path_dibco_bin=case['path_dibco_bin'])
+
+    # The fastest of the repetitions is used, the single results and the progress are printed by batch_measure:
+    elapsed = math.inf
+    for _ in range(case['repeat']):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            measure.batch_measure(fg_type)
+        elapsed = min(elapsed, time.perf_counter() - start)
+
+    return {'name': case['name'], 'dataset': case['dataset'], 'fg_type': case['fg_type'], 'metric': metric,
+            'megapixels': case['megapixels'], 'num_images': len(measure.fm), 'seconds': elapsed,
+            'images_per_sec': len(measure.fm) / elapsed, 'megapixels_per_sec': case['megapixels'] * len(measure.fm) / elapsed,
+            'base_rss_mb': base_rss, 'peak_rss_mb': peak_rss_mb(), 'stages': stages}
+
+def startup_time(module: str, repeat: int = DEFAULT_REPEAT) -> dict:
+    """Measures the import of module in fresh interpreters and returns the fastest time and the loaded lazy modules."""
+    seconds = math.inf
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', STARTUP_CODE % module], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout.splitlines()
+        seconds = min(seconds, float(output[0]))
+        modules = output[1].split()
+
+    lazy_modules = sorted(m for m in LAZY_MODULES if m in modules or any(n.startswith(m + '.') for n in modules))
+    return {'module': module, 'import_seconds': seconds, 'lazy_modules': lazy_modules}
+
+def run_startup(repeat: int = DEFAULT_REPEAT):
+    results = []
+    for module in STARTUP_MODULES:
+        result = startup_time(module, repeat)
+        print('import %-32s %8.3f s  %s' % (module, result['import_seconds'],
+                'loads ' + ', '.join(result['lazy_modules']) if result['lazy_modules'] else ''))
+        results.append(result)
+
+    return results
+
+def run_benchmark(megapixels, num_pages: int = DEFAULT_NUM_PAGES, repeat: int = DEFAULT_REPEAT, datasets = None,
+                    path_dibco_bin: str = None, work_dir: str = None):
+    """Generates the pages and returns the list of case results."""
+    datasets = datasets if datasets else list(DATASET_FG_TYPES)
+    work_dir = tempfile.mkdtemp(prefix='binar_bench_', dir=work_dir)
+    # Spawned workers do not inherit the memory of the generated pages:
+    context = multiprocessing.get_context('spawn')
+    results = []
+    try:
+        for dataset in datasets:
+            for mp in megapixels:
+                path = os.path.join(work_dir, '%s_%gmp' % (dataset, mp))
+                dibco_tool = dataset == DATASET_DIBCO and path_dibco_bin is not None
+                print('Generating %d %s pages with %g MP...' % (num_pages, dataset, mp))
+                path_img, path_gt = generate_pages(path, dataset, mp, num_pages, write_weights=dibco_tool)
+
+                metrics = ['fm']
+                if dataset == DATASET_DIBCO:
+                    metrics.append('dibco_native')
+                    if dibco_tool:
+                        metrics.append('dibco_tool')
+                for fg_type in DATASET_FG_TYPES[dataset]:
+                    for metric in metrics:
+                        case = {'name': '%s/%s/%s/%gmp' % (dataset, fg_type.name, metric, mp), 'dataset': dataset,
+                                'fg_type': fg_type.name, 'metric': metric, 'megapixels': mp, 'path': path,
+                                'path_img': path_img, 'path_gt': path_gt, 'path_dibco_bin': path_dibco_bin,
+                                'repeat': repeat}
+                        with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                            result = executor.submit(run_case, case).result()
+                        print_result(result)
+                        results.append(result)
+                shutil.rmtree(path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+def print_result(result: dict):
+    stages = ', '.join('%s %.3f s' % (stage, t) for stage, t in result['stages'].items())
+    rss = '%.0f MB' % result['peak_rss_mb'] if result['peak_rss_mb'] is not None else 'n/a'
+    print('%-40s %8.2f images/s  peak RSS %8s  %s' % (result['name'], result['images_per_sec'], rss, stages))
+
+def save_results(path: str, results, startup):
+    report = {'version': BENCHMARK_VERSION, 'metric_version': constants.METRIC_VERSION,
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'platform': platform.platform(),
+                'python': platform.python_version(), 'numpy': np.__version__, 'opencv': cv2.__version__,
+                'cpu_count': os.cpu_count(), 'startup': startup, 'cases': results}
+    with open(path, 'w', encoding='utf8') as f:
+        json.dump(report, f, indent=2)
+
+def compare_results(baseline: dict, results, tolerance: float = DEFAULT_TOLERANCE):
+    """Prints the changes against the baseline and returns the names of the regressed cases."""
+    baseline_cases = {case['name']: case for case in baseline['cases']}
+    regressions = []
+    for result in results:
+        base = baseline_cases.get(result['name'])
+        if base is None:
+            print('%-40s not in the baseline' % result['name'])
+            continue
+
+        speedup = result['images_per_sec'] / base['images_per_sec']
+        regressed = speedup < 1 - tolerance
+        line = '%-40s %6.2fx throughput' % (result['name'], speedup)
+        if result['peak_rss_mb'] is not None and base['peak_rss_mb'] is not None:
+            rss_ratio = result['peak_rss_mb'] / base['peak_rss_mb']
+            regressed = regressed or rss_ratio > 1 + tolerance
+            line += ' %6.2fx peak RSS' % rss_ratio
+        if regressed:
+            line += '  REGRESSION'
+            regressions.append(result['name'])
+        print(line)
+
+    return regressions
+
+def check_startup(startup, baseline: dict = None, tolerance: float = DEFAULT_TOLERANCE):
+    """Returns the modules, which load a lazy module or whose import is slower than in the baseline."""
+    regressions = [result['module'] for result in startup if result['lazy_modules']]
+    baseline_startup = {result['module']: result for result in baseline.get('startup', [])} if baseline else {}
+    for result in startup:
+        base = baseline_startup.get(result['module'])
+        if base is None:
+            continue
+        ratio = result['import_seconds'] / base['import_seconds']
+        print('import %-32s %6.2fx import time' % (result['module'], ratio))
+        if ratio > 1 + tolerance and result['module'] not in regressions:
+            regressions.append(result['module'])
+
+    return regressions
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark the evaluation on synthetic pages.')
+    parser.add_argument("-o", "--output", help="path to the JSON output file", default='benchmark.json')
+    parser.add_argument("--compare", help="path to a baseline JSON file, against which the results are compared", default=None)
+    parser.add_argument("--tolerance", help="relative change, which is reported as regression", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--megapixels", help="resolutions of the pages in megapixels", type=float, nargs='+', default=DEFAULT_MEGAPIXELS)
+    parser.add_argument("--num_pages", help="number of pages per case", type=int, default=DEFAULT_NUM_PAGES)
+    parser.add_argument("--repeat", help="number of repetitions per case, the fastest is reported", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--datasets", help="synthetic datasets", nargs='+', choices=list(DATASET_FG_TYPES), default=None)
+    parser.add_argument("--path_dibco_bin", help="directory of DIBCO_metrics.exe, benchmarks the dibco tool too", default=None)
+    parser.add_argument("--work_dir", help="directory for the generated pages", default=None)
+    parser.add_argument("--startup", help="measure solely the import time of the evaluation modules", action="store_true")
+    args = parser.parse_args()
+
+    startup = run_startup(args.repeat)
+    results = []
+    if not args.startup:
+        results = run_benchmark(args.megapixels, args.num_pages, args.repeat, args.datasets, args.path_dibco_bin, args.work_dir)
+    save_results(args.output, results, startup)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf8') as f:
+            baseline = json.load(f)
+    # Loading a lazy module is a regression, even without a baseline:
+    regressions = check_startup(startup, baseline, args.tolerance)
+    if baseline is not None:
+        regressions += compare_results(baseline, results, args.tolerance)
+    if regressions:
+        print('%d of %d cases regressed.' % (len(regressions), len(results) + len(startup)))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -4,30 +4,40 @@ Measures the performance on a folder basis, given an input and a ground truth fo
 The performance measure is saved in the form of CSV file.
 """  
 
-import subprocess
-import re
 import os
 import glob
+import concurrent.futures
 import cv2
 import numpy as np
-import tqdm
 import errno
-import dibco_measure
 import f_measure
+import threshold_sweep
+import gt_cache
+import result_log
+import result_cache
+import result_store
+import shards
+import error_maps
+import prefetch
+import profiler
 import argparse
 import csv
 import constants
 import math
 
-def get_image_files(path):
-    extensions = ('*.png', '*.tiff')
+IMG_EXTENSIONS = ('*.png', '*.tiff')
+# The tiled evaluation can also read memory mapped .npy files:
+TILED_IMG_EXTENSIONS = IMG_EXTENSIONS + ('*.tif', '*.npy')
+
+def get_image_files(path, pseudo = False, extensions = IMG_EXTENSIONS):
     files = []
     for ext in extensions:
         files.extend(glob.glob(os.path.join(path, ext)))
     
     # filter out pseudo images (these are just for probability visualization):
-    files = [f for f in files if 'pseudo' not in f]
-    return files
+    # If pseudo is set, solely the pseudo images are returned.
+    files = [f for f in files if ('pseudo' in os.path.basename(f)) == pseudo]
+    return sorted(files)
 
 def convert_img(path_in, path_out):
     image = cv2.imread(path_in)
@@ -38,18 +48,98 @@ def convert_img(path_in, path_out):
 
     return path_name
 
+def map_images(func, jobs, *iterables):
+    """
+    Applies func to the items of the iterables, like the builtin map.
+
+    If jobs is larger than 1, the items are distributed on a process pool with jobs workers (jobs = 0 uses all cores).
+    The results are returned in the order of the input items, regardless of the number of jobs.
+    """
+    if jobs == 0:
+        jobs = os.cpu_count()
+
+    if jobs is None or jobs <= 1:
+        return map(func, *iterables)
+
+    if _pool is not None:
+        return _pool.map(func, *iterables)
+
+    # The executor is shut down once all results are consumed. If profiling is enabled, the workers record their stages too:
+    def iterate():
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=profiler.init_worker,
+                                                    initargs=profiler.worker_args()) as executor:
+            yield from executor.map(func, *iterables)
+
+    return iterate()
+
+# Process pool, which is shared by the calls of map_images (see start_pool):
+_pool = None
+
+def start_pool(jobs):
+    """
+    Keeps the worker processes of map_images alive until stop_pool is called, instead of starting a pool per call.
+
+    main uses one pool for the whole run, so that the workers keep their ground truth cache warm across the folders
+    (and the batches of the watch mode).
+    """
+    global _pool
+    if jobs == 0:
+        jobs = os.cpu_count()
+    if jobs is not None and jobs > 1:
+        _pool = concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=profiler.init_worker,
+                                                        initargs=profiler.worker_args())
+
+def stop_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
 class FolderMeasure:
 
-    def __init__(self, path_img, path_gt, use_dibco_tool = False, path_dibco_bin = '', invert_imgs = False, save_single_results = True):
+    def __init__(self, path_img, path_gt, use_dibco_tool = False, path_dibco_bin = '', invert_imgs = False, save_single_results = True, jobs = 1, dibco_native = False, weight_cache_dir = None, gt_cache = None, result_log = None, result_cache = None, band_height = 0, prefetch = 0, dibco_timeout = 600, objects = False, tile_grid = None, weight_cache_size = None):
         self.path_img = path_img
         self.path_gt = path_gt
         self.use_dibco_tool = use_dibco_tool
         self.path_dibco_bin = os.path.join(path_dibco_bin, 'DIBCO_metrics.exe')
         self.invert_imgs = invert_imgs
         self.save_single_results = save_single_results
+        # Number of worker processes used in batch_measure (0 = all cores):
+        self.jobs = jobs
+        # Compute the DIBCO metrics with dibco_measure.DibcoMeasure instead of the DIBCO tool:
+        self.dibco_native = dibco_native
+        self.dibco_metrics = use_dibco_tool or dibco_native
+        # Directory of the cached pseudo-recall and pseudo-precision weights (see dibco_weights.WeightCache):
+        self.weight_cache_dir = weight_cache_dir
+        # Maximum size of the weight cache in bytes (None = dibco_weights.DEFAULT_MAX_BYTES):
+        self.weight_cache_size = weight_cache_size
+        # gt_cache.GTCache shared by the folders of a run (None = decode the ground truth for each image):
+        self.gt_cache = gt_cache
+        # result_log.ResultLog, to which the single results are streamed (None = no log):
+        self.result_log = result_log
+        # result_cache.ResultCache with the results of previous runs (None = no cache):
+        self.result_cache = result_cache
+        # Evaluate the images in bands of band_height rows with tiled_measure (0 = evaluate the whole images):
+        self.band_height = band_height
+        self.img_extensions = TILED_IMG_EXTENSIONS if band_height > 0 else IMG_EXTENSIONS
+        # Number of images, which are decoded ahead in a thread pool (0 = no prefetching, see prefetch.Prefetcher):
+        self.prefetch = prefetch
+        self.pipeline = None
+        # Seconds after which a run of the DIBCO tool is aborted (and retried):
+        self.dibco_timeout = dibco_timeout
+        # Set of the images evaluated by batch_measure (None = all images of the folder):
+        self.img_subset = None
+        # Name of the class, whose results are stored by MultiClassEvaluation (None = the fg_type of batch_measure):
+        self.fg_class = None
+        # Compute the object-level (connected component) counts of f_measure.object_counts:
+        self.objects = objects
+        # Grid (rows, cols) of the tiles, whose counts are stored in self.tile_counts (see error_maps, None = no tiles):
+        self.tile_grid = tile_grid
+        # Weights of missing weight files were computed by dibco_weights, i.e. the pseudo metrics are approximate:
+        self.computed_weights = False
 
         # Assure that the binary file is existing:
-        if (not os.path.exists(self.path_dibco_bin)):
+        if (self.use_dibco_tool and not os.path.exists(self.path_dibco_bin)):
             print('The DIBCO binary path is wrong. This path must contain a file named: DIBCO_metrics.exe')
             raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), self.path_dibco_bin)
             
@@ -58,180 +148,367 @@ class FolderMeasure:
         self.mean_recall = -1
 
 
-    def batch_measure(self, fg_type: constants.FGType = constants.FGType.REGULAR):
+    TYPE_GT = 0
+    TYPE_PSEUDO_RECALL = 1
+    TYPE_PSEUDO_PRECISION = 2
+    PSEUDO_RECALL_POSTFIX = '_RWeights.dat'
+    PSEUDO_PRECISION_POSTFIX = '_PWeights.dat'  
 
-        TYPE_GT = 0
-        TYPE_PSEUDO_RECALL = 1
-        TYPE_PSEUDO_PRECISION = 2
-        PSEUDO_RECALL_POSTFIX = '_RWeights.dat'
-        PSEUDO_PRECISION_POSTFIX = '_PWeights.dat'  
+    # TODO: remove this!
+    REMOVED_IMG_NAMES = ['BT44', 'BT50', 'EA0', 'EA1', 'EA47', 'EA59', 'EA60', 'EA62', 'EA63', 'EA64']
 
-        def get_gt_file(gt_file_type):
+    def get_gt_file(self, img_name, gt_file_type):
 
-            img_file_name = os.path.basename(img_name)
-            
-            if gt_file_type == TYPE_GT:
-                path = os.path.join(self.path_gt, img_file_name)
-            elif gt_file_type == TYPE_PSEUDO_RECALL:
-                img_base_name = os.path.splitext(img_file_name)[0]
-                path = os.path.join(self.path_gt, img_base_name + PSEUDO_RECALL_POSTFIX)
-            elif gt_file_type == TYPE_PSEUDO_PRECISION:
-                img_base_name = os.path.splitext(img_file_name)[0]
-                path = os.path.join(self.path_gt, img_base_name + PSEUDO_PRECISION_POSTFIX)
-            else:
-                raise Exception('Unknown type')
-
-            # Check if the file is existing:
-            if (os.path.exists(path)):
-                return path
-            else:
-                if (gt_file_type == TYPE_PSEUDO_PRECISION or gt_file_type == TYPE_PSEUDO_RECALL):
-                    print('Missing a dibco weight file, please create it first with the GTConverter class.')
-                raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+        # Pseudo (probability) images are evaluated against the gt of the binary image:
+        img_file_name = threshold_sweep.gt_name(img_name)
+        
+        if gt_file_type == self.TYPE_GT:
+            path = os.path.join(self.path_gt, img_file_name)
+        elif gt_file_type == self.TYPE_PSEUDO_RECALL:
+            img_base_name = os.path.splitext(img_file_name)[0]
+            path = os.path.join(self.path_gt, img_base_name + self.PSEUDO_RECALL_POSTFIX)
+        elif gt_file_type == self.TYPE_PSEUDO_PRECISION:
+            img_base_name = os.path.splitext(img_file_name)[0]
+            path = os.path.join(self.path_gt, img_base_name + self.PSEUDO_PRECISION_POSTFIX)
+        else:
+            raise Exception('Unknown type')
 
-        img_names = get_image_files(self.path_img)
+        # Check if the file is existing:
+        if (os.path.exists(path)):
+            return path
+        else:
+            if (gt_file_type == self.TYPE_PSEUDO_PRECISION or gt_file_type == self.TYPE_PSEUDO_RECALL):
+                # The native DIBCO measure computes (and caches) the missing weights itself:
+                if not self.use_dibco_tool:
+                    return None
+                print('Missing a dibco weight file, please create it first with the GTConverter class or use --dibco_native.')
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+
+    def image_names(self):
+        """Returns the sorted list of the images, which are evaluated by batch_measure."""
+        img_names = get_image_files(self.path_img, extensions=self.img_extensions)
         if not img_names:
             raise Exception('No image found.')
-
-        img_name = ''
-        results = []
+        if not self.dibco_metrics:
+            img_names = self.filter_img_names(img_names)
+
+        return img_names
+
+    def filter_img_names(self, img_names):
+        return [img_name for img_name in img_names 
+                    if os.path.splitext(os.path.basename(img_name))[0] not in self.REMOVED_IMG_NAMES]
+
+    def map_measure(self, measure, *iterables):
+        """
+        Applies measure.calc to the items of the iterables and returns the results in order.
+
+        Measures with an own map (dibco_measure.DibcoWrapper) distribute the items themselves. In case of a single job, measures that can be split into load and score (f_measure.PerformanceMeasure,
+        dibco_measure.DibcoMeasure) are run in a prefetching pipeline, if self.prefetch is set. Otherwise, the
+        items are distributed by map_images.
+        """
+        if hasattr(measure, 'map'):
+            yield from measure.map(*iterables)
+            return
+
+        if self.prefetch > 0 and self.jobs == 1 and hasattr(measure, 'load'):
+            self.pipeline = prefetch.Prefetcher(measure.load, self.prefetch)
+            for img_name, loaded in zip(iterables[0], self.pipeline.map(*iterables)):
+                with profiler.image(img_name):
+                    result = measure.score(*loaded)
+                yield result
+            return
+
+        yield from map_images(measure.calc, self.jobs, *iterables)
+
+    def calc_results(self, measure, settings, img_names, *args):
+        """
+        Applies measure.calc to the images (see map_measure) and yields the results in the order of img_names.
+
+        If a result log is set, images with an unchanged fingerprint (see result_log.fingerprint) are taken from the
+        log and the new results are appended to the log as soon as they are computed. Otherwise, the results are
+        looked up in the result cache (if set), to which new results are added. args are lists with the further
+        arguments of measure.calc (per image), the file paths among them are part of the fingerprint and the cache key.
+        """
+        if self.result_log is None and self.result_cache is None:
+            yield from self.map_measure(measure, img_names, *args)
+            return
+
+        fingerprints = []
+        cache_keys = []
+        stored = []
+        todo = []
+        for idx, img_name in enumerate(img_names):
+            with profiler.stage('lookup', img_name):
+                paths = [img_name] + [arg[idx] for arg in args if arg[idx] is None or isinstance(arg[idx], str)]
+                result = None
+                if self.result_log is not None:
+                    fp = result_log.fingerprint(paths, settings)
+                    fingerprints.append(fp)
+                    result = self.result_log.get(self.path_img, img_name, fp)
+                if self.result_cache is not None:
+                    cache_keys.append(self.result_cache.key(paths, settings))
+                    if result is None:
+                        result = self.result_cache.get(cache_keys[idx])
+                        # Results from the cache are still added to the log:
+                        if result is not None and self.result_log is not None:
+                            self.result_log.append(self.path_img, img_name, fp, result)
+            stored.append(result)
+            if result is None:
+                todo.append(idx)
+            else:
+                profiler.count('stored_results')
+
+        computed = self.map_measure(measure, [img_names[idx] for idx in todo], *[[arg[idx] for idx in todo] for arg in args])
+        for idx, img_name in enumerate(img_names):
+            if stored[idx] is not None:
+                yield stored[idx]
+                continue
+            result = next(computed)
+            if self.result_log is not None:
+                self.result_log.append(self.path_img, img_name, fingerprints[idx], result)
+            if self.result_cache is not None:
+                self.result_cache.put(cache_keys[idx], result)
+            yield result
+
+    def batch_measure(self, fg_type: constants.FGType = constants.FGType.REGULAR, img_names = None):
+        # img_names: the images to evaluate, e.g. the changed images in the watch mode (None = all images of the folder)
+
+        if img_names is None:
+            with profiler.stage('glob'):
+                img_names = self.image_names()
+            # A shard evaluates a subset of the images (see shards.assign):
+            if self.img_subset is not None:
+                img_names = [img_name for img_name in img_names if img_name in self.img_subset]
+
+        results = result_store.ResultStore(self.result_fields(), len(img_names))
+
+        # The modules of the dibco metrics and of the tiled evaluation are imported on demand, which keeps the startup of
+        # short evaluation tasks fast:
+        if self.dibco_metrics:
+            import tqdm
+            import dibco_measure
+        if self.band_height > 0:
+            import tiled_measure
 
         if (self.use_dibco_tool):
-            dw = dibco_measure.DibcoWrapper(self.path_dibco_bin)
+            dw = dibco_measure.DibcoWrapper(self.path_dibco_bin, self.jobs if self.jobs > 0 else os.cpu_count(), self.dibco_timeout)
+        elif (self.dibco_native and self.band_height > 0):
+            dw = tiled_measure.TiledDibcoMeasure(self.weight_cache_dir, self.band_height, self.weight_cache_size)
+        elif (self.dibco_native):
+            dw = dibco_measure.DibcoMeasure(self.weight_cache_dir, self.weight_cache_size)
+        elif (self.band_height > 0):
+            fm = tiled_measure.TiledMeasure(self.path_img, self.path_gt, self.invert_imgs, self.band_height)
         else:
-            fm = f_measure.PerformanceMeasure(self.path_img, self.path_gt, self.invert_imgs)
+            fm = f_measure.PerformanceMeasure(self.path_img, self.path_gt, self.invert_imgs, self.gt_cache, self.objects, self.tile_grid)
 
 
         # DIBCO computation tooks very long...
         # Therefore, show a progress button, to make it less boring :)
-        if self.use_dibco_tool:
-            for img_name in tqdm.tqdm(img_names):
+        if self.dibco_metrics:
+            gt_files = [self.get_gt_file(img_name, self.TYPE_GT) for img_name in img_names]
+            recall_weight_files = [self.get_gt_file(img_name, self.TYPE_PSEUDO_RECALL) for img_name in img_names]
+            precision_weight_files = [self.get_gt_file(img_name, self.TYPE_PSEUDO_PRECISION) for img_name in img_names]
+            if None in recall_weight_files or None in precision_weight_files:
+                self.computed_weights = True
+            settings = ('dibco_tool' if self.use_dibco_tool else 'dibco_native', )
+            dibco_results = self.calc_results(dw, settings, img_names, gt_files, recall_weight_files, precision_weight_files)
+            for img_name, result in zip(img_names, tqdm.tqdm(dibco_results, total=len(img_names))):
                 print(img_name)
-                result = dw.calc(img_name, get_gt_file(TYPE_GT), get_gt_file(TYPE_PSEUDO_RECALL), get_gt_file(TYPE_PSEUDO_PRECISION))
                 print(result)
-                results.append(result)
-                print("mean fm: " + str(np.mean([r.fm for r in results])))
-
-            # Store the mean performance values:
-            self.mean_fm = np.mean([r.fm for r in results])
-            self.mean_recall = np.mean([r.recall for r in results])
-            self.mean_precision = np.mean([r.precision for r in results])
-            self.mean_psnr = np.mean([r.psnr for r in results])
-            self.mean_pseudo_fm = np.mean([r.pseudo_fm for r in results])
-            self.mean_drd = np.mean([r.drd for r in results])
-            self.mean_pseudo_recall = np.mean([r.pseudo_recall for r in results])
-            self.mean_pseudo_precision = np.mean([r.pseudo_precision for r in results])
-            evaluated_img_names = img_names
+                results.append(img_name, result)
+                print("mean fm: " + str(results.running_mean('fm')))
 
         else:
-            removed_img_names = ['BT44', 'BT50', 'EA0', 'EA1', 'EA47', 'EA59', 'EA60', 'EA62', 'EA63', 'EA64']
-            evaluated_img_names = []
-            for img_name in img_names:
+            gt_files = [self.get_gt_file(img_name, self.TYPE_GT) for img_name in img_names]
+
+            settings = ('fm', fg_type.value, self.invert_imgs)
+            if self.objects:
+                settings += ('objects', )
+            if self.tile_grid is not None:
+                settings += ('tiles', ) + tuple(self.tile_grid)
+            tiles = []
+            fm_results = self.calc_results(fm, settings, img_names, gt_files, [fg_type] * len(img_names))
+            for img_name, result in zip(img_names, fm_results):
 
-                # TODO: remove this!
-                img_base_name = os.path.splitext(os.path.basename(img_name))[0]
-                if img_base_name in removed_img_names:
-                    continue
-                
-                result = fm.calc(img_name, get_gt_file(TYPE_GT), fg_type)
                 if result.fm == -1:
                     continue
 
                 if math.isnan(result.fm):
                     print(img_name)
 
-                results.append(result)
-                evaluated_img_names.append(img_name)
+                results.append(img_name, result)
+                if self.tile_grid is not None:
+                    tiles.append(result.tiles)
+
+            if self.tile_grid is not None:
+                self.tile_counts = np.array(tiles, np.int64).reshape((len(tiles), 4) + tuple(self.tile_grid))
             
-            # Store the mean performance values:
-            self.mean_fm = np.mean([r.fm for r in results])
-            self.mean_recall = np.mean([r.recall for r in results])
-            self.mean_precision = np.mean([r.precision for r in results])
+        if self.pipeline is not None:
+            print(self.pipeline.summary())
 
-        if self.save_single_results:
-            if self.use_dibco_tool:
-                self.img_names = evaluated_img_names
-                self.fm = [r.fm for r in results]
-                self.precision = [r.precision for r in results]
-                self.recall = [r.recall for r in results]
-                self.psnr = [r.psnr for r in results]
-                self.drd = [r.drd for r in results]
-                self.pseudo_recall = [r.pseudo_recall for r in results]
-                self.pseudo_fm = [r.pseudo_fm for r in results]
-                self.pseudo_precision = [r.pseudo_precision for r in results]
-            else:
-                self.img_names = evaluated_img_names
-                self.fm = [r.fm for r in results]
-                self.precision = [r.precision for r in results]
-                self.recall = [r.recall for r in results]
-                self.nrm = [r.nrm for r in results]
+        profiler.count('images', len(results))
+        with profiler.stage('aggregation'):
+            self.set_results(results)
 
-            
-def main():  
+    def result_fields(self):
+        if self.dibco_metrics:
+            return result_store.DIBCO_FIELDS
+        return result_store.FM_FIELDS + result_store.OBJECT_FIELDS if self.objects else result_store.FM_FIELDS
 
-    parser = argparse.ArgumentParser()
-    parser.add_argument("path_gt", help="path to the ground truth images")
-    parser.add_argument("path_img", help="path to the result images")
-    parser.add_argument("path_csv", help="path to the csv output file")
-    parser.add_argument("-dt", "--dibco_tool", help="use dibco tool", action="store_true")
-    parser.add_argument('--path_dibco_bin', nargs='?', const='', default='')
-    parser.add_argument('-fg_type', nargs='?', const=0, default=0, type=int)
-    parser.add_argument("-s", "--subfolders", help="evaluate subfolders", action="store_true")
-    parser.add_argument("-f", "--file_results", help="save results for each file", action="store_true")
-    parser.add_argument("-i", "--invert_imgs", help="invert input images", action="store_true")
-    args = parser.parse_args()
+    def store_results(self, img_names, results):
+        """Stores the PerformanceResult / DibcoResult objects of the images (see set_results)."""
 
-    measures = []
-    if args.subfolders:
-        folders = glob.glob(os.path.join(args.path_img, '*\\'))
-    else:
-        folders = [args.path_img]
+        store = result_store.ResultStore(self.result_fields(), len(results))
+        for img_name, result in zip(img_names, results):
+            store.append(img_name, result)
+        self.set_results(store)
 
-    for folder in tqdm.tqdm(folders):
-        measure = FolderMeasure(folder, args.path_gt, args.dibco_tool, args.path_dibco_bin, args.invert_imgs, True)
-        measure.batch_measure(constants.map_fg_type(args.fg_type))    
-        measures.append(measure)
-        # This is a safety message to see if we got many wrong results...
-        print(folder)
-        tqdm.tqdm.write("Mean FM: %f" % measure.mean_fm)
-        
+    def set_results(self, store):
+        """
+        Stores the mean performance values of the result_store.ResultStore and (if save_single_results is set) the
+        results of the single images, as views of its columns.
+        """
+        self.results = store
 
-    with open(args.path_csv, 'w', newline='') as csvfile:
-        if args.dibco_tool:
+        # Store the mean performance values:
+        for field in store.fields:
+            setattr(self, 'mean_' + field, store.mean(field))
+
+        if self.save_single_results:
+            self.img_names = store.img_names
+            for field in store.fields:
+                setattr(self, field, store.column(field))
+
+    def batch_sweep(self, fg_type: constants.FGType = constants.FGType.REGULAR):
+        """
+        Evaluates grayscale / probability images for all thresholds (see threshold_sweep).
+
+        The pseudo images of the folder are used if there are any, otherwise all images. The resulting curves are
+        stored in self.sweep.
+        """
+        with profiler.stage('glob'):
+            img_names = get_image_files(self.path_img, pseudo=True)
+            if not img_names:
+                img_names = get_image_files(self.path_img)
+        img_names = self.filter_img_names(img_names)
+        if not img_names:
+            raise Exception('No image found.')
+
+        gt_files = [self.get_gt_file(img_name, self.TYPE_GT) for img_name in img_names]
+        n = len(img_names)
+        import tqdm
+        counts = list(tqdm.tqdm(map_images(threshold_sweep.sweep_image, self.jobs, img_names, gt_files,
+                        [fg_type] * n, [self.invert_imgs] * n, [self.gt_cache] * n), total=n))
+
+        with profiler.stage('aggregation'):
+            self.sweep = threshold_sweep.SweepResult(img_names, counts)
+        t = self.sweep.best_threshold
+        self.mean_fm = self.sweep.mean_fm[t]
+        self.mean_precision = self.sweep.mean_precision[t]
+        self.mean_recall = self.sweep.mean_recall[t]
+
+
+def write_sweep_csv(path_csv, measures, file_results = False):
+    """
+    Writes the results of FolderMeasure.batch_sweep.
+
+    For each folder, the first row contains the mean values at the best global threshold, followed by the mean values
+    for every threshold. If file_results is set, the best threshold of each image is listed afterwards.
+    """
+    with open(path_csv, 'w', newline='') as csvfile:
+        headers = [constants.HEADER_PATH_IMG, constants.HEADER_THRESHOLD, constants.HEADER_FM, constants.HEADER_PRECISION, 
+                    constants.HEADER_RECALL, constants.HEADER_NRM]
+        writer = csv.DictWriter(csvfile, fieldnames=headers)
+        writer.writeheader()
+        for measure in measures:
+            sweep = measure.sweep
+            for t in [sweep.best_threshold] + list(sweep.thresholds):
+                writer.writerow({   constants.HEADER_PATH_IMG: measure.path_img,
+                                    constants.HEADER_THRESHOLD: t,
+                                    constants.HEADER_FM: sweep.mean_fm[t],
+                                    constants.HEADER_PRECISION: sweep.mean_precision[t],
+                                    constants.HEADER_RECALL: sweep.mean_recall[t],
+                                    constants.HEADER_NRM: sweep.mean_nrm[t]
+                })
+
+            if file_results:
+                # Add an empty row to distinguish between mean values and single values:
+                writer.writerow({})
+                for idx, img_name in enumerate(sweep.img_names):
+                    t, fm, precision, recall, nrm = sweep.img_values(idx)
+                    writer.writerow({   constants.HEADER_PATH_IMG: img_name,
+                                        constants.HEADER_THRESHOLD: t,
+                                        constants.HEADER_FM: fm,
+                                        constants.HEADER_PRECISION: precision,
+                                        constants.HEADER_RECALL: recall,
+                                        constants.HEADER_NRM: nrm
+                    })
+            
+def write_csv(path_csv, measures, dibco_metrics = False, file_results = False, statistics = None):
+    # statistics: the dicts of significance.folder_statistics, which are written next to the means of the measures
+    # The class of the measures of a MultiClassEvaluation is written next to their folder:
+    fg_classes = any(measure.fg_class is not None for measure in measures)
+    objects = not dibco_metrics and any(measure.objects for measure in measures)
+    # The pseudo metrics of computed weights are labeled as approximate (see dibco_weights):
+    if dibco_metrics and any(measure.computed_weights for measure in measures):
+        pseudo_headers = [constants.HEADER_PSEUDO_FM_APPROX, constants.HEADER_PSEUDO_PRECISION_APPROX, constants.HEADER_PSEUDO_RECALL_APPROX]
+    else:
+        pseudo_headers = [constants.HEADER_PSEUDO_FM, constants.HEADER_PSEUDO_PRECISION, constants.HEADER_PSEUDO_RECALL]
+    object_headers = [constants.HEADER_GT_OBJECTS, constants.HEADER_MISSED_OBJECTS, constants.HEADER_FP_OBJECTS,
+                        constants.HEADER_SPLIT_OBJECTS, constants.HEADER_MERGED_OBJECTS]
+
+    # The file is replaced at once, as it is rewritten continuously in the watch mode:
+    tmp_path = path_csv + '.tmp'
+    with open(tmp_path, 'w', newline='') as csvfile:
+        if dibco_metrics:
             headers = [ constants.HEADER_PATH_IMG, constants.HEADER_FM, constants.HEADER_PRECISION, constants.HEADER_RECALL,
-                        constants.HEADER_PSEUDO_FM, constants.HEADER_PSEUDO_PRECISION, constants.HEADER_PSEUDO_RECALL,
+                        *pseudo_headers,
                         constants.HEADER_DRD, constants.HEADER_PSNR
                         ]            
         else:
             headers = [constants.HEADER_PATH_IMG, constants.HEADER_FM, constants.HEADER_PRECISION, constants.HEADER_RECALL, constants.HEADER_NRM]
+        if fg_classes:
+            headers.insert(1, constants.HEADER_FG_CLASS)
+        if objects:
+            headers += object_headers
+        if statistics is not None:
+            headers += [constants.HEADER_CI_LOW, constants.HEADER_CI_HIGH, constants.HEADER_REFERENCE,
+                        constants.HEADER_P_BOOTSTRAP, constants.HEADER_P_PERMUTATION]
 
         writer = csv.DictWriter(csvfile, fieldnames=headers)
         writer.writeheader()
-        for measure in measures:
-            if args.dibco_tool:
-                writer.writerow({   constants.HEADER_PATH_IMG: measure.path_img, 
-                                    constants.HEADER_FM: measure.mean_fm,
-                                    constants.HEADER_PRECISION: measure.mean_precision,
-                                    constants.HEADER_RECALL: measure.mean_recall,
-                                    constants.HEADER_PSEUDO_FM: measure.mean_pseudo_fm,
-                                    constants.HEADER_PSEUDO_PRECISION: measure.mean_pseudo_precision,
-                                    constants.HEADER_PSEUDO_RECALL: measure.mean_pseudo_recall,
-                                    constants.HEADER_DRD: measure.mean_drd,
-                                    constants.HEADER_PSNR: measure.mean_psnr
-                                    })
+        for idx, measure in enumerate(measures):
+            if dibco_metrics:
+                row = { constants.HEADER_PATH_IMG: measure.path_img, 
+                        constants.HEADER_FM: measure.mean_fm,
+                        constants.HEADER_PRECISION: measure.mean_precision,
+                        constants.HEADER_RECALL: measure.mean_recall,
+                        pseudo_headers[0]: measure.mean_pseudo_fm,
+                        pseudo_headers[1]: measure.mean_pseudo_precision,
+                        pseudo_headers[2]: measure.mean_pseudo_recall,
+                        constants.HEADER_DRD: measure.mean_drd,
+                        constants.HEADER_PSNR: measure.mean_psnr
+                        }
             else:
-                writer.writerow({   constants.HEADER_PATH_IMG: measure.path_img, 
-                                    constants.HEADER_FM: measure.mean_fm,
-                                    constants.HEADER_PRECISION: measure.mean_precision,
-                                    constants.HEADER_RECALL: measure.mean_recall, 
-                                    constants.HEADER_NRM: -1
-                    })
-
-            if args.file_results:
+                row = { constants.HEADER_PATH_IMG: measure.path_img, 
+                        constants.HEADER_FM: measure.mean_fm,
+                        constants.HEADER_PRECISION: measure.mean_precision,
+                        constants.HEADER_RECALL: measure.mean_recall, 
+                        constants.HEADER_NRM: -1
+                        }
+            if fg_classes:
+                row[constants.HEADER_FG_CLASS] = measure.fg_class
+            if objects:
+                row.update({header: getattr(measure, 'mean_' + header) for header in object_headers})
+            if statistics is not None:
+                row.update(statistics[idx])
+            writer.writerow(row)
+
+            if file_results:
                 # Add an empty row to distinguish between mean values and single values:
                 writer.writerow({})
 
-                if args.dibco_tool:
+                if dibco_metrics:
                     for (img_name, fm, precision, recall, pseudo_fm, pseudo_precision, pseudo_recall, drd, psnr) in zip(
                         measure.img_names, 
                         measure.fm, measure.precision, measure.recall, 
@@ -241,20 +518,337 @@ def main():
                                             constants.HEADER_FM: fm,
                                             constants.HEADER_PRECISION: precision,
                                             constants.HEADER_RECALL: recall,
-                                            constants.HEADER_PSEUDO_FM: pseudo_fm,
-                                            constants.HEADER_PSEUDO_PRECISION: pseudo_precision,
-                                            constants.HEADER_PSEUDO_RECALL: pseudo_recall,
+                                            pseudo_headers[0]: pseudo_fm,
+                                            pseudo_headers[1]: pseudo_precision,
+                                            pseudo_headers[2]: pseudo_recall,
                                             constants.HEADER_DRD: drd,
                                             constants.HEADER_PSNR: psnr
                         })
                 else:
-                    for (img_name, fm, precision, recall, nrm) in zip(
-                        measure.img_names, measure.fm, measure.precision, measure.recall, measure.nrm):
-                        writer.writerow({   constants.HEADER_PATH_IMG: img_name, 
-                                            constants.HEADER_FM: fm,
-                                            constants.HEADER_PRECISION: precision,
-                                            constants.HEADER_RECALL: recall,
-                                            constants.HEADER_NRM: nrm
-                        })
+                    for idx, (img_name, fm, precision, recall, nrm) in enumerate(zip(
+                        measure.img_names, measure.fm, measure.precision, measure.recall, measure.nrm)):
+                        row = { constants.HEADER_PATH_IMG: img_name, 
+                                constants.HEADER_FM: fm,
+                                constants.HEADER_PRECISION: precision,
+                                constants.HEADER_RECALL: recall,
+                                constants.HEADER_NRM: nrm
+                                }
+                        if fg_classes:
+                            row[constants.HEADER_FG_CLASS] = measure.fg_class
+                        if objects:
+                            row.update({header: int(getattr(measure, header)[idx]) for header in object_headers})
+                        writer.writerow(row)
+    os.replace(tmp_path, path_csv)
+
+def write_leaderboard(path_csv, measures):
+    # Ranks the methods by their mean fm:
+    ranked = sorted(measures, key=lambda m: m.mean_fm, reverse=True)
+    with open(path_csv, 'w', newline='') as csvfile:
+        headers = [constants.HEADER_RANK, constants.HEADER_PATH_IMG, constants.HEADER_FM, constants.HEADER_PRECISION, 
+                    constants.HEADER_RECALL, constants.HEADER_NUM_IMGS]
+        writer = csv.DictWriter(csvfile, fieldnames=headers)
+        writer.writeheader()
+        for rank, measure in enumerate(ranked, 1):
+            writer.writerow({   constants.HEADER_RANK: rank,
+                                constants.HEADER_PATH_IMG: measure.path_img,
+                                constants.HEADER_FM: measure.mean_fm,
+                                constants.HEADER_PRECISION: measure.mean_precision,
+                                constants.HEADER_RECALL: measure.mean_recall,
+                                constants.HEADER_NUM_IMGS: len(measure.img_names)
+            })
+
+def compare_page(gt_path, img_paths, fg_type: constants.FGType = constants.FGType.REGULAR, invert_img = False, gt_cache = None):
+    """
+    Scores the result images of several methods for a single ground truth page, which is decoded only once.
+
+    Returns a list with a PerformanceResult for each image path (None for missing images).
+    """
+    if gt_cache is not None:
+        gt, ignore = gt_cache.get(gt_path, fg_type)
+    else:
+        gt, ignore = f_measure.gt_masks(f_measure.read_gt(gt_path, fg_type), fg_type)
+
+    results = []
+    for img_path in img_paths:
+        if img_path is None:
+            results.append(None)
+        else:
+            img = f_measure.read_img(img_path, fg_type)
+            results.append(f_measure.PerformanceResult.from_masks(img, gt, ignore, invert_img))
+
+    return results
+
+class MethodComparison:
+    """
+    Evaluates several method folders in a single pass over the ground truth set.
+
+    For each ground truth page, the ground truth is loaded once and the outputs of all methods for this page are
+    scored. The results are stored in the FolderMeasure objects of the methods, as done by
+    FolderMeasure.batch_measure.
+    """
+
+    def __init__(self, measures):
+        self.measures = measures
+
+    def batch_measure(self, fg_type: constants.FGType = constants.FGType.REGULAR):
+
+        import tqdm
+        if any(m.dibco_metrics for m in self.measures):
+            raise Exception('The comparison does not support the dibco metrics.')
+
+        # Index the result images of each method by their file name:
+        method_imgs = []
+        for measure in self.measures:
+            img_names = measure.filter_img_names(get_image_files(measure.path_img))
+            method_imgs.append({os.path.basename(img_name): img_name for img_name in img_names})
+        page_names = sorted(set().union(*method_imgs))
+        if not page_names:
+            raise Exception('No image found.')
+
+        first = self.measures[0]
+        gt_files = [first.get_gt_file(page_name, first.TYPE_GT) for page_name in page_names]
+        img_paths = [[imgs.get(page_name) for imgs in method_imgs] for page_name in page_names]
+        n = len(page_names)
+        page_results = map_images(compare_page, first.jobs, gt_files, img_paths, [fg_type] * n, 
+                        [first.invert_imgs] * n, [first.gt_cache] * n)
+
+        method_results = [[] for _ in self.measures]
+        for page_paths, results in zip(img_paths, tqdm.tqdm(page_results, total=n)):
+            for img_name, result, evaluated in zip(page_paths, results, method_results):
+
+                if result is None or result.fm == -1:
+                    continue
+
+                if math.isnan(result.fm):
+                    print(img_name)
+
+                evaluated.append((img_name, result))
+
+        for measure, evaluated in zip(self.measures, method_results):
+            measure.store_results([img_name for img_name, _ in evaluated], [result for _, result in evaluated])
+
+class MultiClassEvaluation:
+    """
+    Evaluates several FGTypes of a method folder in a single pass (see f_measure.MultiClassMeasure).
+
+    Each page is decoded once and all classes and their union are scored. The results of each class are stored in an
+    own FolderMeasure of the folder, labeled by its fg_class, as done by FolderMeasure.batch_measure.
+    """
+
+    def __init__(self, measures, fg_types):
+        # measures: a FolderMeasure of the folder for each class in fg_types, followed by the one of their union
+        self.measures = measures
+        self.fg_types = fg_types
+        if len(measures) != len(fg_types) + 1:
+            raise Exception('A FolderMeasure is required for each class and for the union of the classes.')
+        for measure, name in zip(measures, [fg_type.name for fg_type in fg_types] + [f_measure.COMBINED]):
+            measure.fg_class = name
+
+    def batch_measure(self):
+
+        first = self.measures[0]
+        if first.dibco_metrics or first.band_height > 0:
+            raise Exception('The multi-class evaluation does not support the dibco metrics and the tiled evaluation.')
+
+        with profiler.stage('glob'):
+            img_names = first.image_names()
+        gt_files = [first.get_gt_file(img_name, first.TYPE_GT) for img_name in img_names]
+        mc = f_measure.MultiClassMeasure(first.path_img, first.path_gt, self.fg_types, first.invert_imgs, first.gt_cache)
+        settings = ('fm_classes', tuple(fg_type.value for fg_type in self.fg_types), first.invert_imgs)
+
+        class_results = [[] for _ in self.measures]
+        for img_name, result in zip(img_names, first.calc_results(mc, settings, img_names, gt_files)):
+            for measure, evaluated in zip(self.measures, class_results):
+                r = result[measure.fg_class]
+                # Pages without the class are excluded, as in FolderMeasure.batch_measure:
+                if r.fm == -1:
+                    continue
+                evaluated.append((img_name, r))
+
+        if first.pipeline is not None:
+            print(first.pipeline.summary())
+
+        profiler.count('images', len(img_names))
+        with profiler.stage('aggregation'):
+            for measure, evaluated in zip(self.measures, class_results):
+                measure.store_results([img_name for img_name, _ in evaluated], [r for _, r in evaluated])
+
+def main():  
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path_gt", help="path to the ground truth images")
+    parser.add_argument("path_img", help="path to the result images")
+    parser.add_argument("path_csv", help="path to the csv output file")
+    parser.add_argument("-dt", "--dibco_tool", help="use dibco tool", action="store_true")
+    parser.add_argument("-dn", "--dibco_native", help="compute the dibco metrics without the dibco tool; missing weight files are replaced by approximate weights, hence the pseudo metrics are labeled with _approx in the csv file and are not comparable to published dibco results", action="store_true")
+    parser.add_argument('--path_dibco_bin', nargs='?', const='', default='')
+    parser.add_argument("--dibco_timeout", help="seconds after which a run of the dibco tool is aborted", type=float, default=600)
+    parser.add_argument('-fg_type', nargs='?', const=0, default=0, type=int)
+    parser.add_argument("--fg_types", help="evaluate these foreground types and their union in a single pass (e.g. 1 2)", nargs='+', type=int, default=None)
+    parser.add_argument("-s", "--subfolders", help="evaluate subfolders", action="store_true")
+    parser.add_argument("-f", "--file_results", help="save results for each file", action="store_true")
+    parser.add_argument("-i", "--invert_imgs", help="invert input images", action="store_true")
+    parser.add_argument("--weight_cache", help="directory of the cached dibco weights (used with --dibco_native)", default=None)
+    parser.add_argument("--weight_cache_size", help="maximum size of the weight cache (computed weights and binary copies of the dibco weight files) in MB, the least recently used files are removed", type=int, default=8192)
+    parser.add_argument("--gt_cache", help="directory to persist the decoded ground truth masks", default=None)
+    parser.add_argument("--gt_cache_size", help="size of the in-memory ground truth cache in MB", type=int, default=1024)
+    parser.add_argument("--gt_cache_disk_size", help="maximum size of the ground truth cache directory (--gt_cache) in MB", type=int, default=4096)
+    parser.add_argument("-c", "--compare", help="evaluate the subfolders in a single pass over the ground truth", action="store_true")
+    parser.add_argument("--sweep", help="evaluate grayscale images for all thresholds", action="store_true")
+    parser.add_argument("--result_cache", help="directory of the persistent result cache", default=None)
+    parser.add_argument("--result_cache_size", help="maximum size of the result cache in MB", type=int, default=256)
+    parser.add_argument("--clear_result_cache", help="invalidate all results in the result cache", action="store_true")
+    parser.add_argument("--band_height", help="evaluate large images in bands of this many rows (0 = whole images); with --dibco_native, missing weights (no weight files and not in the weight cache) are computed from the whole ground truth image", type=int, default=0)
+    parser.add_argument("--prefetch", help="number of images decoded ahead in background threads (0 = off)", type=int, default=0)
+    parser.add_argument("-r", "--resume", help="resume the run, skip the images already in the result log", action="store_true")
+    parser.add_argument("--export", help="write the single results next to the csv file in this format", choices=result_store.EXPORT_FORMATS, default=None)
+    parser.add_argument("--objects", help="compute the object-level (connected component) errors: missed, false positive, split and merged objects", action="store_true")
+    parser.add_argument("--tiles", help="write the error maps of a grid of ROWSxCOLS tiles per page and their heatmaps per folder (e.g. 16x16)", default=None)
+    parser.add_argument("--bootstrap", help="number of bootstrap resamples for the confidence intervals and significance tests of the fm (0 = off)", type=int, default=0)
+    parser.add_argument("--shard", help="evaluate solely the shard i/N of the images and write a shard file (merge with shards.py)", default=None)
+    parser.add_argument("--watch", help="keep running and evaluate new and changed images, polling every WATCH seconds", type=float, default=0)
+    parser.add_argument("--profile", help="write the timing of the evaluation stages to this JSON trace file", default=None)
+    parser.add_argument("-j", "--jobs", help="number of worker processes (0 = all cores)", type=int, default=1)
+    args = parser.parse_args()
+
+    # Imported after parsing the arguments, so that --help does not load it:
+    import tqdm
+    dibco_metrics = args.dibco_tool or args.dibco_native
+    if args.profile:
+        profiler.enable()
+
+    shard = None
+    path_out = args.path_csv
+    if args.watch > 0 and (args.compare or args.sweep or args.shard):
+        raise Exception('--watch cannot be combined with --compare, --sweep or --shard.')
+    fg_types = None
+    if args.fg_types:
+        fg_types = [constants.map_fg_type(fg_type) for fg_type in args.fg_types]
+        if args.compare or args.sweep or args.shard or args.watch > 0 or dibco_metrics or args.band_height > 0:
+            raise Exception('--fg_types cannot be combined with --compare, --sweep, --shard, --watch, --band_height or the dibco metrics.')
+    if args.objects and (args.compare or args.sweep or fg_types or dibco_metrics or args.band_height > 0):
+        raise Exception('--objects cannot be combined with --compare, --sweep, --fg_types, --band_height or the dibco metrics.')
+    if args.shard:
+        shard = shards.parse_shard(args.shard)
+        if args.compare or args.sweep:
+            raise Exception('--shard cannot be combined with --compare or --sweep.')
+        # Each shard has its own result log:
+        path_out = shards.shard_name(args.path_csv, shard)
+
+    # The decoded ground truth is shared by all folders:
+    gt_masks_cache = gt_cache.GTCache(args.gt_cache_size << 20, args.gt_cache, args.gt_cache_disk_size << 20)
+
+    # Stream the single results to disk, so that an interrupted run can be resumed:
+    settings = {'path_gt': os.path.abspath(args.path_gt), 'path_img': os.path.abspath(args.path_img), 'fg_type': args.fg_type,
+                'dibco_tool': args.dibco_tool, 'dibco_native': args.dibco_native, 'invert_imgs': args.invert_imgs}
+    tile_grid = None
+    if args.tiles:
+        tile_grid = error_maps.parse_grid(args.tiles)
+        if args.compare or args.sweep or args.shard or args.watch > 0 or fg_types or dibco_metrics or args.band_height > 0:
+            raise Exception('--tiles cannot be combined with --compare, --sweep, --shard, --watch, --fg_types, --band_height or the dibco metrics.')
+        settings['tiles'] = list(tile_grid)
+    if fg_types:
+        settings['fg_types'] = args.fg_types
+    if args.objects:
+        settings['objects'] = True
+    log = result_log.ResultLog(path_out, settings, args.resume)
+
+    # Reuse the results of unchanged images from previous runs:
+    cache = None
+    if args.result_cache:
+        cache = result_cache.ResultCache(args.result_cache, args.result_cache_size << 20)
+        if args.clear_result_cache:
+            cache.clear()
+
+    measures = []
+    if args.subfolders or args.compare:
+        folders = sorted(glob.glob(os.path.join(args.path_img, '*', '')))
+    else:
+        folders = [args.path_img]
+
+    def folder_measure(folder):
+        return FolderMeasure(folder, args.path_gt, args.dibco_tool, args.path_dibco_bin, args.invert_imgs, True, args.jobs, args.dibco_native, args.weight_cache, gt_masks_cache, log, cache, args.band_height, args.prefetch, args.dibco_timeout, args.objects, tile_grid, args.weight_cache_size << 20)
+
+    def write_results(measures):
+        statistics = None
+        if args.bootstrap > 0:
+            import significance
+            statistics = significance.folder_statistics(measures, args.bootstrap)
+        write_csv(args.path_csv, measures, dibco_metrics, args.file_results, statistics)
+        if args.compare:
+            write_leaderboard(os.path.splitext(args.path_csv)[0] + '_leaderboard.csv', measures)
+        if args.export:
+            return result_store.write_results(args.path_csv, measures, args.export)
+
+    # One process pool is used for all folders, hence the workers keep their ground truth cache across the folders (and
+    # in the watch mode between the polls):
+    start_pool(args.jobs)
+    if args.watch > 0:
+        import watch
+        # The FolderMeasures are kept alive between the polls:
+        watcher = watch.Watcher(args.path_img, args.subfolders, folder_measure, constants.map_fg_type(args.fg_type), write_results, log)
+        measures = watcher.run(args.watch)
+    elif args.compare:
+        measures = [FolderMeasure(folder, args.path_gt, args.dibco_tool, args.path_dibco_bin, args.invert_imgs, True, args.jobs, args.dibco_native, args.weight_cache, gt_masks_cache) 
+                        for folder in folders]
+        MethodComparison(measures).batch_measure(constants.map_fg_type(args.fg_type))
+        for measure in measures:
+            print(measure.path_img)
+            tqdm.tqdm.write("Mean FM: %f" % measure.mean_fm)
+    else:
+        if shard is not None:
+            # The images are distributed over the shards by their index in the sorted list of all (folder, image) items:
+            items = [(folder, img_name) for folder in folders for img_name in folder_measure(folder).image_names()]
+            assigned = shards.assign(items, shard)
+
+        for folder in tqdm.tqdm(folders):
+            measure = folder_measure(folder)
+            if shard is not None:
+                measure.img_subset = assigned[folder]
+                if not measure.img_subset:
+                    continue
+            log.start_folder(folder)
+            if fg_types:
+                class_measures = [measure] + [folder_measure(folder) for _ in fg_types]
+                MultiClassEvaluation(class_measures, fg_types).batch_measure()
+            elif args.sweep:
+                measure.batch_sweep(constants.map_fg_type(args.fg_type))
+            else:
+                measure.batch_measure(constants.map_fg_type(args.fg_type))    
+            log.complete_folder(folder)
+            # This is a safety message to see if we got many wrong results...
+            print(folder)
+            if fg_types:
+                measures.extend(class_measures)
+                for m in class_measures:
+                    tqdm.tqdm.write("Mean FM (%s): %f" % (m.fg_class, m.mean_fm))
+            else:
+                measures.append(measure)
+                tqdm.tqdm.write("Mean FM: %f" % measure.mean_fm)
+    stop_pool()
+        
+    log.close()
+    if cache is not None:
+        print('Result cache: %d hits, %d misses' % (cache.hits, cache.misses))
+        cache.close()
+
+    with profiler.stage('write_csv'):
+        if shard is not None:
+            path_shard = shards.write_shard(args.path_csv, shard, settings, folders, items, measures, dibco_metrics)
+            print('Shard %d of %d written to %s' % (shard[0], shard[1], path_shard))
+        elif args.sweep:
+            write_sweep_csv(args.path_csv, measures, args.file_results)
+        else:
+            path_export = write_results(measures)
+            if path_export:
+                print('Results exported to %s' % path_export)
+            if tile_grid is not None:
+                print('Error maps written to %s' % error_maps.write_error_maps(args.path_csv, measures))
+
+    if args.profile:
+        profiler.export(args.profile)
+        print(profiler.profiler.summary())
+        profiler.disable()
+
 if __name__ == "__main__":
     main()     
@@ -1,5 +1,8 @@
 from enum import Enum
 
+# Version of the metric implementations, results computed with another version are not reused:
+METRIC_VERSION = 2
+
 def map_fg_type(fg_type: int):
     if fg_type == 0:
         return FGType.REGULAR
@@ -7,6 +10,8 @@ def map_fg_type(fg_type: int):
         return FGType.MSBIN_FG_1
     elif fg_type == 2:
         return FGType.MSBIN_FG_2
+    elif fg_type == 3:
+        return FGType.MSTEX_FG_GREEN
     else:
         raise Exception('The input number given cannot be mapped to an FGType.')
 
@@ -33,5 +38,23 @@ HEADER_DRD = 'drd'
 HEADER_PSEUDO_FM = 'pseudo_fm'
 HEADER_PSEUDO_RECALL = 'pseudo_recall'
 HEADER_PSEUDO_PRECISION = 'pseudo_precision'
+# Headers of the pseudo metrics, if weight files are missing and the weights are computed (see dibco_weights):
+HEADER_PSEUDO_FM_APPROX = 'pseudo_fm_approx'
+HEADER_PSEUDO_RECALL_APPROX = 'pseudo_recall_approx'
+HEADER_PSEUDO_PRECISION_APPROX = 'pseudo_precision_approx'
 HEADER_PSNR = 'psnr'
-HEADER_NRM = 'nrm'
\ No newline at end of file
+HEADER_NRM = 'nrm'
+HEADER_THRESHOLD = 'threshold'
+HEADER_RANK = 'rank'
+HEADER_NUM_IMGS = 'num_imgs'
+HEADER_FG_CLASS = 'fg_class'
+HEADER_GT_OBJECTS = 'gt_objects'
+HEADER_MISSED_OBJECTS = 'missed_objects'
+HEADER_FP_OBJECTS = 'fp_objects'
+HEADER_SPLIT_OBJECTS = 'split_objects'
+HEADER_MERGED_OBJECTS = 'merged_objects'
+HEADER_CI_LOW = 'fm_ci_low'
+HEADER_CI_HIGH = 'fm_ci_high'
+HEADER_REFERENCE = 'reference'
+HEADER_P_BOOTSTRAP = 'p_bootstrap'
+HEADER_P_PERMUTATION = 'p_permutation'
\ No newline at end of file
@@ -1,6 +1,13 @@
 import subprocess
 import re
 import os
+import asyncio
+import concurrent.futures
+import math
+import cv2
+import numpy as np
+import dibco_weights
+import profiler
 
 class DibcoResult:
 
@@ -19,7 +26,23 @@ class DibcoResult:
         return self.file_name + ":\nFM: %f\np-FM: %f\nDRD: %f\nPSNR: %f\nR: %f\nP: %f\np-R: %f\np-P: %f" % (
             self.fm, self.pseudo_fm, self.drd, self.psnr, self.recall, self.precision, self.pseudo_recall, self.pseudo_precision)
 
+# Raised if DIBCO_metrics.exe fails, times out or writes output that cannot be parsed:
+class DibcoToolError(Exception):
+    pass
+
+# Seconds after which a single run of the DIBCO tool is aborted:
+DIBCO_TOOL_TIMEOUT = 600
+# Number of additional attempts after a failed run of the DIBCO tool:
+DIBCO_TOOL_RETRIES = 2
+
 class DibcoWrapper:
+    """
+    Runs DIBCO_metrics.exe for each image.
+
+    The tool is started without a shell. Runs that time out, fail or write malformed output are repeated up to
+    retries times, before a DibcoToolError is raised. map and map_async run up to max_workers instances of the tool at
+    once: as the work is done in the tool processes, threads (or the asyncio event loop) suffice to drive them.
+    """
 
     IDX_FM = 0
     IDX_PSEUDO_FM = 1
@@ -29,31 +52,304 @@ class DibcoWrapper:
     IDX_PRECISION = 5
     IDX_PSEUDO_RECALL = 6
     IDX_PSEUDO_PRECISION = 7
+    NUM_VALUES = 8
 
     # parameterized constructor 
-    def __init__(self, path_binary: str): 
+    def __init__(self, path_binary: str, max_workers: int = 1, timeout: float = DIBCO_TOOL_TIMEOUT, retries: int = DIBCO_TOOL_RETRIES): 
         self.path_binary = path_binary
-        # self.weight_path = weight_path
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.retries = retries
+
+    def args(self, img_path: str, gt_path: str, recall_weight_path: str, precision_weight_path: str):
+        return [self.path_binary, gt_path, img_path, recall_weight_path, precision_weight_path]
 
     def calc(self, img_path: str, gt_path: str, recall_weight_path: str, precision_weight_path: str) -> DibcoResult:
 
-        args = [self.path_binary, gt_path, img_path, recall_weight_path, precision_weight_path]
-        p = subprocess.Popen(args, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-        output = p.stdout.read().decode("utf8")
+        args = self.args(img_path, gt_path, recall_weight_path, precision_weight_path)
+        errors = []
+        for _ in range(self.retries + 1):
+            try:
+                with profiler.stage('dibco_tool', img_path):
+                    p = subprocess.run(args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                        timeout=self.timeout)
+                with profiler.stage('parsing', img_path):
+                    return self.parse(p.stdout.decode("utf8", errors="replace"), img_path, p.returncode)
+            except subprocess.TimeoutExpired:
+                errors.append('timeout after %g s' % self.timeout)
+            except DibcoToolError as e:
+                errors.append(str(e))
+            profiler.count('dibco_tool_retries')
+
+        raise DibcoToolError(self.failure_message(img_path, errors))
+
+    async def calc_async(self, img_path: str, gt_path: str, recall_weight_path: str, precision_weight_path: str,
+                            semaphore = None) -> DibcoResult:
+        """Asynchronous version of calc. If an asyncio.Semaphore is given, the tool is run while holding it."""
+
+        args = self.args(img_path, gt_path, recall_weight_path, precision_weight_path)
+        errors = []
+        for _ in range(self.retries + 1):
+            try:
+                if semaphore is not None:
+                    async with semaphore:
+                        output, returncode = await self.run_async(args)
+                else:
+                    output, returncode = await self.run_async(args)
+                return self.parse(output, img_path, returncode)
+            except asyncio.TimeoutError:
+                errors.append('timeout after %g s' % self.timeout)
+            except DibcoToolError as e:
+                errors.append(str(e))
+
+        raise DibcoToolError(self.failure_message(img_path, errors))
+
+    async def run_async(self, args):
+        p = await asyncio.create_subprocess_exec(*args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, 
+                                                    stderr=subprocess.STDOUT)
+        try:
+            output, _ = await asyncio.wait_for(p.communicate(), self.timeout)
+        except asyncio.TimeoutError:
+            p.kill()
+            await p.wait()
+            raise
+
+        return output.decode("utf8", errors="replace"), p.returncode
+
+    def map(self, *iterables):
+        """Applies calc to the items of the iterables with up to max_workers runs of the tool at once, in order."""
+        if self.max_workers == 1:
+            yield from map(self.calc, *iterables)
+            return
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            yield from executor.map(self.calc, *iterables)
+
+    async def map_async(self, *iterables):
+        """Asynchronous version of map, returns the list of the results."""
+        semaphore = asyncio.Semaphore(self.max_workers)
+        return await asyncio.gather(*[self.calc_async(*args, semaphore=semaphore) for args in zip(*iterables)])
+
+    def failure_message(self, img_path: str, errors) -> str:
+        return 'The DIBCO tool failed for %s after %d attempts:\n%s' % (img_path, len(errors), '\n'.join(errors))
+
+    def parse(self, output: str, img_path: str, returncode: int = 0) -> DibcoResult:
+
         # Replace the special characters:
         clean_output = re.sub("\t|\r", "", output)
         # Get a string list containing solely the values:
         values = re.findall(":(.*?)\n", clean_output)
+        try:
+            values = [float(v) for v in values[:self.NUM_VALUES]]
+        except ValueError:
+            values = []
+        if returncode != 0 or len(values) < self.NUM_VALUES:
+            raise DibcoToolError('exit code %d, output: %s' % (returncode, output.strip()[:500] if output.strip() else '(empty)'))
 
         m = DibcoResult()
-        m.fm = float(values[self.IDX_FM])
-        m.pseudo_fm = float(values[self.IDX_PSEUDO_FM])
-        m.psnr = float(values[self.IDX_PSNR])
-        m.drd = float(values[self.IDX_DRD])
-        m.recall = float(values[self.IDX_RECALL])
-        m.precision = float(values[self.IDX_PRECISION])
-        m.pseudo_recall = float(values[self.IDX_PSEUDO_RECALL])
-        m.pseudo_precision = float(values[self.IDX_PSEUDO_PRECISION])
+        m.fm = values[self.IDX_FM]
+        m.pseudo_fm = values[self.IDX_PSEUDO_FM]
+        m.psnr = values[self.IDX_PSNR]
+        m.drd = values[self.IDX_DRD]
+        m.recall = values[self.IDX_RECALL]
+        m.precision = values[self.IDX_PRECISION]
+        m.pseudo_recall = values[self.IDX_PSEUDO_RECALL]
+        m.pseudo_precision = values[self.IDX_PSEUDO_PRECISION]
+
+        # set the file name:
+        m.file_name = os.path.basename(img_path)
+
+        return m
+
+# Parameters of the Distance Reciprocal Distortion (DRD) metric [Lu et al. 2004]:
+DRD_WINDOW_SIZE = 5
+DRD_BLOCK_SIZE = 8
+
+def read_weights(path: str, shape, weight_cache_dir: str = None) -> np.ndarray:
+    """
+    Reads a pseudo-recall or pseudo-precision weight file and returns the weights as an image with the given shape.
+
+    The .dat files written by the DIBCO weight tool contain one whitespace separated value per pixel (in row order),
+    optionally preceded by the image dimensions. They are converted once into binary files in the weight cache (see
+    dibco_weights.WeightCache.read_weights), which are memory mapped.
+    """
+    return dibco_weights.WeightCache(weight_cache_dir).read_weights(path, shape)
+
+def drd_weight_matrix(size: int = DRD_WINDOW_SIZE) -> np.ndarray:
+    # Normalized reciprocal distances to the center pixel:
+    n = size // 2
+    y, x = np.mgrid[-n:n + 1, -n:n + 1]
+    dist = np.hypot(x, y)
+    w = np.divide(1, dist, out=np.zeros_like(dist), where=dist > 0)
+    return w / np.sum(w)
+
+def count_nonuniform_blocks(gt, block_size: int = DRD_BLOCK_SIZE) -> int:
+    # Counts the blocks in the ground truth, which contain foreground and background pixels:
+    h, w = gt.shape
+    padded = np.pad(gt.astype(np.uint8), ((0, -h % block_size), (0, -w % block_size)))
+    rows, cols = padded.shape[0] // block_size, padded.shape[1] // block_size
+    fg_sums = padded.reshape(rows, block_size, cols, block_size).sum(axis=(1, 3), dtype=np.int64)
+    # The blocks at the right and bottom border might be cut off by the image border:
+    block_heights = np.minimum(block_size, h - np.arange(rows) * block_size)
+    block_widths = np.minimum(block_size, w - np.arange(cols) * block_size)
+    block_sizes = np.outer(block_heights, block_widths)
+
+    return int(np.count_nonzero((fg_sums > 0) & (fg_sums < block_sizes)))
+
+def drd_distortion(img, gt, gt_context = None, top: int = 0) -> float:
+    """
+    Returns the sum of the distortions DRD_k of all flipped pixels k in the binary foreground images img and gt.
+
+    For a flipped pixel k, DRD_k is the weighted sum of |gt - img(k)| in the 5x5 neighbourhood of k. Both cases
+    img(k) = 0 and img(k) = 1 are obtained for all pixels at once from a single filtering of the ground truth.
+    If img and gt are horizontal bands of larger images, gt_context holds the gt band extended by (up to) two rows
+    above and below and top is the row of the band within gt_context.
+    """
+    if gt_context is None:
+        gt_context = gt
+    w = drd_weight_matrix()
+    gt_float = gt_context.astype(np.float32)
+    # Pixels outside the image do not contribute to the neighbourhood sums:
+    rows = slice(top, top + gt.shape[0])
+    gt_sum = cv2.filter2D(gt_float, -1, w, borderType=cv2.BORDER_CONSTANT)[rows]
+    weight_sum = cv2.filter2D(np.ones_like(gt_float), -1, w, borderType=cv2.BORDER_CONSTANT)[rows]
+
+    flipped = img != gt
+    drd_fg = np.sum(weight_sum - gt_sum, where=flipped & img, dtype=np.float64)
+    drd_bg = np.sum(gt_sum, where=flipped & ~img, dtype=np.float64)
+
+    return drd_fg + drd_bg
+
+def calc_drd(img, gt) -> float:
+    """Computes the Distance Reciprocal Distortion of the binary foreground images img and gt."""
+    nubn = count_nonuniform_blocks(gt)
+    if nubn == 0:
+        return 0.0
+
+    return drd_distortion(img, gt) / nubn
+
+def calc_psnr(img, gt) -> float:
+    # The difference between the two binary images is either 0 or 1 - hence C = 1:
+    return psnr_from_mse(np.count_nonzero(img != gt) / img.size)
+
+def psnr_from_mse(mse: float) -> float:
+    if mse == 0:
+        return math.inf
+
+    return 10 * math.log10(1 / mse)
+
+def f_score(recall: float, precision: float) -> float:
+    if recall + precision == 0:
+        return 0.0
+
+    return 2 * recall * precision / (recall + precision)
+
+# Indices of the sums returned by dibco_sums:
+SUM_TP = 0
+SUM_GT = 1
+SUM_IMG = 2
+SUM_RECALL_WEIGHTS_TP = 3
+SUM_RECALL_WEIGHTS_GT = 4
+SUM_PRECISION_WEIGHTS_TP = 5
+SUM_PRECISION_WEIGHTS_IMG = 6
+SUM_DRD = 7
+SUM_NUBN = 8
+SUM_FLIPPED = 9
+SUM_PIXELS = 10
+NUM_SUMS = 11
+
+def dibco_sums(img, gt, recall_weights, precision_weights, gt_context = None, top: int = 0) -> np.ndarray:
+    """
+    Returns the additive quantities from which all DIBCO metrics are derived (see dibco_result_from_sums).
+
+    The sums of horizontal bands can be added up, if the bands start at multiples of DRD_BLOCK_SIZE rows (see
+    drd_distortion for gt_context and top).
+    """
+    tp_img = img & gt
+    sums = np.zeros(NUM_SUMS)
+    sums[SUM_TP] = np.count_nonzero(tp_img)
+    sums[SUM_GT] = np.count_nonzero(gt)
+    sums[SUM_IMG] = np.count_nonzero(img)
+    # Pseudo-recall: weighted recall of the ground truth, pseudo-precision: weighted precision of the result:
+    sums[SUM_RECALL_WEIGHTS_TP] = np.sum(recall_weights, where=tp_img, dtype=np.float64)
+    sums[SUM_RECALL_WEIGHTS_GT] = np.sum(recall_weights, where=gt, dtype=np.float64)
+    sums[SUM_PRECISION_WEIGHTS_TP] = np.sum(precision_weights, where=tp_img, dtype=np.float64)
+    sums[SUM_PRECISION_WEIGHTS_IMG] = np.sum(precision_weights, where=img, dtype=np.float64)
+    sums[SUM_DRD] = drd_distortion(img, gt, gt_context, top)
+    sums[SUM_NUBN] = count_nonuniform_blocks(gt)
+    sums[SUM_FLIPPED] = np.count_nonzero(img != gt)
+    sums[SUM_PIXELS] = img.size
+
+    return sums
+
+def percentage(numerator, denominator) -> float:
+    return 100 * numerator / denominator if denominator > 0 else 0.0
+
+def dibco_result_from_sums(sums) -> DibcoResult:
+    m = DibcoResult()
+    m.recall = percentage(sums[SUM_TP], sums[SUM_GT])
+    m.precision = percentage(sums[SUM_TP], sums[SUM_IMG])
+    m.fm = f_score(m.recall, m.precision)
+    m.pseudo_recall = percentage(sums[SUM_RECALL_WEIGHTS_TP], sums[SUM_RECALL_WEIGHTS_GT])
+    m.pseudo_precision = percentage(sums[SUM_PRECISION_WEIGHTS_TP], sums[SUM_PRECISION_WEIGHTS_IMG])
+    m.pseudo_fm = f_score(m.pseudo_recall, m.pseudo_precision)
+    m.drd = sums[SUM_DRD] / sums[SUM_NUBN] if sums[SUM_NUBN] > 0 else 0.0
+    m.psnr = psnr_from_mse(sums[SUM_FLIPPED] / sums[SUM_PIXELS])
+
+    return m
+
+def calc_dibco_result(img, gt, recall_weights, precision_weights) -> DibcoResult:
+    """
+    Computes all metrics of the DIBCO evaluation tool for the binary foreground images img and gt.
+
+    The recall and precision weights are the per-pixel weights used for the pseudo-recall and the pseudo-precision
+    [Ntirogiannis et al. 2013]. As in DIBCO_metrics.exe, the (pseudo) F-measure, recall and precision are given in
+    percent.
+    """
+    return dibco_result_from_sums(dibco_sums(img, gt, recall_weights, precision_weights))
+
+class DibcoMeasure:
+    """
+    Native (NumPy) implementation of the DIBCO metrics.
+
+    calc has the same signature as DibcoWrapper.calc, but does not need DIBCO_metrics.exe. Images follow the DIBCO
+    convention: the foreground is black and the background is white.
+    If no weight files are given, the weights are computed and cached with dibco_weights.WeightCache.
+    """
+
+    def __init__(self, weight_cache_dir: str = None, weight_cache_size: int = None):
+        self.weight_cache = dibco_weights.WeightCache(weight_cache_dir, weight_cache_size)
+
+    def calc(self, img_path: str, gt_path: str, recall_weight_path: str = None, precision_weight_path: str = None) -> DibcoResult:
+
+        return self.score(*self.load(img_path, gt_path, recall_weight_path, precision_weight_path))
+
+    def load(self, img_path: str, gt_path: str, recall_weight_path: str = None, precision_weight_path: str = None):
+        """Reads the images and the weights, returns the tuple (img_path, img, gt, recall_weights, precision_weights)."""
+
+        with profiler.stage('decode', img_path):
+            img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+            gt = cv2.imread(gt_path, cv2.IMREAD_GRAYSCALE)
+        if img is None or gt is None:
+            raise Exception('Cannot read %s or %s.' % (img_path, gt_path))
+        if img.shape != gt.shape:
+            raise Exception('The image %s and the ground truth differ in size.' % img_path)
+
+        with profiler.stage('weights', img_path):
+            if recall_weight_path and precision_weight_path:
+                recall_weights = self.weight_cache.read_weights(recall_weight_path, gt.shape)
+                precision_weights = self.weight_cache.read_weights(precision_weight_path, gt.shape)
+            else:
+                recall_weights, precision_weights = self.weight_cache.get(gt_path)
+
+        return img_path, img, gt, recall_weights, precision_weights
+
+    def score(self, img_path: str, img, gt, recall_weights, precision_weights) -> DibcoResult:
+
+        with profiler.stage('masking', img_path):
+            img, gt = img < 128, gt < 128
+        with profiler.stage('dibco_metrics', img_path):
+            m = calc_dibco_result(img, gt, recall_weights, precision_weights)
 
         # set the file name:
         m.file_name = os.path.basename(img_path)
@@ -64,10 +360,18 @@ def main():
     
     metric_path = "C:\\cvl\\msi\\code\\eval\\dibco\\dibco_metrics\\DIBCO_metrics.exe"
     # weight_path = "C:\cvl\msi\code\eval\dibco\BinEvalWeights\\BinEvalWeights.exe"
-    dibco = DibcoWrapper(metric_path)
-    
-    m = dibco.calc('PR_bin.bmp', 'PR_GT.tiff', 'PR_RWeights.dat', 'PR_PWeights.dat')
-    print(m)
+    args = ['PR_bin.bmp', 'PR_GT.tiff', 'PR_RWeights.dat', 'PR_PWeights.dat']
+
+    m_native = DibcoMeasure().calc(*args)
+    print(m_native)
+
+    # Validate the native implementation against the reference values of the DIBCO tool:
+    if os.path.exists(metric_path):
+        dibco = DibcoWrapper(metric_path)
+        m = dibco.calc(*args)
+        print(m)
+        for attr in ['fm', 'pseudo_fm', 'drd', 'psnr', 'recall', 'precision', 'pseudo_recall', 'pseudo_precision']:
+            print('%s: native %f, reference %f' % (attr, getattr(m_native, attr), getattr(m, attr)))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,188 @@
+"""Computes the pseudo-recall and pseudo-precision weights of ground truth images.
+
+The weights are an approximation of the weights of [Ntirogiannis et al. 2013], which is based on the distance
+transform and which was not validated against the weight files of the DIBCO weight tool: The recall weights emphasize
+the stroke centers of the ground truth, such that every stroke contributes according to its length and not its width.
+The precision weights lower the penalty of false positives that are located next to the strokes. Hence, pseudo metrics
+of computed weights are not comparable to published DIBCO results (binar_eval.write_csv labels them as approximate).
+The weights are cached on disk, keyed by the content hash of the ground truth file and constants.METRIC_VERSION (which
+is increased if compute_weights changes), and are loaded via memory maps. The least recently used files of the cache
+are removed, if the cache grows above its maximum size (see disk_cache).
+"""
+
+import os
+import glob
+import hashlib
+import cv2
+import numpy as np
+import constants
+import disk_cache
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'eval-binarization', 'weights')
+# Size of the chunks, in which the text weight files are parsed (in bytes):
+TEXT_CHUNK_SIZE = 1 << 24
+# Maximum size of the cache directory (the computed weights and the binary copies of the text weight files):
+DEFAULT_MAX_BYTES = 8 << 30
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+def stroke_half_width(gt, dist) -> np.ndarray:
+    """
+    Returns the local stroke half width for each foreground pixel of gt.
+
+    The maxima of the distance map (which are located on the skeleton) are propagated to the pixels lying within
+    their inscribed circle.
+    """
+    half_width = dist.copy()
+    kernel = np.ones((3, 3), np.uint8)
+    for i in range(1, int(np.ceil(dist.max())) + 1):
+        dilated = cv2.dilate(half_width, kernel)
+        # Only accept values of circles that are large enough to reach the pixel:
+        np.copyto(half_width, dilated, where=gt & (dilated > half_width) & (dilated > i))
+
+    return half_width
+
+def compute_weights(gt):
+    """
+    Computes approximate pseudo-recall and pseudo-precision weights of the binary foreground image gt (see the
+    module docstring).
+
+    Returns the tuple (recall_weights, precision_weights) as float32 images.
+    """
+    gt = gt.astype(bool)
+    if not np.any(gt):
+        return np.zeros(gt.shape, np.float32), np.ones(gt.shape, np.float32)
+
+    # Distance of the foreground pixels to the background:
+    dist = cv2.distanceTransform(gt.astype(np.uint8), cv2.DIST_L2, cv2.DIST_MASK_PRECISE)
+    half_width = stroke_half_width(gt, dist)
+
+    # Recall weights: The weights across a stroke sum up to approximately 1:
+    recall_weights = np.zeros(gt.shape, np.float32)
+    np.divide(dist, half_width * half_width, out=recall_weights, where=gt)
+
+    # Precision weights: Background pixels within the stroke width of the closest stroke are weighted by their
+    # distance, relative to that stroke width:
+    bg_dist, labels = cv2.distanceTransformWithLabels((~gt).astype(np.uint8), cv2.DIST_L2, cv2.DIST_MASK_5,
+        labelType=cv2.DIST_LABEL_PIXEL)
+    label_half_width = np.ones(labels.max() + 1, np.float32)
+    label_half_width[labels[gt]] = half_width[gt]
+    stroke_width = 2 * label_half_width[labels]
+    precision_weights = np.minimum(bg_dist / stroke_width, 1).astype(np.float32)
+    precision_weights[gt] = 1
+
+    return recall_weights, precision_weights
+
+def convert_weight_file(path: str, out_path: str) -> int:
+    """
+    Converts a text weight file (whitespace separated values) chunk-wise into a raw float32 file, hence the memory
+    usage is bounded by the chunk size. Returns the number of values.
+    """
+    count = 0
+    rest = b''
+    with open(path, 'rb') as f, open(out_path, 'wb') as out:
+        for chunk in iter(lambda: f.read(TEXT_CHUNK_SIZE), b''):
+            chunk = rest + chunk
+            # The last value might be continued in the next chunk:
+            split = max(chunk.rfind(c) for c in b' \t\r\n') + 1
+            rest = chunk[split:]
+            values = np.fromstring(chunk[:split].decode('ascii'), dtype=np.float64, sep=' ')
+            out.write(values.astype(np.float32).tobytes())
+            count += values.size
+        if rest.strip():
+            out.write(np.array([float(rest)], np.float32).tobytes())
+            count += 1
+
+    return count
+
+class WeightCache:
+    """
+    On-disk cache of the pseudo-recall and pseudo-precision weights.
+
+    Each ground truth image is stored as a single .npy file (named by the metric version and the hash of the ground
+    truth file), which contains the recall and the precision weights. The text weight files are copied into binary
+    files (see read_weights). The files are written atomically, so that multiple worker processes can share a cache
+    directory. The least recently used files are removed, if the directory takes more than max_bytes.
+    """
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = None):
+        self.cache_dir = cache_dir if cache_dir else DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes if max_bytes else DEFAULT_MAX_BYTES
+
+    def cache_path(self, gt_path: str) -> str:
+        # Weights of another metric version are stale, they are not read:
+        return os.path.join(self.cache_dir, 'v%d_%s.npy' % (constants.METRIC_VERSION, file_hash(gt_path)))
+
+    def get(self, gt_path: str, read_fg = None):
+        """
+        Returns the (memory mapped) tuple (recall_weights, precision_weights) of the ground truth image.
+
+        read_fg returns the foreground mask of the complete ground truth, if the weights are not cached yet (default:
+        the image is decoded by OpenCV).
+        """
+        path = self.cache_path(gt_path)
+        if os.path.exists(path):
+            disk_cache.touch(path)
+        else:
+            if read_fg is not None:
+                fg = read_fg()
+            else:
+                gt = cv2.imread(gt_path, cv2.IMREAD_GRAYSCALE)
+                if gt is None:
+                    raise Exception('Cannot read the ground truth image %s.' % gt_path)
+                # DIBCO convention: the foreground is black:
+                fg = gt < 128
+            weights = np.stack(compute_weights(fg))
+
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = '%s.%d.tmp' % (path, os.getpid())
+            with open(tmp_path, 'wb') as f:
+                np.save(f, weights)
+            os.replace(tmp_path, path)
+            disk_cache.evict(self.cache_dir, self.max_bytes, keep=[path])
+
+        weights = np.load(path, mmap_mode='r')
+        return weights[0], weights[1]
+
+    def weight_file_prefix(self, path: str) -> str:
+        return os.path.join(self.cache_dir, 'dat_' + hashlib.sha1(os.path.abspath(path).encode('utf8')).hexdigest())
+
+    def weight_file_path(self, path: str) -> str:
+        # The converted weight files are keyed by the path, size and modification time of the text file, which is
+        # not hashed, as it can be very large:
+        st = os.stat(path)
+        key = repr((os.path.abspath(path), st.st_size, st.st_mtime_ns)).encode('utf8')
+        return '%s_%s.f32' % (self.weight_file_prefix(path), hashlib.sha1(key).hexdigest())
+
+    def read_weights(self, path: str, shape) -> np.ndarray:
+        """
+        Returns the (memory mapped) weights of a text weight file (see dibco_measure.read_weights) as a float32 image
+        with the given shape. The text file is converted once into a binary file in the cache.
+        """
+        cache_path = self.weight_file_path(path)
+        if os.path.exists(cache_path):
+            disk_cache.touch(cache_path)
+        else:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = '%s.%d.tmp' % (cache_path, os.getpid())
+            convert_weight_file(path, tmp_path)
+            os.replace(tmp_path, cache_path)
+            # The copies of previous versions of the text file are stale:
+            for stale_path in glob.glob(glob.escape(self.weight_file_prefix(path)) + '_*.f32'):
+                if stale_path != cache_path:
+                    os.remove(stale_path)
+            disk_cache.evict(self.cache_dir, self.max_bytes, keep=[cache_path])
+
+        num_pixels = shape[0] * shape[1]
+        num_values = os.path.getsize(cache_path) // 4
+        # The values are optionally preceded by the image dimensions:
+        if num_values not in (num_pixels, num_pixels + 2):
+            raise Exception('The weight file %s does not match the image size %d x %d.' % (path, shape[1], shape[0]))
+
+        return np.memmap(cache_path, np.float32, mode='r', offset=4 * (num_values - num_pixels), shape=tuple(shape[:2]))
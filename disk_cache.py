@@ -0,0 +1,62 @@
+"""Size limit of the cache directories (dibco_weights.WeightCache, the persistent gt_cache.GTCache).
+
+The modification time of a cached file is updated whenever the file is used. If a directory grows above its maximum
+size, the least recently used files are removed, until the directory is reduced to 90% of its maximum size (like the
+result cache, see result_cache.ResultCache.evict).
+"""
+
+import os
+import time
+import fnmatch
+
+def touch(path: str):
+    """Marks the cached file as used."""
+    # The clock of the file system can be coarser than time.time_ns:
+    now = time.time_ns()
+    try:
+        os.utime(path, ns=(now, now))
+    except OSError:
+        # E.g. removed by another process in the meantime:
+        pass
+
+def evict(cache_dir: str, max_bytes: int, pattern: str = '*', keep = ()):
+    """
+    Removes the least recently used files matching pattern from cache_dir, if they take more than max_bytes. The
+    files in keep (e.g. the file, which was just written) are not removed. Returns the number of removed files.
+    """
+    files = []
+    try:
+        entries = list(os.scandir(cache_dir))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        # Temporary files are written by other processes:
+        if not fnmatch.fnmatchcase(entry.name, pattern) or entry.name.endswith('.tmp'):
+            continue
+        try:
+            st = entry.stat()
+        except FileNotFoundError:
+            continue
+        files.append((st.st_mtime_ns, st.st_size, entry.path))
+
+    nbytes = sum(size for _, size, _ in files)
+    if nbytes <= max_bytes:
+        return 0
+
+    keep = {os.path.abspath(path) for path in keep}
+    target = 0.9 * max_bytes
+    removed = 0
+    for _, size, path in sorted(files):
+        if nbytes <= target:
+            break
+        if os.path.abspath(path) in keep:
+            continue
+        try:
+            # Memory maps of removed files stay valid on POSIX systems, on Windows the removal of a mapped file fails:
+            os.remove(path)
+        except OSError:
+            continue
+        nbytes -= size
+        removed += 1
+
+    return removed
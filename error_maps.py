@@ -0,0 +1,75 @@
+"""Spatial error maps of the evaluated pages (binar_eval.py --tiles ROWSxCOLS).
+
+Each page is divided into a grid of rows x cols tiles of (nearly) equal size, hence pages of different sizes share the
+grid. The confusion counts of the tiles are computed in the same pass as the global counts (see f_measure.tile_counts).
+The error maps of a page are the FP and FN densities of its tiles, i.e. the fraction of the pixels of a tile, which are
+false positives or false negatives. The heatmaps of a folder are the means of the error maps of its pages.
+
+write_error_maps writes the counts, the error maps and the heatmaps to <path_csv without extension>_tiles.npz and the
+heatmaps as color images to the directory <path_csv without extension>_tiles.
+"""
+
+import os
+import re
+import cv2
+import numpy as np
+
+# Size of a tile in the heatmap images (in pixels):
+TILE_PIXELS = 32
+
+def parse_grid(grid: str):
+    """Parses 'ROWSxCOLS' (or a single number for a square grid) and returns the tuple (rows, cols)."""
+    match = re.fullmatch(r'\s*(\d+)\s*(?:[xX]\s*(\d+)\s*)?', grid)
+    if match is None:
+        raise Exception('The tile grid must be given as ROWSxCOLS, e.g. 16x16: %s' % grid)
+    rows = int(match.group(1))
+    cols = int(match.group(2)) if match.group(2) is not None else rows
+    if rows < 1 or cols < 1:
+        raise Exception('The tile grid must have at least one tile: %s' % grid)
+
+    return rows, cols
+
+def densities(tiles):
+    """Returns the FP and FN densities of tile counts of shape (..., 4, rows, cols) as float32 arrays (..., rows, cols)."""
+    tiles = np.asarray(tiles)
+    area = np.maximum(tiles.sum(axis=-3), 1)
+    fp = tiles[..., 1, :, :] / area
+    fn = tiles[..., 2, :, :] / area
+
+    return fp.astype(np.float32), fn.astype(np.float32)
+
+def heatmap_image(heatmap, vmax: float):
+    # Color image of a heatmap, scaled to [0, vmax]:
+    scaled = np.clip(np.asarray(heatmap) / vmax, 0, 1) if vmax > 0 else np.zeros_like(heatmap)
+    img = cv2.applyColorMap(np.round(scaled * 255).astype(np.uint8), cv2.COLORMAP_INFERNO)
+    return cv2.resize(img, None, fx=TILE_PIXELS, fy=TILE_PIXELS, interpolation=cv2.INTER_NEAREST)
+
+def write_error_maps(path_csv: str, measures):
+    """Writes the error maps of the FolderMeasures, whose tile counts are stored in measure.tile_counts."""
+    stem = os.path.splitext(path_csv)[0]
+    counts = np.concatenate([measure.tile_counts for measure in measures])
+    fp, fn = densities(counts)
+    heatmaps_fp = []
+    heatmaps_fn = []
+    for measure in measures:
+        page_fp, page_fn = densities(measure.tile_counts)
+        heatmaps_fp.append(np.mean(page_fp, axis=0) if len(page_fp) > 0 else np.zeros(page_fp.shape[1:], np.float32))
+        heatmaps_fn.append(np.mean(page_fn, axis=0) if len(page_fn) > 0 else np.zeros(page_fn.shape[1:], np.float32))
+
+    path = stem + '_tiles.npz'
+    np.savez(path, path_img=np.array([measure.path_img for measure in measures for _ in measure.img_names], str),
+                img=np.array([img_name for measure in measures for img_name in measure.img_names], str),
+                counts=counts, fp_density=fp, fn_density=fn,
+                folders=np.array([measure.path_img for measure in measures], str),
+                heatmap_fp=np.array(heatmaps_fp), heatmap_fn=np.array(heatmaps_fn))
+
+    # The heatmaps of all folders share the color scale, so that they can be compared:
+    heatmap_dir = stem + '_tiles'
+    os.makedirs(heatmap_dir, exist_ok=True)
+    for kind, heatmaps in [('fp', heatmaps_fp), ('fn', heatmaps_fn)]:
+        vmax = max(float(np.max(heatmap)) for heatmap in heatmaps)
+        for measure, heatmap in zip(measures, heatmaps):
+            name = os.path.basename(os.path.normpath(measure.path_img))
+            cv2.imwrite(os.path.join(heatmap_dir, '%s_%s.png' % (name, kind)), heatmap_image(heatmap, vmax))
+
+    return path
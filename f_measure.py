@@ -1,12 +1,239 @@
 import cv2
 import os
-import matplotlib.pyplot as plt
 import numpy as np
 import constants
+import profiler
 import math
 
+def confusion_counts(img, gt, chunk_size: int = 1 << 20):
+    """
+    Counts the true positives, false positives, false negatives and true negatives of the foreground images img and gt.
+
+    Each pixel is encoded as 2 * img + gt and all four counts are obtained in a single np.bincount pass. The images
+    are processed in chunks of chunk_size pixels, so that the extra memory does not depend on the image size.
+    Returns the tuple (tp, fp, fn, tn).
+    """
+    img = np.ravel(img)
+    gt = np.ravel(gt)
+    if img.size != gt.size:
+        raise Exception('The image and the ground truth differ in size.')
+
+    counts = np.zeros(4, np.int64)
+    code = np.empty(min(chunk_size, img.size), np.uint8)
+    for start in range(0, img.size, chunk_size):
+        img_chunk = img[start:start + chunk_size]
+        gt_chunk = gt[start:start + chunk_size]
+        # Boolean images can be reinterpreted as 0 / 1 bytes without a copy:
+        img_chunk = img_chunk.view(np.uint8) if img_chunk.dtype == bool else (img_chunk != 0).view(np.uint8)
+        gt_chunk = gt_chunk.view(np.uint8) if gt_chunk.dtype == bool else (gt_chunk != 0).view(np.uint8)
+        c = code[:img_chunk.size]
+        np.left_shift(img_chunk, 1, out=c)
+        np.bitwise_or(c, gt_chunk, out=c)
+        counts += np.bincount(c, minlength=4)
+
+    tn, fn, fp, tp = counts
+    return tp, fp, fn, tn
+
+def tile_edges(size: int, num_tiles: int):
+    # Borders of num_tiles tiles of (nearly) equal size:
+    if num_tiles < 1 or num_tiles > size:
+        raise Exception('The tile grid must have between 1 and %d tiles per dimension.' % size)
+    return np.linspace(0, size, num_tiles + 1).astype(np.int64)
+
+def tile_counts(img, gt, grid, chunk_size: int = 1 << 20):
+    """
+    Counts the true positives, false positives, false negatives and true negatives in each tile of a grid of
+    (rows, cols) tiles, which divide the image evenly.
+
+    As in confusion_counts, each pixel is encoded as 2 * img + gt, to which 4 times the column of its tile is added, so
+    that a single np.bincount per chunk of rows counts all tiles of a grid row. Hence, the tiles cost about as much as
+    confusion_counts and the global counts are their sums. Returns an int64 array of shape (4, rows, cols) with the
+    counts (tp, fp, fn, tn).
+    """
+    img = np.asarray(img)
+    gt = np.asarray(gt)
+    if img.shape[:2] != gt.shape[:2]:
+        raise Exception('The image and the ground truth differ in size.')
+    h, w = img.shape[:2]
+    rows, cols = grid
+    row_edges = tile_edges(h, rows)
+    col_edges = tile_edges(w, cols)
+    col_code = (np.repeat(np.arange(cols), np.diff(col_edges)) * 4).astype(np.uint16 if cols < (1 << 14) else np.int64)
+
+    counts = np.zeros((rows, cols * 4), np.int64)
+    step = max(1, chunk_size // w)
+    code = np.empty((min(step, h), w), col_code.dtype)
+    for row in range(rows):
+        for y0 in range(row_edges[row], row_edges[row + 1], step):
+            y1 = min(y0 + step, row_edges[row + 1])
+            img_chunk = img[y0:y1]
+            gt_chunk = gt[y0:y1]
+            img_chunk = img_chunk.view(np.uint8) if img_chunk.dtype == bool else (img_chunk != 0).view(np.uint8)
+            gt_chunk = gt_chunk.view(np.uint8) if gt_chunk.dtype == bool else (gt_chunk != 0).view(np.uint8)
+            c = code[:y1 - y0]
+            np.left_shift(img_chunk, 1, out=c)
+            np.bitwise_or(c, gt_chunk, out=c)
+            np.add(c, col_code, out=c)
+            counts[row] += np.bincount(c.ravel(), minlength=cols * 4)
+
+    # The codes 0, 1, 2, 3 of each tile are tn, fn, fp, tp:
+    return np.moveaxis(counts.reshape(rows, cols, 4)[:, :, ::-1], 2, 0).copy()
+
+# Largest table of (ground truth, result) component pairs, which is counted with np.bincount by object_counts:
+MAX_PAIR_TABLE = 1 << 22
+
+def object_counts(img, gt):
+    """
+    Counts the object-level errors of the foreground images img and gt, the objects are their 8-connected components.
+
+    Each image is labeled once and the pairs of overlapping ground truth and result components are collected from
+    the foreground pixels of both, hence the cost depends on the number of pixels, not on the number of components.
+    Returns the tuple (gt_objects, missed, false_positives, split, merged): the number of ground truth components,
+    the ground truth components without any result pixel, the result components without any ground truth pixel, the
+    ground truth components overlapped by several result components (broken objects) and the result components
+    overlapping several ground truth components (merged objects).
+    """
+    img = np.asarray(img)
+    gt = np.asarray(gt)
+    img = img.view(np.uint8) if img.dtype == bool else (img != 0).view(np.uint8)
+    gt = gt.view(np.uint8) if gt.dtype == bool else (gt != 0).view(np.uint8)
+    img = np.ascontiguousarray(img)
+    gt = np.ascontiguousarray(gt)
+    num_gt, gt_labels = cv2.connectedComponents(gt, connectivity=8, ltype=cv2.CV_32S)
+    num_img, img_labels = cv2.connectedComponents(img, connectivity=8, ltype=cv2.CV_32S)
+
+    # Encode the overlapping pairs as gt_label * num_img + img_label and find the distinct pairs:
+    both = np.logical_and(gt, img)
+    pairs = gt_labels[both].astype(np.int64) * num_img + img_labels[both]
+    if num_gt * num_img <= MAX_PAIR_TABLE:
+        pairs = np.flatnonzero(np.bincount(pairs, minlength=num_gt * num_img))
+    else:
+        pairs = np.unique(pairs)
+
+    # Number of overlapping components of each component (without the background label 0):
+    gt_partners = np.bincount(pairs // num_img, minlength=num_gt)[1:]
+    img_partners = np.bincount(pairs % num_img, minlength=num_img)[1:]
+
+    return (num_gt - 1, int(np.count_nonzero(gt_partners == 0)), int(np.count_nonzero(img_partners == 0)),
+            int(np.count_nonzero(gt_partners > 1)), int(np.count_nonzero(img_partners > 1)))
+
+def performance_values(tp, fp, fn, tn):
+    """Computes the tuple (recall, precision, fm, nrm) from the confusion counts."""
+    recall = tp / (tp + fn)
+    if math.isnan(recall):
+        recall = 0
+    precision = tp / (tp + fp)
+    if math.isnan(precision):
+        precision = 0
+    fm = 2 * recall * precision / (recall + precision)
+    if math.isnan(fm):
+        fm = 0
+
+    nrfn = fn / (fn + tp)
+    nrfp = fp / (fp + tn)
+    nrm = (nrfn + nrfp) / 2
+
+    return recall, precision, fm, nrm
+
+def gt_masks(gt, fg_type: constants.FGType = constants.FGType.REGULAR):
+    """
+    Converts a decoded ground truth image into the tuple (fg, ignore) of boolean masks.
+
+    ignore marks the (blue) uncertain regions of MSBin, which are excluded from the evaluation. It is None for ground
+    truth images without such regions.
+    """
+    # Note: for uint8 images (255 - x) > 0 is equal to x != 255, which avoids the temporary inverted image.
+    if fg_type == constants.FGType.REGULAR:
+        # Note: the images are passed in the form of DIBCO data (fg = 0, bg = 1)
+        return gt != 255, None
+
+    if fg_type == constants.FGType.MSTEX_FG_GREEN:
+        return class_fg(gt, fg_type), None
+
+    return class_fg(gt, fg_type), uncertain_mask(gt)
+
+def uncertain_mask(gt):
+    # Blue regions in the gt:
+    return np.logical_and(gt[:,:,2] == 0, gt[:,:,0] == 255)
+
+def class_fg(gt, fg_type: constants.FGType):
+    # Foreground of a class in a color (BGR) ground truth image:
+    if fg_type == constants.FGType.MSBIN_FG_1:
+        return gt[:,:,1] == 255
+    elif fg_type == constants.FGType.MSBIN_FG_2:
+        return gt[:,:,1] == 122
+    elif fg_type == constants.FGType.MSTEX_FG_GREEN:
+        # Pure green, MSBin uses gray values for its classes:
+        return np.logical_and.reduce((gt[:,:,1] == 255, gt[:,:,0] == 0, gt[:,:,2] == 0))
+    else:
+        raise Exception('The foreground type is not supported!')
+
+def class_masks(gt, fg_types):
+    """
+    Converts a decoded color ground truth image into the dict fg_type -> (fg, ignore) for several FGTypes (see
+    gt_masks). The ignore mask is computed once and shared by the classes.
+    """
+    masks = {}
+    ignore = None
+    for fg_type in fg_types:
+        if fg_type in (constants.FGType.MSBIN_FG_1, constants.FGType.MSBIN_FG_2):
+            if ignore is None:
+                ignore = uncertain_mask(gt)
+            masks[fg_type] = (class_fg(gt, fg_type), ignore)
+        else:
+            masks[fg_type] = gt_masks(gt, fg_type)
+
+    return masks
+
+def img_mask(img, invert_img = False, ignore = None):
+    # Returns the foreground of a result image. The ignored pixels are set to 0 before the inversion.
+    if invert_img:
+        fg = img != 255
+        if ignore is not None:
+            fg |= ignore
+    else:
+        fg = img > 0
+        if ignore is not None:
+            fg &= ~ignore
+
+    return fg
+
+# Channel of a color result image, which contains the foreground of the class:
+IMG_CHANNELS = {constants.FGType.MSBIN_FG_1: 1, constants.FGType.MSBIN_FG_2: 2, constants.FGType.MSTEX_FG_GREEN: 1}
+
+def img_channel(img, fg_type: constants.FGType = constants.FGType.REGULAR):
+    # Returns the foreground channel of a color result image (as a view), grayscale images are returned unchanged:
+    if len(np.shape(img)) == 3 and np.shape(img)[2] == 3:
+        if fg_type not in IMG_CHANNELS:
+            raise Exception('Foreground type is not supported!')
+        img = img[:,:,IMG_CHANNELS[fg_type]]
+
+    return img
+
+def read_img(path: str, fg_type: constants.FGType = constants.FGType.REGULAR):
+    img = cv2.imread(path, cv2.IMREAD_ANYCOLOR)
+    if img is None:
+        raise Exception('Cannot read the image %s.' % path)
+
+    return img_channel(img, fg_type)
+
+def read_gt(path: str, fg_type: constants.FGType = constants.FGType.REGULAR):
+    if fg_type == constants.FGType.REGULAR:
+        # In case of MSTEx or Dibco convert the image to grayscale:
+        gt = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    else:
+        # In case of MSBin, the color information is required:
+        gt = cv2.imread(path, cv2.IMREAD_COLOR)
+    if gt is None:
+        raise Exception('Cannot read the ground truth image %s.' % path)
+
+    return gt
+
 class PerformanceResult:
 
+    # Counts of the tiles (see tile_counts), which are solely computed on demand:
+    tiles = None
+
     def __init__(self, img, gt, fg_type: constants.FGType = constants.FGType.REGULAR, invert_img = False):
 
         # # check if this is the output of the FCN:
@@ -14,101 +241,186 @@ class PerformanceResult:
         #     if (fg_type == constants.FGType.MSBIN_FG_1):
         #         img = (img[:,:,1] > 0) * 255
 
-        if fg_type == constants.FGType.REGULAR:
-            # Note: the images are passed in the form of DIBCO data (fg = 0, bg = 1)
-            if invert_img:
-                img = (255 - img) > 0
-            else:
-                img = img > 0
-            gt = (255 - gt) > 0
-            # gt = gt > 0
-        else:
-            # Mask out blue regions in the input image and in the gt:
-            img = np.where(np.logical_and(gt[:,:,2] == 0, gt[:,:,0] == 255), 0, img)
-            if invert_img:
-                img = (255 - img) > 0
-            else:
-                img = img > 0
-            if fg_type == constants.FGType.MSBIN_FG_1:
-                gt = gt[:,:,1] == 255
-            elif fg_type == constants.FGType.MSBIN_FG_2:
-                gt = gt[:,:,1] == 122
-
-        #     # gt = np.where(gt == 255, 1, 0)
-        # elif fg_type == constants.FGType.MSBIN_FG_2:
-        #     # raise Exception('The foreground type is not supported!')
-        #     # # Mask out blue regions in the input image and in the gt:
-        #     # img = np.where(np.logical_and(gt[:,:,2] == 0, gt[:,:,0] == 255), 0, img)
-        #     # # Just evaluate the red ink, mask out the other color:
-        #     # img = (255 - img) > 0
-        #     b = 0
-        # else:
-        #     raise Exception('The foreground type is not supported!')
+        gt, ignore = gt_masks(gt, fg_type)
+        img = img_mask(img, invert_img, ignore)
+
+        self.set_counts(*confusion_counts(img, gt))
+
+    @classmethod
+    def from_masks(cls, img, gt, ignore = None, invert_img = False):
+        """Creates a PerformanceResult from a result image and the ground truth masks returned by gt_masks."""
+        return cls.from_counts(*confusion_counts(img_mask(img, invert_img, ignore), gt))
+
+    @classmethod
+    def from_counts(cls, tp, fp, fn, tn):
+        """Creates a PerformanceResult from already computed confusion counts."""
+        r = cls.__new__(cls)
+        r.set_counts(tp, fp, fn, tn)
+        return r
+
+    def set_counts(self, tp, fp, fn, tn):
+
+        # The counts might be Python integers (e.g. if they are loaded from a file). As numpy integers, a division by
+        # zero results in nan, which is handled by performance_values:
+        tp, fp, fn, tn = np.int64(tp), np.int64(fp), np.int64(fn), np.int64(tn)
+        self.tp = tp
+        self.fp = fp
+        self.fn = fn
+        self.tn = tn
 
         # Exclude images if they do not have any positive - this should only happen for constants.FGType.MSBIN_FG_2:
-        if np.sum(gt) == 0:
+        if tp + fn == 0:
             self.recall = -1
             self.precision = -1
             self.fm = -1
+            self.nrm = -1
             return
 
-        tp_img = np.logical_and(img, gt)
-        fp_img = np.logical_and(img, ~gt)
-        fn_img = np.logical_and(~img, gt) 
-        tn_img = np.logical_and(~img, ~gt)
-
-        tp = np.sum(tp_img)
-        fn = np.sum(fn_img)
-        fp = np.sum(fp_img)
-        tn = np.sum(tn_img)
-
-        recall = tp / (tp + fn)
-        if math.isnan(recall):
-            recall = 0
-        precision = tp / (tp + fp)
-        if math.isnan(precision):
-            precision = 0
-        fm = 2 * recall * precision / (recall + precision)
-        if math.isnan(fm):
-            fm = 0
-
-        nrfn = fn / (fn + tp)
-        nrfp = fp / (fp + tn)
-        nrm = (nrfn + nrfp) / 2
-        
-        self.recall = recall
-        self.precision = precision
-        self.fm = fm
-        self.nrm = nrm
+        self.recall, self.precision, self.fm, self.nrm = performance_values(tp, fp, fn, tn)
+
+    def set_objects(self, gt_objects, missed, false_positives, split, merged):
+        # The object-level counts of object_counts, which are solely computed on demand:
+        self.gt_objects = int(gt_objects)
+        self.missed_objects = int(missed)
+        self.fp_objects = int(false_positives)
+        self.split_objects = int(split)
+        self.merged_objects = int(merged)
+
+    def object_values(self):
+        """Returns the object-level counts (see set_objects), or None if they were not computed."""
+        if getattr(self, 'gt_objects', None) is None:
+            return None
+        return [self.gt_objects, self.missed_objects, self.fp_objects, self.split_objects, self.merged_objects]
 
 class PerformanceMeasure:
 
-    def __init__(self, img_path, gt_path, invert_imgs = False):
+    def __init__(self, img_path, gt_path, invert_imgs = False, gt_cache = None, objects = False, tile_grid = None):
         self.img_path = img_path
         self.gt_path = gt_path
         self.invert_imgs = invert_imgs
+        # Optional gt_cache.GTCache, which holds the decoded ground truth masks:
+        self.gt_cache = gt_cache
+        # Compute the object-level counts (see object_counts):
+        self.objects = objects
+        # Grid (rows, cols) of the tiles, whose counts are computed (see tile_counts, None = no tiles):
+        self.tile_grid = tile_grid
 
     def calc(self, img_name: str, gt_name: str, fg_type: constants.FGType = constants.FGType.REGULAR) -> PerformanceResult:
 
-        img = cv2.imread(os.path.join(self.img_path, img_name), cv2.IMREAD_ANYCOLOR)
-        if len(np.shape(img)) == 3 and np.shape(img)[2] == 3:
-            if fg_type == constants.FGType.MSBIN_FG_1:
-                img = img[:,:,1]
-            elif fg_type == constants.FGType.MSBIN_FG_2:
-                img = img[:,:,2]
+        with profiler.image(img_name):
+            return self.score(*self.load(img_name, gt_name, fg_type))
+
+    def load(self, img_name: str, gt_name: str, fg_type: constants.FGType = constants.FGType.REGULAR):
+        """Decodes the image and the ground truth, returns the tuple (img, gt, ignore) (see gt_masks)."""
+
+        with profiler.stage('decode', img_name):
+            img = read_img(os.path.join(self.img_path, img_name), fg_type)
+        if self.gt_cache is not None:
+            with profiler.stage('gt_cache', img_name):
+                gt, ignore = self.gt_cache.get(os.path.join(self.gt_path, gt_name), fg_type)
+        else:
+            with profiler.stage('decode', img_name):
+                gt = read_gt(os.path.join(self.gt_path, gt_name), fg_type)
+            with profiler.stage('masking', img_name):
+                gt, ignore = gt_masks(gt, fg_type)
+
+        return img, gt, ignore
+
+    def score(self, img, gt, ignore = None) -> PerformanceResult:
+
+        with profiler.stage('masking'):
+            img = img_mask(img, self.invert_imgs, ignore)
+        with profiler.stage('counting'):
+            if self.tile_grid is not None:
+                # The global counts are the sums of the tiles:
+                tiles = tile_counts(img, gt, self.tile_grid)
+                counts = tiles.sum(axis=(1, 2))
             else:
-                raise Exception('Foreground type is not supported!')
+                counts = confusion_counts(img, gt)
+        profiler.count('pixels', img.size)
+
+        result = PerformanceResult.from_counts(*counts)
+        if self.tile_grid is not None:
+            result.tiles = tiles
+        if self.objects:
+            with profiler.stage('objects'):
+                result.set_objects(*object_counts(img, gt))
 
-        # img = cv2.imread(os.path.join(self.img_path, img_name), cv2.IMREAD_GRAYSCALE)
-        if fg_type == constants.FGType.REGULAR:
-            # In case of MSTEx or Dibco convert the image to grayscale:
-            gt = cv2.imread(os.path.join(self.gt_path, gt_name), cv2.IMREAD_GRAYSCALE)
+        return result
+
+# Name of the union of the evaluated classes in a MultiClassResult:
+COMBINED = 'combined'
+
+class MultiClassResult:
+    """The PerformanceResults of several FGTypes of a page and of their union (COMBINED), keyed by the class names."""
+
+    def __init__(self, results: dict):
+        self.results = results
+
+    def __getitem__(self, name: str) -> PerformanceResult:
+        return self.results[name]
+
+class MultiClassMeasure:
+    """
+    Evaluates several FGTypes (e.g. both MSBin classes) of a page from a single decode of the ground truth and the
+    result image.
+
+    The classes are evaluated on the foreground channels of the result image (see IMG_CHANNELS), which are views of
+    the decoded image, and share the ignore mask of the ground truth (see class_masks). In addition, the union of the
+    classes is evaluated as COMBINED, i.e. the pixels which are foreground in any class.
+    """
+
+    def __init__(self, img_path, gt_path, fg_types, invert_imgs = False, gt_cache = None):
+        self.img_path = img_path
+        self.gt_path = gt_path
+        self.fg_types = list(fg_types)
+        self.invert_imgs = invert_imgs
+        self.gt_cache = gt_cache
+        if constants.FGType.REGULAR in self.fg_types:
+            raise Exception('The multi-class evaluation supports solely the classes of color ground truth images.')
+
+    def calc(self, img_name: str, gt_name: str) -> MultiClassResult:
+
+        with profiler.image(img_name):
+            return self.score(*self.load(img_name, gt_name))
+
+    def load(self, img_name: str, gt_name: str):
+        """Decodes the image and the ground truth, returns the tuple (img, masks) (see class_masks)."""
+
+        with profiler.stage('decode', img_name):
+            img = cv2.imread(os.path.join(self.img_path, img_name), cv2.IMREAD_ANYCOLOR)
+            if img is None:
+                raise Exception('Cannot read the image %s.' % img_name)
+        if self.gt_cache is not None:
+            with profiler.stage('gt_cache', img_name):
+                masks = self.gt_cache.get_classes(os.path.join(self.gt_path, gt_name), self.fg_types)
         else:
-            # In case of MSBin, the color information is required:
-            gt = cv2.imread(os.path.join(self.gt_path, gt_name), cv2.IMREAD_COLOR)
+            with profiler.stage('decode', img_name):
+                gt = read_gt(os.path.join(self.gt_path, gt_name), self.fg_types[0])
+            with profiler.stage('masking', img_name):
+                masks = class_masks(gt, self.fg_types)
 
-        r = PerformanceResult(img, gt, fg_type, self.invert_imgs)
-        return r
+        return img, masks
+
+    def score(self, img, masks) -> MultiClassResult:
+
+        results = {}
+        img_union = None
+        gt_union = None
+        for fg_type in self.fg_types:
+            gt, ignore = masks[fg_type]
+            with profiler.stage('masking'):
+                img_fg = img_mask(img_channel(img, fg_type), self.invert_imgs, ignore)
+            with profiler.stage('counting'):
+                results[fg_type.name] = PerformanceResult.from_counts(*confusion_counts(img_fg, gt))
+            with profiler.stage('masking'):
+                img_union = img_fg if img_union is None else img_union | img_fg
+                gt_union = gt if gt_union is None else gt_union | gt
+        with profiler.stage('counting'):
+            results[COMBINED] = PerformanceResult.from_counts(*confusion_counts(img_union, gt_union))
+        profiler.count('pixels', img_union.size)
+
+        return MultiClassResult(results)
 
 if __name__ == "__main__":
     img_path = 'D:\\msi\\ace_v2\\dibco_measure\\msbin\\test\\0.25_0_0'
@@ -0,0 +1,184 @@
+"""Cache of decoded ground truth images.
+
+The ground truth is stored as bit-packed foreground and ignore masks (see f_measure.gt_masks) per FGType. The cache
+holds the masks in memory (bounded by a byte size, least recently used entries are evicted first) and can
+optionally persist them in a directory, so that they are shared across runs. The directory is bounded by its own byte
+size (see disk_cache.evict).
+Entries are keyed by the path, the modification time and the size of the ground truth file, and the FGType.
+"""
+
+import os
+import hashlib
+import collections
+import threading
+import numpy as np
+import constants
+import disk_cache
+import f_measure
+
+DEFAULT_MAX_BYTES = 1 << 30
+DEFAULT_DISK_MAX_BYTES = 4 << 30
+
+class GTMasks:
+    """Bit-packed foreground and ignore masks of a ground truth image."""
+
+    def __init__(self, fg, ignore = None):
+        self.shape = fg.shape
+        self.fg = np.packbits(fg, axis=None)
+        self.ignore = None if ignore is None else np.packbits(ignore, axis=None)
+
+    @property
+    def nbytes(self) -> int:
+        return self.fg.nbytes + (0 if self.ignore is None else self.ignore.nbytes)
+
+    def unpack(self):
+        """Returns the tuple (fg, ignore) of boolean masks."""
+        size = self.shape[0] * self.shape[1]
+        fg = np.unpackbits(self.fg, count=size).view(bool).reshape(self.shape)
+        if self.ignore is None:
+            return fg, None
+        ignore = np.unpackbits(self.ignore, count=size).view(bool).reshape(self.shape)
+        return fg, ignore
+
+    def save(self, path: str):
+        ignore = np.zeros(0, np.uint8) if self.ignore is None else self.ignore
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, shape=np.array(self.shape), fg=self.fg, ignore=ignore, has_ignore=self.ignore is not None)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            m = cls.__new__(cls)
+            m.shape = tuple(int(v) for v in data['shape'])
+            m.fg = data['fg']
+            m.ignore = data['ignore'] if data['has_ignore'] else None
+        return m
+
+# One cache per configuration and process, see GTCache.__reduce__:
+_shared_caches = {}
+
+def get_shared_cache(max_bytes: int = DEFAULT_MAX_BYTES, cache_dir: str = None, disk_max_bytes: int = DEFAULT_DISK_MAX_BYTES):
+    key = (max_bytes, cache_dir, disk_max_bytes)
+    if key not in _shared_caches:
+        _shared_caches[key] = GTCache(max_bytes, cache_dir, disk_max_bytes)
+    return _shared_caches[key]
+
+class GTCache:
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, cache_dir: str = None, disk_max_bytes: int = DEFAULT_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.entries = collections.OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __reduce__(self):
+        # Worker processes do not receive the cached masks, but share a per-process cache with the same settings:
+        return (get_shared_cache, (self.max_bytes, self.cache_dir, self.disk_max_bytes))
+
+    @staticmethod
+    def key(gt_path: str, fg_type: constants.FGType):
+        st = os.stat(gt_path)
+        return (os.path.abspath(gt_path), st.st_mtime_ns, st.st_size, fg_type.value)
+
+    def disk_path(self, key) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha1(repr(key).encode('utf8')).hexdigest() + '.npz')
+
+    def get(self, gt_path: str, fg_type: constants.FGType = constants.FGType.REGULAR):
+        """Returns the tuple (fg, ignore) of boolean masks of the ground truth image (see f_measure.gt_masks)."""
+        key = self.key(gt_path, fg_type)
+        with self.lock:
+            masks = self.entries.get(key)
+            if masks is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return masks.unpack()
+            self.misses += 1
+
+        masks = self.load(key)
+        if masks is None:
+            fg, ignore = f_measure.gt_masks(f_measure.read_gt(gt_path, fg_type), fg_type)
+            masks = GTMasks(fg, ignore)
+            self.save(key, masks)
+        else:
+            fg, ignore = masks.unpack()
+
+        self.put(key, masks)
+        return fg, ignore
+
+    def get_classes(self, gt_path: str, fg_types):
+        """
+        Returns the dict fg_type -> (fg, ignore) of several FGTypes of the ground truth image (see f_measure.class_masks).
+        The image is decoded at most once for the missing classes.
+        """
+        masks = {}
+        missing = []
+        for fg_type in fg_types:
+            key = self.key(gt_path, fg_type)
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is not None:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    masks[fg_type] = entry.unpack()
+                    continue
+                self.misses += 1
+            entry = self.load(key)
+            if entry is not None:
+                self.put(key, entry)
+                masks[fg_type] = entry.unpack()
+            else:
+                missing.append(fg_type)
+
+        if missing:
+            decoded = f_measure.class_masks(f_measure.read_gt(gt_path, missing[0]), missing)
+            for fg_type, (fg, ignore) in decoded.items():
+                key = self.key(gt_path, fg_type)
+                entry = GTMasks(fg, ignore)
+                self.save(key, entry)
+                self.put(key, entry)
+                masks[fg_type] = (fg, ignore)
+
+        return masks
+
+    def load(self, key):
+        # Returns the masks persisted in the cache directory, or None:
+        if not self.cache_dir:
+            return None
+        path = self.disk_path(key)
+        try:
+            masks = GTMasks.load(path)
+        except FileNotFoundError:
+            # Not cached or evicted (e.g. by another process):
+            return None
+        disk_cache.touch(path)
+        return masks
+
+    def save(self, key, masks: GTMasks):
+        if not self.cache_dir:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.disk_path(key)
+        masks.save(path)
+        disk_cache.evict(self.cache_dir, self.disk_max_bytes, '*.npz', keep=[path])
+
+    def put(self, key, masks: GTMasks):
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = masks
+            self.nbytes += masks.nbytes
+            # Evict the least recently used entries:
+            while self.nbytes > self.max_bytes and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
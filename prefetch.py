@@ -0,0 +1,58 @@
+"""Bounded producer / consumer pipeline, which overlaps the decoding of images with the computation of the metrics.
+
+A thread pool loads (decodes) the next depth items, while the current item is processed by the caller. OpenCV
+releases the GIL while decoding, hence the threads run in parallel with the metric computation.
+"""
+
+import os
+import time
+import collections
+import concurrent.futures
+
+class Prefetcher:
+
+    def __init__(self, load, depth: int = 4, threads: int = None):
+        self.load = load
+        self.depth = max(1, depth)
+        self.threads = threads if threads else min(self.depth, os.cpu_count() or 1)
+
+        # Statistics:
+        self.num_items = 0
+        self.load_time = 0.0
+        self.wait_time = 0.0
+        self.total_time = 0.0
+        self.start = None
+
+    def timed_load(self, *args):
+        start = time.perf_counter()
+        loaded = self.load(*args)
+        return loaded, time.perf_counter() - start
+
+    def map(self, *iterables):
+        """Yields load(*args) for the items of the iterables, in their order. At most depth items are loaded ahead."""
+        self.start = time.perf_counter()
+        items = zip(*iterables)
+        queue = collections.deque()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.threads) as executor:
+            for args in items:
+                queue.append(executor.submit(self.timed_load, *args))
+                if len(queue) < self.depth:
+                    continue
+                yield self.next_result(queue)
+            while queue:
+                yield self.next_result(queue)
+
+    def next_result(self, queue):
+        # The time that the consumer waits for the loading is the part of the decoding, which is not hidden:
+        wait_start = time.perf_counter()
+        loaded, load_time = queue.popleft().result()
+        self.wait_time += time.perf_counter() - wait_start
+        self.load_time += load_time
+        self.num_items += 1
+        self.total_time = time.perf_counter() - self.start
+        return loaded
+
+    def summary(self) -> str:
+        throughput = self.num_items / self.total_time if self.total_time > 0 else 0
+        return ('%d images in %.2f s (%.2f images/s), decode time %.2f s, waiting for decode %.2f s' %
+                    (self.num_items, self.total_time, throughput, self.load_time, self.wait_time))
@@ -0,0 +1,207 @@
+"""Timing and counter hooks for the stages of the evaluation.
+
+The stages are instrumented with
+
+    with profiler.stage('decode', img_name):
+        ...
+
+and counters with profiler.count('images'). Stages without an image are assigned to the image of the enclosing
+profiler.image(img_name) block of the thread. Profiling is disabled by default, then stage returns a shared no-op
+context manager, so that the hooks do not slow down the evaluation. After enable, the spans of all stages are
+recorded - also in the worker processes of binar_eval.map_images, which spool their spans to a temporary directory
+(see init_worker). export writes the run as JSON in the Chrome trace event format (chrome://tracing, Perfetto), extended
+by the totals of the stages, the counters and the slowest images.
+"""
+
+import os
+import json
+import time
+import glob
+import shutil
+import tempfile
+import threading
+import collections
+
+# Number of images listed in the export:
+NUM_SLOWEST_IMGS = 20
+
+class NullStage:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_STAGE = NullStage()
+
+class Stage:
+
+    def __init__(self, profiler, name: str, img_name: str = None):
+        self.profiler = profiler
+        self.name = name
+        self.img_name = img_name
+
+    def __enter__(self):
+        self.start = time.time()
+        self.perf_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add_span(self.name, self.img_name, self.start, time.perf_counter() - self.perf_start)
+        return False
+
+class CurrentImage:
+    # Assigns the stages of the current thread without an explicit image to img_name:
+
+    def __init__(self, img_name: str):
+        self.img_name = img_name
+
+    def __enter__(self):
+        self.previous = getattr(current, 'img_name', None)
+        current.img_name = self.img_name
+        return self
+
+    def __exit__(self, *exc):
+        current.img_name = self.previous
+        return False
+
+# The image processed by the thread (see CurrentImage):
+current = threading.local()
+
+class Profiler:
+
+    def __init__(self, spool_dir: str = None, spool: bool = False):
+        # The spans are tuples (name, img_name, start, duration, pid, tid), the start is given in seconds since the epoch:
+        self.spans = []
+        self.counters = collections.Counter()
+        self.spool_dir = spool_dir
+        self.started = time.time()
+        # Worker processes append their spans to a file in spool_dir, as they are not shut down regularly:
+        self.file = None
+        if spool:
+            self.file = open(os.path.join(spool_dir, '%d.jsonl' % os.getpid()), 'a', encoding='utf8', buffering=1)
+
+    def stage(self, name: str, img_name: str = None) -> Stage:
+        return Stage(self, name, img_name if img_name is not None else getattr(current, 'img_name', None))
+
+    def add_span(self, name: str, img_name: str, start: float, duration: float):
+        span = (name, img_name, start, duration, os.getpid(), threading.get_ident())
+        if self.file is not None:
+            self.file.write(json.dumps({'span': span}) + '\n')
+        else:
+            self.spans.append(span)
+
+    def count(self, name: str, n: int = 1):
+        if self.file is not None:
+            self.file.write(json.dumps({'counter': name, 'n': n}) + '\n')
+        else:
+            self.counters[name] += n
+
+    def collect(self):
+        # Merges the spooled spans and counters of the worker processes:
+        if self.spool_dir is None:
+            return
+        for path in glob.glob(os.path.join(self.spool_dir, '*.jsonl')):
+            with open(path, encoding='utf8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if 'span' in entry:
+                        self.spans.append(tuple(entry['span']))
+                    else:
+                        self.counters[entry['counter']] += entry['n']
+            os.remove(path)
+
+    def stage_totals(self) -> dict:
+        totals = {}
+        for name, _, _, duration, _, _ in self.spans:
+            t = totals.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+            t['count'] += 1
+            t['total'] += duration
+            t['max'] = max(t['max'], duration)
+        for t in totals.values():
+            t['mean'] = t['total'] / t['count']
+
+        return dict(sorted(totals.items(), key=lambda item: -item[1]['total']))
+
+    def slowest_imgs(self, num_imgs: int = NUM_SLOWEST_IMGS):
+        """Returns the images with the largest summed duration of their stages."""
+        imgs = {}
+        for name, img_name, _, duration, _, _ in self.spans:
+            if img_name is None:
+                continue
+            img = imgs.setdefault(img_name, {'img': img_name, 'total': 0.0, 'stages': collections.Counter()})
+            img['total'] += duration
+            img['stages'][name] += duration
+
+        slowest = sorted(imgs.values(), key=lambda img: -img['total'])[:num_imgs]
+        for img in slowest:
+            img['stages'] = dict(img['stages'])
+
+        return slowest
+
+    def trace_events(self):
+        events = []
+        for name, img_name, start, duration, pid, tid in self.spans:
+            event = {'name': name, 'ph': 'X', 'ts': (start - self.started) * 1e6, 'dur': duration * 1e6, 'pid': pid, 'tid': tid}
+            if img_name is not None:
+                event['args'] = {'img': img_name}
+            events.append(event)
+
+        return sorted(events, key=lambda event: event['ts'])
+
+    def export(self, path: str):
+        self.collect()
+        report = {'traceEvents': self.trace_events(), 'displayTimeUnit': 'ms', 'wall_time': time.time() - self.started,
+                    'stages': self.stage_totals(), 'counters': dict(self.counters), 'slowest_imgs': self.slowest_imgs()}
+        with open(path, 'w', encoding='utf8') as f:
+            json.dump(report, f, indent=1)
+
+    def summary(self) -> str:
+        lines = ['%-16s %8d x %10.3f s (max %.3f s)' % (name, t['count'], t['total'], t['max'])
+                    for name, t in self.stage_totals().items()]
+        return '\n'.join(lines)
+
+# The profiler of this process (None = disabled):
+profiler = None
+
+def enable() -> Profiler:
+    global profiler
+    profiler = Profiler(tempfile.mkdtemp(prefix='binar_profile_'))
+    return profiler
+
+def disable():
+    global profiler
+    if profiler is not None and profiler.file is None:
+        shutil.rmtree(profiler.spool_dir, ignore_errors=True)
+    profiler = None
+
+def worker_args():
+    """Returns the arguments of init_worker, which pass the state of the profiler to worker processes."""
+    return (profiler.spool_dir if profiler is not None else None, )
+
+def init_worker(spool_dir: str = None):
+    """Initializer of worker processes, which enables the profiling, if it is enabled in the parent process."""
+    global profiler
+    profiler = Profiler(spool_dir, spool=True) if spool_dir is not None else None
+
+def stage(name: str, img_name: str = None):
+    if profiler is None:
+        return NULL_STAGE
+    return profiler.stage(name, img_name)
+
+def image(img_name: str):
+    """Returns a context manager, in which the stages without an explicit image are assigned to img_name."""
+    if profiler is None:
+        return NULL_STAGE
+    return CurrentImage(img_name)
+
+def count(name: str, n: int = 1):
+    if profiler is not None:
+        profiler.count(name, n)
+
+def export(path: str):
+    profiler.export(path)
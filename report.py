@@ -0,0 +1,208 @@
+"""Headless report of the CSV files written by binar_eval.py.
+
+    python report.py out_dir results_1.csv [results_2.csv ...]
+
+Each CSV file (i.e. dataset) is loaded once into arrays of the mean recall, precision and FM of its method folders (see
+read_results) and rendered as a bar chart (one chart per class of a multi-class evaluation). The charts are rendered in
+parallel with the non-interactive Agg backend of matplotlib, each chart is rendered once and saved in all formats, and
+index.html shows all charts with their values. The hash of the data of each chart is stored in out_dir/report.json, a
+chart is solely rendered again if its data changed (or a file is missing).
+"""
+
+import os
+import csv
+import json
+import html
+import hashlib
+import argparse
+import numpy as np
+import constants
+
+REPORT_VERSION = 1
+FORMATS = ['pdf', 'png', 'html']
+MANIFEST = 'report.json'
+
+RECALL_COLOR = (132/255, 212/255, 247/255)
+PRECISION_COLOR = (105/255, 199/255, 188/255)
+FM_COLOR = (247/255, 148/255, 29/255)
+
+def mean_rows(rows):
+    """
+    Returns the rows with the mean values of the folders. If the file contains the results of the single images (-f),
+    the mean row of each folder is followed by an empty row.
+    """
+    def empty(row):
+        return not any(row)
+
+    if not any(empty(row) for row in rows):
+        return rows
+    return [row for row, next_row in zip(rows, rows[1:]) if not empty(row) and empty(next_row)]
+
+def read_results(path_csv: str):
+    """Returns the charts of the CSV file: the dicts with the folder labels and the arrays of their mean values."""
+    with open(path_csv, newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        headers = next(reader)
+        rows = mean_rows(list(reader))
+
+    if constants.HEADER_THRESHOLD in headers:
+        raise Exception('The threshold sweep is not supported: %s' % path_csv)
+    col = {header: idx for idx, header in enumerate(headers)}
+    # The dibco metrics are given in percent:
+    scale = 1 if constants.HEADER_PSEUDO_FM in col or constants.HEADER_PSEUDO_FM_APPROX in col else 100
+
+    name = os.path.splitext(os.path.basename(path_csv))[0]
+    fg_classes = [None]
+    if constants.HEADER_FG_CLASS in col:
+        fg_classes = list(dict.fromkeys(row[col[constants.HEADER_FG_CLASS]] for row in rows))
+
+    charts = []
+    for fg_class in fg_classes:
+        class_rows = [row for row in rows if fg_class is None or row[col[constants.HEADER_FG_CLASS]] == fg_class]
+        chart = {'name': name if fg_class is None else '%s_%s' % (name, fg_class), 'path_csv': path_csv,
+                    'title': name if fg_class is None else '%s (%s)' % (name, fg_class),
+                    'labels': [os.path.basename(os.path.normpath(row[col[constants.HEADER_PATH_IMG]])) for row in class_rows]}
+        for header in [constants.HEADER_RECALL, constants.HEADER_PRECISION, constants.HEADER_FM]:
+            chart[header] = np.array([float(row[col[header]]) for row in class_rows]) * scale
+        # Confidence intervals of binar_eval.py --bootstrap:
+        if constants.HEADER_CI_LOW in col:
+            chart['fm_ci'] = np.array([[float(row[col[h]]) if row[col[h]] else np.nan for h in [constants.HEADER_CI_LOW,
+                                constants.HEADER_CI_HIGH]] for row in class_rows]) * scale
+        charts.append(chart)
+
+    return charts
+
+def unique_names(charts):
+    # Charts of CSV files with the same name in different directories are prefixed with the directory:
+    counts = {}
+    for chart in charts:
+        counts[chart['name']] = counts.get(chart['name'], 0) + 1
+    for chart in charts:
+        if counts[chart['name']] > 1:
+            parent = os.path.basename(os.path.dirname(os.path.abspath(chart['path_csv'])))
+            chart['name'] = '%s_%s' % (parent, chart['name'])
+
+def chart_hash(chart, formats) -> str:
+    h = hashlib.sha1(repr((REPORT_VERSION, sorted(formats), chart['title'], chart['labels'])).encode('utf8'))
+    for key in [constants.HEADER_RECALL, constants.HEADER_PRECISION, constants.HEADER_FM, 'fm_ci']:
+        if key in chart:
+            h.update(np.ascontiguousarray(chart[key]).tobytes())
+
+    return h.hexdigest()
+
+def image_formats(formats):
+    # index.html shows the PNG files:
+    return [fmt for fmt in FORMATS if fmt in formats and fmt != 'html' or fmt == 'png' and 'html' in formats]
+
+def render(chart, out_dir: str, formats):
+    """Renders the bar chart of the recall, precision and FM of the folders and saves it in the image formats."""
+    # Imported on demand with the non-interactive backend, which does not require a display:
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    n = len(chart['labels'])
+    width = 0.35
+    space_intra_bars = 0.2
+    num_bars = 3
+    space_inter_bars = 0.1
+    scale = width * num_bars + space_intra_bars * 2 + space_inter_bars * (num_bars - 1)
+    x = np.arange(n) * scale
+
+    fig, ax = plt.subplots(figsize=(12, 1.5 + 1.2 * n))
+    recall_rects = ax.barh(x - width - space_inter_bars, chart[constants.HEADER_RECALL], width, label='Recall', color=RECALL_COLOR)
+    precision_rects = ax.barh(x, chart[constants.HEADER_PRECISION], width, label='Precision', color=PRECISION_COLOR)
+    fm_ci = chart.get('fm_ci')
+    xerr = None if fm_ci is None else np.abs(fm_ci.T - chart[constants.HEADER_FM])
+    fm_rects = ax.barh(x + width + space_inter_bars, chart[constants.HEADER_FM], width, xerr=xerr, label='F-Measure',
+                        color=FM_COLOR, edgecolor='black')
+
+    values = np.concatenate([chart[constants.HEADER_RECALL], chart[constants.HEADER_PRECISION], chart[constants.HEADER_FM]])
+    x_min = min(50, 10 * np.floor(np.min(values, initial=100) / 10))
+    ax.set_yticks(x)
+    ax.set_yticklabels(chart['labels'])
+    ax.set_xlim([x_min, 100])
+    ax.set_title(chart['title'])
+    ax.legend()
+    ax.invert_yaxis()
+
+    for rects in [fm_rects, recall_rects, precision_rects]:
+        for rect in rects:
+            ax.annotate('{value:.2f}'.format(value = rect.get_width()), xy=(x_min + 4, rect.get_y() + width + .01),
+                        ha='center', va='bottom')
+
+    paths = []
+    for fmt in image_formats(formats):
+        path = os.path.join(out_dir, '%s.%s' % (chart['name'], fmt))
+        fig.savefig(path, bbox_inches='tight')
+        paths.append(path)
+    plt.close(fig)
+
+    return paths
+
+def write_html(out_dir: str, charts):
+    rows = []
+    for chart in charts:
+        table = ''.join('<tr><td>%s</td><td>%.2f</td><td>%.2f</td><td>%.2f</td></tr>' % (html.escape(label), r, p, fm)
+                        for label, r, p, fm in zip(chart['labels'], chart[constants.HEADER_RECALL],
+                            chart[constants.HEADER_PRECISION], chart[constants.HEADER_FM]))
+        rows.append('<h2>%s</h2>\n<img src="%s.png">\n<table><tr><th>Method</th><th>Recall</th><th>Precision</th>'
+                    '<th>F-Measure</th></tr>%s</table>' % (html.escape(chart['title']), html.escape(chart['name']), table))
+
+    path = os.path.join(out_dir, 'index.html')
+    with open(path, 'w', encoding='utf8') as f:
+        f.write('<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>Binarization results</title>\n'
+                '<style>img { max-width: 100%%; } td, th { padding: 2px 12px; text-align: right; } '
+                'td:first-child { text-align: left; }</style></head>\n<body>\n%s\n</body></html>\n' % '\n'.join(rows))
+
+    return path
+
+def make_report(paths_csv, out_dir: str, formats = FORMATS, jobs: int = 1, force: bool = False):
+    """Renders the charts of the CSV files, whose data changed since the last report, and returns their names."""
+    import binar_eval
+
+    charts = [chart for path_csv in paths_csv for chart in read_results(path_csv)]
+    unique_names(charts)
+    os.makedirs(out_dir, exist_ok=True)
+
+    path_manifest = os.path.join(out_dir, MANIFEST)
+    manifest = {}
+    if os.path.exists(path_manifest) and not force:
+        with open(path_manifest, encoding='utf8') as f:
+            manifest = json.load(f)
+
+    todo = []
+    for chart in charts:
+        chart['hash'] = chart_hash(chart, formats)
+        files = [os.path.join(out_dir, '%s.%s' % (chart['name'], fmt)) for fmt in image_formats(formats)]
+        if manifest.get(chart['name']) != chart['hash'] or not all(os.path.exists(f) for f in files):
+            todo.append(chart)
+
+    n = len(todo)
+    for chart, _ in zip(todo, binar_eval.map_images(render, jobs, todo, [out_dir] * n, [formats] * n)):
+        manifest[chart['name']] = chart['hash']
+    if 'html' in formats:
+        write_html(out_dir, charts)
+
+    tmp_path = path_manifest + '.tmp'
+    with open(tmp_path, 'w', encoding='utf8') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, path_manifest)
+
+    return [chart['name'] for chart in todo], len(charts)
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Render the bar charts of the CSV files written by binar_eval.py.')
+    parser.add_argument("out_dir", help="directory of the report")
+    parser.add_argument("paths_csv", help="csv files of binar_eval.py (one chart per file and class)", nargs='+')
+    parser.add_argument("--formats", help="output formats", nargs='+', choices=FORMATS, default=FORMATS)
+    parser.add_argument("--force", help="render all charts, also the unchanged ones", action="store_true")
+    parser.add_argument("-j", "--jobs", help="number of worker processes (0 = all cores)", type=int, default=1)
+    args = parser.parse_args()
+
+    rendered, num_charts = make_report(args.paths_csv, args.out_dir, args.formats, args.jobs, args.force)
+    print('Rendered %d of %d charts to %s' % (len(rendered), num_charts, args.out_dir))
+
+if __name__ == "__main__":
+    main()
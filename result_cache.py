@@ -0,0 +1,106 @@
+"""Persistent, content addressed cache of the results of single images.
+
+The key of a result is the hash of the contents of its input files (result image, ground truth and weight files),
+the settings (FGType, invert_imgs, metric) and constants.METRIC_VERSION. Hence, unchanged images are not evaluated
+again - even if they are copied or touched - and the results of changed images are recomputed.
+The cache is a SQLite database. If it grows above max_bytes, the least recently used results are evicted.
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import constants
+import result_log
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'eval-binarization', 'results')
+DEFAULT_MAX_BYTES = 256 << 20
+DB_NAME = 'results.sqlite'
+
+class ResultCache:
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir if cache_dir else DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(self.cache_dir, DB_NAME), timeout=60)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT, size INTEGER, last_used REAL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+        # The content hashes of the files are remembered, as long as the files are not modified:
+        self.db.execute('CREATE TABLE IF NOT EXISTS file_hashes (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, hash TEXT)')
+        self.db.commit()
+        self.nbytes = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+
+    def file_hash(self, path: str) -> str:
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        row = self.db.execute('SELECT hash FROM file_hashes WHERE path = ? AND size = ? AND mtime_ns = ?',
+                                (path, st.st_size, st.st_mtime_ns)).fetchone()
+        if row is not None:
+            return row[0]
+
+        h = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        self.db.execute('INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)', (path, st.st_size, st.st_mtime_ns, h.hexdigest()))
+        self.db.commit()
+        return h.hexdigest()
+
+    def key(self, paths, settings) -> str:
+        hashes = [None if path is None else self.file_hash(path) for path in paths]
+        return hashlib.sha1(repr((constants.METRIC_VERSION, settings, hashes)).encode('utf8')).hexdigest()
+
+    def get(self, key: str):
+        """Returns the cached PerformanceResult / DibcoResult or None."""
+        row = self.db.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.db.execute('UPDATE results SET last_used = ? WHERE key = ?', (time.time(), key))
+        self.db.commit()
+        return result_log.result_from_dict(json.loads(row[0]))
+
+    def put(self, key: str, result):
+        value = json.dumps(result_log.result_to_dict(result))
+        old = self.db.execute('SELECT size FROM results WHERE key = ?', (key,)).fetchone()
+        self.db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)', (key, value, len(value), time.time()))
+        self.nbytes += len(value) - (old[0] if old else 0)
+        if self.nbytes > self.max_bytes:
+            self.evict()
+        self.db.commit()
+
+    def evict(self):
+        # Remove the least recently used results, until the cache is reduced to 90% of its maximum size:
+        target = 0.9 * self.max_bytes
+        rows = self.db.execute('SELECT key, size FROM results ORDER BY last_used')
+        evicted = []
+        for key, size in rows:
+            if self.nbytes <= target:
+                break
+            evicted.append((key,))
+            self.nbytes -= size
+        rows.close()
+        self.db.executemany('DELETE FROM results WHERE key = ?', evicted)
+
+    def invalidate(self, paths):
+        """Removes the remembered hashes of the files, which are then hashed again when they are used next."""
+        self.db.executemany('DELETE FROM file_hashes WHERE path = ?', [(os.path.abspath(path),) for path in paths])
+        self.db.commit()
+
+    def clear(self):
+        self.db.execute('DELETE FROM results')
+        self.db.execute('DELETE FROM file_hashes')
+        self.db.commit()
+        self.nbytes = 0
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,165 @@
+"""Append-only log of the results of single images, which allows to resume interrupted runs.
+
+A run writes two files next to the CSV output:
+    <path_csv>.results.jsonl    one JSON line per evaluated image, appended (and flushed) as soon as the image is
+                                scored
+    <path_csv>.manifest.json    the settings of the run, the evaluated folders and the state of the run
+
+Each line holds a fingerprint of the inputs (the image and ground truth files, the settings and the metric
+version). When a run is resumed, the images whose fingerprint is unchanged are not evaluated again.
+"""
+
+import os
+import json
+import hashlib
+import datetime
+import numpy as np
+import constants
+import f_measure
+
+RESULTS_POSTFIX = '.results.jsonl'
+MANIFEST_POSTFIX = '.manifest.json'
+
+DIBCO_ATTRS = ['fm', 'precision', 'recall', 'pseudo_fm', 'pseudo_recall', 'pseudo_precision', 'drd', 'psnr']
+
+def fingerprint(paths, settings) -> str:
+    """Fingerprint of the input files (path, size and modification time) and the settings."""
+    h = hashlib.sha1()
+    h.update(repr((constants.METRIC_VERSION, settings)).encode('utf8'))
+    for path in paths:
+        if path is None:
+            h.update(b'none')
+            continue
+        st = os.stat(path)
+        h.update(repr((os.path.abspath(path), st.st_size, st.st_mtime_ns)).encode('utf8'))
+
+    return h.hexdigest()
+
+def result_to_dict(result) -> dict:
+    if isinstance(result, f_measure.PerformanceResult):
+        d = {'counts': [int(result.tp), int(result.fp), int(result.fn), int(result.tn)]}
+        if result.object_values() is not None:
+            d['objects'] = result.object_values()
+        if result.tiles is not None:
+            d['tiles'] = result.tiles.tolist()
+        return d
+    if isinstance(result, f_measure.MultiClassResult):
+        return {'classes': {name: result_to_dict(r)['counts'] for name, r in result.results.items()}}
+
+    d = {attr: float(getattr(result, attr)) for attr in DIBCO_ATTRS}
+    d['file_name'] = result.file_name
+    return {'dibco': d}
+
+def result_from_dict(d):
+    if 'counts' in d:
+        result = f_measure.PerformanceResult.from_counts(*d['counts'])
+        if 'objects' in d:
+            result.set_objects(*d['objects'])
+        if 'tiles' in d:
+            result.tiles = np.array(d['tiles'], np.int64)
+        return result
+    if 'classes' in d:
+        return f_measure.MultiClassResult({name: f_measure.PerformanceResult.from_counts(*counts)
+                                            for name, counts in d['classes'].items()})
+
+    # Imported on demand, as most runs do not compute the dibco metrics:
+    import dibco_measure
+    m = dibco_measure.DibcoResult()
+    for attr, value in d['dibco'].items():
+        setattr(m, attr, value)
+    return m
+
+def now() -> str:
+    return datetime.datetime.now().isoformat(timespec='seconds')
+
+class ResultLog:
+
+    def __init__(self, path_csv: str, settings: dict, resume: bool = False):
+        self.path_results = path_csv + RESULTS_POSTFIX
+        self.path_manifest = path_csv + MANIFEST_POSTFIX
+        self.settings = settings
+        # Results of the previous run: (folder, image) -> (fingerprint, result dict)
+        self.entries = {}
+
+        if resume and os.path.exists(self.path_results):
+            self.truncate_partial_line()
+            self.load()
+            self.manifest = self.read_manifest()
+            if self.manifest.get('settings') != settings:
+                print('The settings differ from the resumed run, changed results are computed again.')
+            self.manifest['settings'] = settings
+            self.manifest['resumed'] = self.manifest.get('resumed', []) + [now()]
+        else:
+            # Start a new run:
+            open(self.path_results, 'w').close()
+            self.manifest = {'settings': settings, 'started': now(), 'folders': [], 'completed_folders': []}
+        self.manifest['finished'] = None
+        self.write_manifest()
+
+        self.file = open(self.path_results, 'a', encoding='utf8')
+
+    def truncate_partial_line(self):
+        """Removes an incomplete last line (of a killed run), otherwise the next appended line would be merged onto it."""
+        with open(self.path_results, 'rb+') as f:
+            size = f.seek(0, os.SEEK_END)
+            end = size
+            # The partial line is short compared to the file, hence it is searched from the end in blocks:
+            while end > 0:
+                start = max(0, end - 65536)
+                f.seek(start)
+                idx = f.read(end - start).rfind(b'\n')
+                if idx >= 0:
+                    end = start + idx + 1
+                    break
+                end = start
+            if end < size:
+                f.truncate(end)
+
+    def load(self):
+        with open(self.path_results, encoding='utf8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Skips corrupt lines, e.g. of a crashed file system:
+                    continue
+                self.entries[(entry['folder'], entry['img'])] = (entry['fingerprint'], entry['result'])
+
+    def read_manifest(self) -> dict:
+        if not os.path.exists(self.path_manifest):
+            return {'settings': None, 'started': now(), 'folders': [], 'completed_folders': []}
+        with open(self.path_manifest, encoding='utf8') as f:
+            return json.load(f)
+
+    def write_manifest(self):
+        tmp_path = self.path_manifest + '.tmp'
+        with open(tmp_path, 'w', encoding='utf8') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.path_manifest)
+
+    def get(self, folder: str, img_name: str, fp: str):
+        """Returns the logged result of the image, or None if it is missing or its fingerprint changed."""
+        entry = self.entries.get((folder, img_name))
+        if entry is None or entry[0] != fp:
+            return None
+        return result_from_dict(entry[1])
+
+    def append(self, folder: str, img_name: str, fp: str, result):
+        entry = {'folder': folder, 'img': img_name, 'fingerprint': fp, 'result': result_to_dict(result)}
+        self.file.write(json.dumps(entry) + '\n')
+        self.file.flush()
+
+    def start_folder(self, folder: str):
+        if folder not in self.manifest['folders']:
+            self.manifest['folders'].append(folder)
+            self.write_manifest()
+
+    def complete_folder(self, folder: str):
+        if folder not in self.manifest['completed_folders']:
+            self.manifest['completed_folders'].append(folder)
+            self.write_manifest()
+
+    def close(self):
+        self.file.close()
+        self.manifest['finished'] = now()
+        self.write_manifest()
@@ -0,0 +1,123 @@
+"""Columnar storage of the results of single images.
+
+A ResultStore keeps one preallocated float64 array per metric, instead of a list of PerformanceResult / DibcoResult
+objects, and updates the sums of the metrics with every added result. Hence, the running means are available in O(1)
+and the columns can be exported without a conversion (see write_npz and write_parquet).
+"""
+
+import os
+import numpy as np
+
+FM_FIELDS = ['fm', 'precision', 'recall', 'nrm']
+DIBCO_FIELDS = ['fm', 'precision', 'recall', 'pseudo_fm', 'pseudo_precision', 'pseudo_recall', 'drd', 'psnr']
+# Object-level counts (see f_measure.object_counts), which are added to FM_FIELDS on demand:
+OBJECT_FIELDS = ['gt_objects', 'missed_objects', 'fp_objects', 'split_objects', 'merged_objects']
+
+EXPORT_FORMATS = ['npz', 'parquet']
+
+class ResultStore:
+
+    def __init__(self, fields, capacity: int = 0):
+        self.fields = list(fields)
+        self.columns = {field: np.empty(capacity, np.float64) for field in self.fields}
+        self.sums = {field: 0.0 for field in self.fields}
+        self.img_names = []
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, img_name: str, result):
+        """Adds the metrics of a PerformanceResult or DibcoResult."""
+        if self.size == len(self.columns[self.fields[0]]):
+            self.grow(max(16, 2 * self.size))
+
+        for field in self.fields:
+            value = getattr(result, field)
+            self.columns[field][self.size] = value
+            self.sums[field] += value
+        self.img_names.append(img_name)
+        self.size += 1
+
+    def replace(self, idx: int, result):
+        """Replaces the metrics of the result at idx, e.g. of an image that was evaluated again."""
+        for field in self.fields:
+            value = getattr(result, field)
+            self.sums[field] += value - self.columns[field][idx]
+            self.columns[field][idx] = value
+
+    def remove(self, idx: int):
+        """Removes the result at idx, the last result is moved to idx."""
+        last = self.size - 1
+        for field in self.fields:
+            self.sums[field] -= self.columns[field][idx]
+            self.columns[field][idx] = self.columns[field][last]
+        self.img_names[idx] = self.img_names[last]
+        self.img_names.pop()
+        self.size = last
+
+    def sorted(self):
+        """Returns a copy of the store, with the results ordered by the image names."""
+        order = sorted(range(self.size), key=lambda idx: self.img_names[idx])
+        store = ResultStore(self.fields)
+        store.columns = {field: self.columns[field][order] for field in self.fields}
+        store.sums = {field: float(np.sum(store.columns[field])) for field in self.fields}
+        store.img_names = [self.img_names[idx] for idx in order]
+        store.size = self.size
+
+        return store
+
+    def grow(self, capacity: int):
+        for field in self.fields:
+            column = np.empty(capacity, np.float64)
+            column[:self.size] = self.columns[field][:self.size]
+            self.columns[field] = column
+
+    def column(self, field: str):
+        return self.columns[field][:self.size]
+
+    def running_mean(self, field: str) -> float:
+        """Mean of the results added so far, from the running sum (the final means are computed by mean)."""
+        return self.sums[field] / self.size if self.size > 0 else float('nan')
+
+    def mean(self, field: str) -> float:
+        # np.mean sums pairwise, which is more accurate than the running sum:
+        return np.mean(self.column(field))
+
+def concat_columns(measures):
+    """Returns the dict of columns (path_img, img, and the metrics) of the ResultStores of several FolderMeasures."""
+    stores = [measure.results for measure in measures]
+    fields = stores[0].fields
+    columns = {'path_img': np.array([measure.path_img for measure, store in zip(measures, stores) for _ in range(len(store))], str),
+                'img': np.array([img_name for store in stores for img_name in store.img_names], str)}
+    if any(measure.fg_class is not None for measure in measures):
+        columns['fg_class'] = np.array([measure.fg_class for measure, store in zip(measures, stores) for _ in range(len(store))], str)
+    for field in fields:
+        columns[field] = np.concatenate([store.column(field) for store in stores])
+
+    return columns
+
+def write_npz(path: str, measures):
+    np.savez(path, **concat_columns(measures))
+
+def write_parquet(path: str, measures):
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise Exception('The Parquet export requires pyarrow (pip install pyarrow).')
+
+    table = pyarrow.table(concat_columns(measures))
+    pyarrow.parquet.write_table(table, path)
+
+def write_results(path_csv: str, measures, export_format: str):
+    """Writes the single results of the measures next to the CSV file, as <path_csv without extension>.<export_format>."""
+    path = os.path.splitext(path_csv)[0] + '.' + export_format
+    if export_format == 'npz':
+        write_npz(path, measures)
+    elif export_format == 'parquet':
+        write_parquet(path, measures)
+    else:
+        raise Exception('Unknown export format: %s' % export_format)
+
+    return path
@@ -0,0 +1,173 @@
+"""Sharded evaluation: splits a run into N shards, which can be evaluated on different machines, and merges them.
+
+The images of all evaluated folders form the list of (folder, image) items, which is sorted by folder and image.
+Shard i of N evaluates the items with an index k, for which k % N == i (binar_eval.py --shard i/N), and writes its
+results to <path_csv>.shard-<i>-of-<N>.json. The merge command combines the shard files into the CSV file, which is
+written by an unsharded run:
+
+    python shards.py path_csv [shard files]
+
+If no shard files are given, the files next to path_csv are merged. The merge fails, if a shard is missing or
+duplicated, or if the shards were run with differing settings or on differing images.
+"""
+
+import os
+import re
+import glob
+import json
+import types
+import hashlib
+import argparse
+import collections
+import constants
+import result_store
+
+SHARD_FILE_VERSION = 2
+
+def parse_shard(shard: str):
+    """Parses 'i/N' and returns the tuple (i, N)."""
+    match = re.fullmatch(r'\s*(\d+)\s*/\s*(\d+)\s*', shard)
+    if match is None:
+        raise Exception('The shard must be given as i/N, e.g. 0/4: %s' % shard)
+    i, n = int(match.group(1)), int(match.group(2))
+    if n < 1 or i >= n:
+        raise Exception('The shard index must be in 0, ..., N-1: %s' % shard)
+
+    return i, n
+
+def shard_name(path_csv: str, shard) -> str:
+    # Prefix of the shard file and the result log of the shard:
+    return '%s.shard-%d-of-%d' % (path_csv, shard[0], shard[1])
+
+def shard_path(path_csv: str, shard) -> str:
+    return shard_name(path_csv, shard) + '.json'
+
+def find_shards(path_csv: str):
+    """Returns the shard files next to path_csv."""
+    paths = glob.glob(glob.escape(path_csv) + '.shard-*-of-*.json')
+    return sorted(path for path in paths if re.fullmatch(r'\.shard-\d+-of-\d+\.json', path[len(path_csv):]))
+
+def items_hash(items) -> str:
+    return hashlib.sha1(json.dumps(items).encode('utf8')).hexdigest()
+
+def assign(items, shard):
+    """Returns the dict folder -> set of images, which are evaluated by the shard."""
+    i, n = shard
+    assigned = collections.defaultdict(set)
+    for folder, img_name in items[i::n]:
+        assigned[folder].add(img_name)
+
+    return assigned
+
+def write_shard(path_csv: str, shard, settings: dict, folders, items, measures, dibco_metrics: bool):
+    """Writes the single results of the (FolderMeasure) measures evaluated by the shard."""
+    index = {item: k for k, item in enumerate(items)}
+    results = []
+    for measure in measures:
+        store = measure.results
+        for idx, img_name in enumerate(store.img_names):
+            results.append({'index': index[(measure.path_img, img_name)], 'folder': measure.path_img, 'img': img_name,
+                            'values': {field: store.columns[field][idx] for field in store.fields}})
+
+    shard_file = {'version': SHARD_FILE_VERSION, 'metric_version': constants.METRIC_VERSION, 'shard': shard[0],
+                    'num_shards': shard[1], 'settings': settings, 'dibco_metrics': dibco_metrics, 'folders': folders,
+                    'num_items': len(items), 'items_hash': items_hash(items), 'results': results,
+                    'computed_weights': [measure.path_img for measure in measures if measure.computed_weights]}
+    path = shard_path(path_csv, shard)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf8') as f:
+        json.dump(shard_file, f)
+    os.replace(tmp_path, path)
+
+    return path
+
+def read_shards(paths):
+    shard_files = []
+    for path in paths:
+        with open(path, encoding='utf8') as f:
+            shard_file = json.load(f)
+        shard_file['path'] = path
+        shard_files.append(shard_file)
+
+    return shard_files
+
+def check_shards(shard_files):
+    """Raises an exception, if the shards do not form a complete run."""
+    if not shard_files:
+        raise Exception('No shard file found.')
+
+    first = shard_files[0]
+    for key in ['version', 'metric_version', 'num_shards', 'settings', 'num_items', 'items_hash']:
+        differing = [s['path'] for s in shard_files if s[key] != first[key]]
+        if differing:
+            raise Exception('The shards differ in %s from %s: %s' % (key, first['path'], ', '.join(differing)))
+
+    counts = collections.Counter(s['shard'] for s in shard_files)
+    duplicates = sorted(i for i, c in counts.items() if c > 1)
+    if duplicates:
+        raise Exception('Duplicate shards: %s' % ', '.join('%d (%s)' % (i, ', '.join(s['path'] for s in shard_files
+                            if s['shard'] == i)) for i in duplicates))
+    missing = sorted(set(range(first['num_shards'])) - set(counts))
+    if missing:
+        raise Exception('Missing shards: %s of %d' % (', '.join(str(i) for i in missing), first['num_shards']))
+
+    for s in shard_files:
+        wrong = [r['index'] for r in s['results'] if r['index'] % s['num_shards'] != s['shard']]
+        if wrong:
+            raise Exception('The shard file %s contains results of other shards.' % s['path'])
+
+def merge_shards(shard_files):
+    """
+    Returns the FolderMeasures of the merged shards.
+
+    The results of each folder are added in the order of the unsharded run, hence the means are equal to the ones of
+    an unsharded run.
+    """
+    import binar_eval
+
+    check_shards(shard_files)
+    dibco_metrics = shard_files[0]['dibco_metrics']
+    results = sorted((r for s in shard_files for r in s['results']), key=lambda r: r['index'])
+    indices = [r['index'] for r in results]
+    if len(set(indices)) != len(indices):
+        raise Exception('Images are contained in several shards.')
+
+    measures = collections.OrderedDict()
+    for folder in shard_files[0]['folders']:
+        # FolderMeasure is solely used to compute and store the means, dibco_native avoids the check of the dibco tool:
+        measures[folder] = binar_eval.FolderMeasure(folder, shard_files[0]['settings']['path_gt'], dibco_native=dibco_metrics,
+                                                    objects=shard_files[0]['settings'].get('objects', False))
+    stores = {folder: result_store.ResultStore(measure.result_fields()) for folder, measure in measures.items()}
+    for r in results:
+        stores[r['folder']].append(r['img'], types.SimpleNamespace(**r['values']))
+    for folder, measure in measures.items():
+        measure.set_results(stores[folder])
+        measure.computed_weights = any(folder in s['computed_weights'] for s in shard_files)
+
+    return list(measures.values()), dibco_metrics
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Merge the shard files of a sharded run (binar_eval.py --shard i/N).')
+    parser.add_argument("path_csv", help="path to the csv output file")
+    parser.add_argument("shard_files", help="shard files (default: all shard files of path_csv)", nargs='*')
+    parser.add_argument("-f", "--file_results", help="save results for each file", action="store_true")
+    parser.add_argument("--bootstrap", help="number of bootstrap resamples for the confidence intervals and significance tests of the fm (0 = off)", type=int, default=0)
+    parser.add_argument("--export", help="write the single results next to the csv file in this format", choices=result_store.EXPORT_FORMATS, default=None)
+    args = parser.parse_args()
+
+    import binar_eval
+
+    paths = args.shard_files if args.shard_files else find_shards(args.path_csv)
+    measures, dibco_metrics = merge_shards(read_shards(paths))
+    statistics = None
+    if args.bootstrap > 0:
+        import significance
+        statistics = significance.folder_statistics(measures, args.bootstrap)
+    binar_eval.write_csv(args.path_csv, measures, dibco_metrics, args.file_results, statistics)
+    print('Merged %d shards into %s' % (len(paths), args.path_csv))
+    if args.export:
+        print('Results exported to %s' % result_store.write_results(args.path_csv, measures, args.export))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Bootstrap confidence intervals and paired significance tests on the per-image results of FolderMeasures.
+
+All resamples are computed at once: a bootstrap resample of n images is given by the counts, how often each image is
+drawn, and the means of all resamples are the product of the (resamples x n) count matrix with the (n x methods)
+matrix of the per-image values. Methods evaluated on the same images share the count matrix.
+
+For each folder, the percentile confidence interval of the mean FM is computed. If several folders are evaluated, the
+folder with the best mean FM is the reference and each other folder is compared against it on their common images
+with a paired bootstrap test and a paired (sign flip) permutation test of the mean difference.
+"""
+
+import os
+import collections
+import numpy as np
+import constants
+
+DEFAULT_NUM_RESAMPLES = 10000
+CONFIDENCE = 0.95
+SEED = 0
+# Maximum number of elements of a count or sign matrix, the resamples are computed in chunks below this size:
+CHUNK_SIZE = 1 << 22
+
+def chunks(num_resamples: int, n: int):
+    step = max(1, CHUNK_SIZE // max(1, n))
+    for start in range(0, num_resamples, step):
+        yield start, min(num_resamples, start + step)
+
+def resample_counts(rng, num: int, n: int):
+    """Returns the (num x n) matrix, how often each of the n images is drawn by num bootstrap resamples."""
+    idx = rng.integers(0, n, (num, n)) + n * np.arange(num)[:, np.newaxis]
+    return np.bincount(idx.ravel(), minlength=num * n).reshape(num, n).astype(np.float64)
+
+def bootstrap_means(values, num_resamples: int = DEFAULT_NUM_RESAMPLES, rng = None):
+    """Returns the means of the bootstrap resamples of the columns of values (n x methods), as (resamples x methods)."""
+    rng = rng if rng is not None else np.random.default_rng(SEED)
+    values = np.asarray(values, np.float64)
+    n = values.shape[0]
+    means = np.empty((num_resamples, values.shape[1]))
+    for start, end in chunks(num_resamples, n):
+        means[start:end] = resample_counts(rng, end - start, n) @ values / n
+
+    return means
+
+def sign_flip_means(diffs, num_resamples: int = DEFAULT_NUM_RESAMPLES, rng = None):
+    """Returns the means of the randomly sign flipped columns of diffs (n x methods), as (resamples x methods)."""
+    rng = rng if rng is not None else np.random.default_rng(SEED)
+    diffs = np.asarray(diffs, np.float64)
+    n = diffs.shape[0]
+    means = np.empty((num_resamples, diffs.shape[1]))
+    for start, end in chunks(num_resamples, n):
+        signs = rng.integers(0, 2, (end - start, n)).astype(np.float64) * 2 - 1
+        means[start:end] = signs @ diffs / n
+
+    return means
+
+def confidence_intervals(values, num_resamples: int = DEFAULT_NUM_RESAMPLES, confidence: float = CONFIDENCE, rng = None):
+    """Returns the arrays (low, high) of the percentile bootstrap confidence intervals of the column means of values."""
+    means = bootstrap_means(values, num_resamples, rng)
+    alpha = (1 - confidence) / 2
+    low, high = np.percentile(means, [100 * alpha, 100 * (1 - alpha)], axis=0)
+
+    return low, high
+
+def paired_tests(diffs, num_resamples: int = DEFAULT_NUM_RESAMPLES, rng = None):
+    """
+    Returns the arrays (p_bootstrap, p_permutation) of the two-sided p-values for a zero mean of the columns of diffs.
+
+    diffs holds the per-image differences (n x methods) of paired results. The paired bootstrap test resamples the
+    differences, centered at their mean, the permutation test flips their signs randomly.
+    """
+    diffs = np.asarray(diffs, np.float64)
+    observed = np.abs(np.mean(diffs, axis=0))
+    # With the mean subtracted, the resampled means follow the null hypothesis of a zero mean:
+    centered = bootstrap_means(diffs, num_resamples, rng) - np.mean(diffs, axis=0)
+    p_bootstrap = (1 + np.sum(np.abs(centered) >= observed, axis=0)) / (num_resamples + 1)
+    flipped = sign_flip_means(diffs, num_resamples, rng)
+    p_permutation = (1 + np.sum(np.abs(flipped) >= observed, axis=0)) / (num_resamples + 1)
+
+    return p_bootstrap, p_permutation
+
+def folder_statistics(measures, num_resamples: int = DEFAULT_NUM_RESAMPLES):
+    """
+    Returns for each FolderMeasure the dict with the confidence interval of its mean FM and the p-values of its paired
+    comparison with the best folder (see the module documentation), keyed by the CSV headers.
+
+    The FolderMeasures of a multi-class evaluation (binar_eval.MultiClassEvaluation) are compared per class.
+    """
+    stats = [None] * len(measures)
+    fg_classes = collections.defaultdict(list)
+    for idx, measure in enumerate(measures):
+        fg_classes[measure.fg_class].append(idx)
+    for idxs in fg_classes.values():
+        for idx, s in zip(idxs, class_statistics([measures[idx] for idx in idxs], num_resamples)):
+            stats[idx] = s
+
+    return stats
+
+def class_statistics(measures, num_resamples: int = DEFAULT_NUM_RESAMPLES):
+    # The statistics of FolderMeasures of the same class (see folder_statistics):
+    rng = np.random.default_rng(SEED)
+    columns = [measure.results.column('fm') for measure in measures]
+    stats = [{} for _ in measures]
+
+    # Folders with the same number of images share the resamples:
+    by_size = collections.defaultdict(list)
+    for idx, column in enumerate(columns):
+        if len(column) > 0:
+            by_size[len(column)].append(idx)
+    for idxs in by_size.values():
+        low, high = confidence_intervals(np.stack([columns[idx] for idx in idxs], axis=1), num_resamples, rng=rng)
+        for idx, l, h in zip(idxs, low, high):
+            stats[idx][constants.HEADER_CI_LOW] = l
+            stats[idx][constants.HEADER_CI_HIGH] = h
+
+    if len(measures) < 2:
+        return stats
+
+    # The folders are paired with the best folder on their common images:
+    means = [np.mean(column) if len(column) > 0 else -np.inf for column in columns]
+    ref = int(np.argmax(means))
+    ref_values = {os.path.basename(img_name): v for img_name, v in zip(measures[ref].results.img_names, columns[ref])}
+    by_images = collections.defaultdict(list)
+    for idx, measure in enumerate(measures):
+        stats[idx][constants.HEADER_REFERENCE] = int(idx == ref)
+        if idx == ref:
+            continue
+        values = {os.path.basename(img_name): v for img_name, v in zip(measure.results.img_names, columns[idx])}
+        common = tuple(sorted(set(values) & set(ref_values)))
+        if common:
+            by_images[common].append((idx, np.array([values[img] - ref_values[img] for img in common])))
+    for common, diffs in by_images.items():
+        p_bootstrap, p_permutation = paired_tests(np.stack([d for _, d in diffs], axis=1), num_resamples, rng)
+        for (idx, _), p_b, p_p in zip(diffs, p_bootstrap, p_permutation):
+            stats[idx][constants.HEADER_P_BOOTSTRAP] = p_b
+            stats[idx][constants.HEADER_P_PERMUTATION] = p_p
+
+    return stats
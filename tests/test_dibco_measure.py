@@ -0,0 +1,101 @@
+import os
+import csv
+import sys
+import subprocess
+import cv2
+import numpy as np
+import pytest
+import dibco_measure
+import tiled_measure
+
+# Reference values of the page of write_reference_page, derived by hand from the definitions of the DIBCO metrics:
+REFERENCE = {
+    # 143 of the 144 foreground pixels are found, 1 of the 144 found pixels is a false positive:
+    'recall': 143 / 144 * 100,
+    'precision': 143 / 144 * 100,
+    'fm': 143 / 144 * 100,
+    # Recall weights: 71.5 of 73.5, precision weights: 143 of 143.25:
+    'pseudo_recall': 97.27891156462584,
+    'pseudo_precision': 99.82547993019197,
+    'pseudo_fm': 98.53574504737296,
+    # Each flipped pixel has a uniform 5x5 neighbourhood (DRD_k = 1), 8 of the 9 blocks are non-uniform:
+    'drd': 0.25,
+    # 2 of 576 pixels are flipped: 10 * log10(288)
+    'psnr': 24.59392487759231,
+}
+# The DRD is filtered in float32:
+TOLERANCE = 1e-6
+
+# Tolerance of the comparison with DIBCO_metrics.exe, which prints rounded values (the DIBCO tables report 2 decimals):
+TOOL_TOLERANCE = 0.01
+# Directory with the sample of the DIBCO tool (PR_bin.bmp, PR_GT.tiff, PR_RWeights.dat, PR_PWeights.dat) and the path
+# of DIBCO_metrics.exe, the comparison is skipped if they are not given:
+DIBCO_SAMPLE_DIR = os.environ.get('DIBCO_SAMPLE_DIR')
+DIBCO_METRICS_EXE = os.environ.get('DIBCO_METRICS_EXE')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def write_weights(path, weights):
+    # Format of the DIBCO weight tool: the image dimensions, followed by one value per pixel:
+    with open(path, 'w') as f:
+        f.write('%d %d\n' % (weights.shape[1], weights.shape[0]))
+        f.write(' '.join('%g' % w for w in weights.ravel()))
+
+def write_reference_page(tmp_path):
+    # 24 x 24 page with a 12 x 12 foreground square, a false negative inside and a false positive outside of it:
+    gt = np.zeros((24, 24), bool)
+    gt[6:18, 6:18] = True
+    img = gt.copy()
+    img[11, 11] = False
+    img[2, 2] = True
+
+    recall_weights = np.where(gt, 0.5, 0)
+    recall_weights[11, 11] = 2
+    precision_weights = np.ones(gt.shape)
+    precision_weights[2, 2] = 0.25
+
+    # DIBCO convention: the foreground is black:
+    paths = [str(tmp_path / name) for name in ['img.png', 'gt.png', 'r_weights.dat', 'p_weights.dat']]
+    cv2.imwrite(paths[0], np.where(img, 0, 255).astype(np.uint8))
+    cv2.imwrite(paths[1], np.where(gt, 0, 255).astype(np.uint8))
+    write_weights(paths[2], recall_weights)
+    write_weights(paths[3], precision_weights)
+
+    return paths
+
+def test_reference_values(tmp_path):
+    paths = write_reference_page(tmp_path)
+    cache_dir = str(tmp_path / 'cache')
+    for measure in [dibco_measure.DibcoMeasure(cache_dir), tiled_measure.TiledDibcoMeasure(cache_dir, band_height=8)]:
+        m = measure.calc(*paths)
+        for attr, value in REFERENCE.items():
+            assert getattr(m, attr) == pytest.approx(value, abs=TOLERANCE), attr
+
+@pytest.mark.parametrize('weight_files', [True, False])
+def test_approximate_header(tmp_path, weight_files):
+    paths = write_reference_page(tmp_path)
+    for folder in ['gt', 'img']:
+        (tmp_path / folder).mkdir()
+    os.replace(paths[0], tmp_path / 'img' / 'page.png')
+    os.replace(paths[1], tmp_path / 'gt' / 'page.png')
+    if weight_files:
+        os.replace(paths[2], tmp_path / 'gt' / 'page_RWeights.dat')
+        os.replace(paths[3], tmp_path / 'gt' / 'page_PWeights.dat')
+    path_csv = str(tmp_path / 'results.csv')
+    subprocess.run([sys.executable, 'binar_eval.py', str(tmp_path / 'gt') + os.sep, str(tmp_path / 'img') + os.sep,
+                    path_csv, '-dn', '--weight_cache', str(tmp_path / 'cache')], cwd=ROOT, check=True,
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    with open(path_csv, newline='') as f:
+        headers = next(csv.reader(f))
+    # The pseudo metrics of computed weights are labeled as approximate:
+    assert ('pseudo_fm' in headers) == weight_files
+    assert ('pseudo_fm_approx' in headers) != weight_files
+
+@pytest.mark.skipif(not DIBCO_SAMPLE_DIR or not DIBCO_METRICS_EXE, reason='DIBCO_SAMPLE_DIR and DIBCO_METRICS_EXE are not set')
+def test_dibco_tool_sample(tmp_path):
+    paths = [os.path.join(DIBCO_SAMPLE_DIR, name) for name in ['PR_bin.bmp', 'PR_GT.tiff', 'PR_RWeights.dat', 'PR_PWeights.dat']]
+    m_native = dibco_measure.DibcoMeasure(str(tmp_path)).calc(*paths)
+    m_tool = dibco_measure.DibcoWrapper(DIBCO_METRICS_EXE).calc(*paths)
+    for attr in REFERENCE:
+        assert getattr(m_native, attr) == pytest.approx(getattr(m_tool, attr), abs=TOOL_TOLERANCE), attr
@@ -0,0 +1,90 @@
+import os
+import cv2
+import numpy as np
+import pytest
+import dibco_weights
+
+@pytest.mark.parametrize('header', [False, True])
+def test_read_weights(tmp_path, monkeypatch, header):
+    # Small chunks, so that values are split at the chunk borders:
+    monkeypatch.setattr(dibco_weights, 'TEXT_CHUNK_SIZE', 7)
+    shape = (13, 11)
+    weights = np.random.default_rng(0).random(shape)
+    path = tmp_path / 'weights.dat'
+    with open(path, 'w') as f:
+        if header:
+            f.write('%d %d\n' % (shape[1], shape[0]))
+        f.write('\n'.join(' '.join('%.6f' % w for w in row) for row in weights) + '\n')
+
+    cache = dibco_weights.WeightCache(str(tmp_path / 'cache'))
+    expected = np.fromfile(path, sep=' ', dtype=np.float64)[2 if header else 0:].reshape(shape).astype(np.float32)
+    np.testing.assert_array_equal(cache.read_weights(str(path), shape), expected)
+    # The second read uses the converted file:
+    np.testing.assert_array_equal(cache.read_weights(str(path), shape), expected)
+
+    with pytest.raises(Exception):
+        cache.read_weights(str(path), (12, 11))
+
+def test_converted_weight_files(tmp_path):
+    shape = (100, 100)
+    paths = []
+    for i in range(3):
+        paths.append(str(tmp_path / ('weights_%d.dat' % i)))
+        np.savetxt(paths[-1], np.full(shape, i / 4))
+    cache_dir = tmp_path / 'cache'
+    # Room for the binary copies (40 kB each) of two weight files:
+    cache = dibco_weights.WeightCache(str(cache_dir), 100000)
+
+    assert cache.read_weights(paths[0], shape).dtype == np.float32
+    cache.read_weights(paths[1], shape)
+    # The least recently used copy is evicted:
+    cache.read_weights(paths[0], shape)
+    cache.read_weights(paths[2], shape)
+    assert sorted(os.listdir(cache_dir)) == sorted(os.path.basename(cache.weight_file_path(p)) for p in [paths[0], paths[2]])
+
+    # A modified weight file replaces its copy:
+    old_copy = cache.weight_file_path(paths[2])
+    np.savetxt(paths[2], np.ones(shape))
+    os.utime(paths[2], ns=(0, 0))
+    assert np.all(cache.read_weights(paths[2], shape) == 1)
+    assert not os.path.exists(old_copy)
+    assert len(os.listdir(cache_dir)) == 2
+
+def test_metric_version(tmp_path, monkeypatch):
+    gt_path = tmp_path / 'gt.png'
+    gt = np.full((20, 30), 255, np.uint8)
+    gt[5:15, 10:20] = 0
+    cv2.imwrite(str(gt_path), gt)
+
+    cache = dibco_weights.WeightCache(str(tmp_path / 'cache'))
+    recall_weights, precision_weights = cache.get(str(gt_path))
+    expected = dibco_weights.compute_weights(gt < 128)
+    np.testing.assert_array_equal(recall_weights, expected[0])
+    np.testing.assert_array_equal(precision_weights, expected[1])
+
+    # The weights of another metric version are computed again:
+    path = cache.cache_path(str(gt_path))
+    monkeypatch.setattr(dibco_weights.constants, 'METRIC_VERSION', dibco_weights.constants.METRIC_VERSION + 1)
+    assert cache.cache_path(str(gt_path)) != path
+    monkeypatch.setattr(dibco_weights, 'compute_weights', lambda gt: (np.zeros(gt.shape, np.float32), np.ones(gt.shape, np.float32)))
+    recall_weights, _ = cache.get(str(gt_path))
+    assert not np.any(recall_weights)
+
+def test_computed_weights_eviction(tmp_path):
+    shape = (50, 50)
+    paths = []
+    for i in range(3):
+        gt = np.full(shape, 255, np.uint8)
+        gt[10:40, 10 + i:20 + i] = 0
+        paths.append(str(tmp_path / ('gt_%d.png' % i)))
+        cv2.imwrite(paths[-1], gt)
+    cache_dir = tmp_path / 'cache'
+    # Room for the weights (20 kB each) of two ground truth images:
+    cache = dibco_weights.WeightCache(str(cache_dir), 50000)
+
+    cache.get(paths[0])
+    cache.get(paths[1])
+    # The least recently used weights are evicted:
+    cache.get(paths[0])
+    cache.get(paths[2])
+    assert sorted(os.listdir(cache_dir)) == sorted(os.path.basename(cache.cache_path(p)) for p in [paths[0], paths[2]])
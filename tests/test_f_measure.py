@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+import constants
+import f_measure
+
+def random_gt(rng, shape, fg_type):
+    """Returns a random ground truth image of the FGType and its (fg, ignore) masks by the definition of the dataset."""
+    if fg_type == constants.FGType.REGULAR:
+        # Foreground: all pixels, which are not white:
+        gt = rng.choice(np.array([0, 128, 255], np.uint8), shape, p=[0.3, 0.1, 0.6])
+        return gt, gt != 255, np.zeros(shape, bool)
+
+    # Color (BGR) ground truth with the gray values of the MSBin classes, green (MSTEx) and uncertain (blue) regions:
+    colors = np.array([[0, 0, 0], [255, 255, 255], [122, 122, 122], [0, 255, 0], [255, 0, 0]], np.uint8)
+    gt = colors[rng.integers(0, len(colors), shape)]
+    b, g, r = gt[:, :, 0], gt[:, :, 1], gt[:, :, 2]
+    ignore = (b == 255) & (r == 0)
+    if fg_type == constants.FGType.MSBIN_FG_1:
+        fg = g == 255
+    elif fg_type == constants.FGType.MSBIN_FG_2:
+        fg = g == 122
+    else:
+        fg = (g == 255) & (b == 0) & (r == 0)
+        # MSTEx does not have uncertain regions:
+        ignore = np.zeros(shape, bool)
+
+    return gt, fg, ignore
+
+@pytest.mark.parametrize('fg_type', list(constants.FGType))
+@pytest.mark.parametrize('invert_img', [False, True])
+def test_confusion_counts(fg_type, invert_img):
+    rng = np.random.default_rng(fg_type.value)
+    shape = (37, 53)
+    gt, gt_fg, ignore = random_gt(rng, shape, fg_type)
+    img = rng.choice(np.array([0, 255], np.uint8), shape)
+
+    # Direct computation with boolean masks, the ignored pixels are excluded from the foreground of the result:
+    img_fg = (img == 0) if invert_img else (img > 0)
+    img_fg = (img_fg | ignore) if invert_img else (img_fg & ~ignore)
+    tp = np.sum(img_fg & gt_fg)
+    fp = np.sum(img_fg & ~gt_fg)
+    fn = np.sum(~img_fg & gt_fg)
+    tn = np.sum(~img_fg & ~gt_fg)
+
+    result = f_measure.PerformanceResult(img, gt, fg_type, invert_img)
+    assert (result.tp, result.fp, result.fn, result.tn) == (tp, fp, fn, tn)
+    recall = tp / (tp + fn)
+    precision = tp / (tp + fp)
+    assert result.recall == pytest.approx(recall, abs=1e-12)
+    assert result.precision == pytest.approx(precision, abs=1e-12)
+    assert result.fm == pytest.approx(2 * recall * precision / (recall + precision), abs=1e-12)
+    assert result.nrm == pytest.approx((fn / (fn + tp) + fp / (fp + tn)) / 2, abs=1e-12)
+
+    # The counts do not depend on the chunks:
+    gt_masks = f_measure.gt_masks(gt, fg_type)
+    masked = f_measure.img_mask(img, invert_img, gt_masks[1])
+    assert f_measure.confusion_counts(masked, gt_masks[0], chunk_size=97) == (tp, fp, fn, tn)
+
+@pytest.mark.parametrize('max_pair_table', [f_measure.MAX_PAIR_TABLE, 0])
+def test_object_counts(monkeypatch, max_pair_table):
+    # max_pair_table = 0 uses the np.unique fallback instead of the table of component pairs:
+    monkeypatch.setattr(f_measure, 'MAX_PAIR_TABLE', max_pair_table)
+    gt = np.zeros((10, 12), bool)
+    img = np.zeros((10, 12), bool)
+    # Split: a ground truth bar, which is covered by two result components:
+    gt[1:3, 1:7] = True
+    img[1:3, 1:3] = True
+    img[1:3, 5:7] = True
+    # Merge: two ground truth components, which are covered by a single result component:
+    gt[5, 1:3] = True
+    gt[5, 5:7] = True
+    img[5, 1:7] = True
+    # Miss: a ground truth component without any result pixel:
+    gt[8, 1:3] = True
+    # False positive: a result component without any ground truth pixel:
+    img[8, 8:10] = True
+
+    assert f_measure.object_counts(img, gt) == (4, 1, 1, 1, 1)
+    # Perfect result:
+    assert f_measure.object_counts(gt, gt) == (4, 0, 0, 0, 0)
+
+@pytest.mark.parametrize('chunk_size', [1 << 20, 50])
+def test_tile_counts(chunk_size):
+    rng = np.random.default_rng(1)
+    # The shape is not divisible by the grid:
+    shape = (37, 53)
+    grid = (4, 6)
+    img = rng.random(shape) < 0.4
+    gt = rng.random(shape) < 0.3
+
+    tiles = f_measure.tile_counts(img, gt, grid, chunk_size)
+    assert tiles.shape == (4,) + grid
+    assert tuple(tiles.sum(axis=(1, 2))) == f_measure.confusion_counts(img, gt)
+
+    row_edges = f_measure.tile_edges(shape[0], grid[0])
+    col_edges = f_measure.tile_edges(shape[1], grid[1])
+    assert row_edges[0] == 0 and row_edges[-1] == shape[0] and col_edges[0] == 0 and col_edges[-1] == shape[1]
+    for row in range(grid[0]):
+        for col in range(grid[1]):
+            tile = (slice(row_edges[row], row_edges[row + 1]), slice(col_edges[col], col_edges[col + 1]))
+            i, g = img[tile], gt[tile]
+            expected = [np.sum(i & g), np.sum(i & ~g), np.sum(~i & g), np.sum(~i & ~g)]
+            assert list(tiles[:, row, col]) == expected
@@ -0,0 +1,85 @@
+import os
+import pickle
+import concurrent.futures
+import cv2
+import numpy as np
+import pytest
+import constants
+import gt_cache
+
+def write_gts(tmp_path, num, shape = (64, 64)):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(num):
+        paths.append(str(tmp_path / ('gt_%d.png' % i)))
+        cv2.imwrite(paths[-1], np.where(rng.random(shape) < 0.3, 0, 255).astype(np.uint8))
+
+    return paths
+
+@pytest.mark.parametrize('shape', [(1, 1), (3, 5), (7, 13), (16, 9)])
+def test_packbits_round_trip(tmp_path, shape):
+    rng = np.random.default_rng(0)
+    fg = rng.random(shape) < 0.5
+    ignore = rng.random(shape) < 0.2
+    for masks in [gt_cache.GTMasks(fg), gt_cache.GTMasks(fg, ignore)]:
+        path = str(tmp_path / 'masks.npz')
+        masks.save(path)
+        for m in [masks, gt_cache.GTMasks.load(path)]:
+            fg_unpacked, ignore_unpacked = m.unpack()
+            np.testing.assert_array_equal(fg_unpacked, fg)
+            if masks.ignore is None:
+                assert ignore_unpacked is None
+            else:
+                np.testing.assert_array_equal(ignore_unpacked, ignore)
+
+def test_lru_eviction(tmp_path):
+    paths = write_gts(tmp_path, 3)
+    # Room for the packed masks (512 bytes) of two images:
+    cache = gt_cache.GTCache(1024)
+    cache.get(paths[0])
+    cache.get(paths[1])
+    cache.get(paths[0])
+    cache.get(paths[2])
+    # The least recently used image is evicted:
+    cached = [key[0] for key in cache.entries]
+    assert cached == [os.path.abspath(paths[0]), os.path.abspath(paths[2])]
+    assert cache.nbytes == 1024
+    assert (cache.hits, cache.misses) == (1, 3)
+
+def cache_stats(cache, gt_path):
+    cache.get(gt_path)
+    return os.getpid(), cache.hits, cache.misses
+
+def test_reduce(tmp_path):
+    paths = write_gts(tmp_path, 1)
+    cache = gt_cache.GTCache(1 << 20)
+    cache.get(paths[0])
+    # The cached masks are not pickled, the unpickled cache is the cache of the process with the same settings:
+    copy = pickle.loads(pickle.dumps(cache))
+    assert copy is not cache and len(copy.entries) == 0
+    assert pickle.loads(pickle.dumps(cache)) is copy
+
+    # Each worker keeps its own cache across the tasks:
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
+        stats = list(executor.map(cache_stats, [cache] * 3, paths * 3))
+    assert len({pid for pid, _, _ in stats}) == 1
+    assert [(hits, misses) for _, hits, misses in stats] == [(0, 1), (1, 1), (2, 1)]
+
+def test_disk_size_limit(tmp_path):
+    paths = write_gts(tmp_path, 5)
+    cache_dir = tmp_path / 'cache'
+    # The .npz files of about two images fit into the directory:
+    cache = gt_cache.GTCache(1 << 20, str(cache_dir), 2000)
+    for path in paths:
+        cache.get(path)
+    files = os.listdir(cache_dir)
+    assert 0 < len(files) < len(paths)
+    assert sum(os.path.getsize(cache_dir / f) for f in files) <= 2000
+    # The last image is kept:
+    assert os.path.basename(cache.disk_path(cache.key(paths[-1], constants.FGType.REGULAR))) in files
+
+    # A new cache with the same directory loads the kept masks, the evicted ones are decoded again:
+    cache = gt_cache.GTCache(1 << 20, str(cache_dir), 2000)
+    for path in paths:
+        fg, _ = cache.get(path)
+        np.testing.assert_array_equal(fg, cv2.imread(path, cv2.IMREAD_GRAYSCALE) != 255)
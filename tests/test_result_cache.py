@@ -0,0 +1,61 @@
+import os
+import types
+import itertools
+import f_measure
+import result_cache
+
+SETTINGS = ('fm', 0, False)
+
+def write(path, content: bytes, mtime_ns: int):
+    with open(path, 'wb') as f:
+        f.write(content)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+def test_changed_files_miss(tmp_path):
+    img_path, gt_path = str(tmp_path / 'img.png'), str(tmp_path / 'gt.png')
+    write(img_path, b'img', 1000)
+    write(gt_path, b'gt', 1000)
+    cache = result_cache.ResultCache(str(tmp_path / 'cache'))
+    cache.put(cache.key([img_path, gt_path], SETTINGS), f_measure.PerformanceResult.from_counts(1, 2, 3, 4))
+    assert cache.get(cache.key([img_path, gt_path], SETTINGS)).tp == 1
+
+    # Touched, but unchanged files hit the cache (the key is the hash of the contents):
+    write(img_path, b'img', 2000)
+    assert cache.get(cache.key([img_path, gt_path], SETTINGS)) is not None
+    # A changed result image or ground truth misses the cache:
+    write(img_path, b'img2', 3000)
+    assert cache.get(cache.key([img_path, gt_path], SETTINGS)) is None
+    write(img_path, b'img', 4000)
+    write(gt_path, b'gt2', 4000)
+    assert cache.get(cache.key([img_path, gt_path], SETTINGS)) is None
+    # Other settings miss the cache too:
+    write(gt_path, b'gt', 5000)
+    assert cache.get(cache.key([img_path, gt_path], ('fm', 0, True))) is None
+    assert cache.get(cache.key([img_path, gt_path], SETTINGS)) is not None
+    assert (cache.hits, cache.misses) == (3, 3)
+    cache.close()
+
+def test_eviction(tmp_path, monkeypatch):
+    # A clock, which advances with every call, so that the order of use is unique:
+    monkeypatch.setattr(result_cache, 'time', types.SimpleNamespace(time=itertools.count().__next__))
+    cache = result_cache.ResultCache(str(tmp_path / 'cache'), 1000)
+    result = f_measure.PerformanceResult.from_counts(1, 2, 3, 4)
+    entry_size = len('{"counts": [1, 2, 3, 4]}')
+    keys = ['key_%d' % i for i in range(1000 // entry_size)]
+    for key in keys:
+        cache.put(key, result)
+    assert cache.nbytes == len(keys) * entry_size
+
+    # The first key is used again, hence the second one is the least recently used:
+    assert cache.get(keys[0]) is not None
+    cache.put('key_new', result)
+    assert 0.9 * 1000 - entry_size < cache.nbytes <= 0.9 * 1000
+    num_evicted = len(keys) + 1 - cache.nbytes // entry_size
+    assert all(cache.get(key) is None for key in keys[1:num_evicted + 1])
+    assert all(cache.get(key) is not None for key in [keys[0], 'key_new'] + keys[num_evicted + 1:])
+    cache.close()
+
+    # The size is restored from the database:
+    cache = result_cache.ResultCache(str(tmp_path / 'cache'), 1000)
+    assert cache.nbytes == (len(keys) + 1 - num_evicted) * entry_size
+    cache.close()
@@ -0,0 +1,32 @@
+import os
+import f_measure
+import result_log
+
+SETTINGS = {'fg_type': 0}
+
+def test_resume_after_partial_line(tmp_path):
+    path_csv = str(tmp_path / 'results.csv')
+    log = result_log.ResultLog(path_csv, SETTINGS)
+    log.append('m1/', 'a.png', 'fp_a', f_measure.PerformanceResult.from_counts(10, 2, 3, 85))
+    log.append('m1/', 'b.png', 'fp_b', f_measure.PerformanceResult.from_counts(20, 1, 4, 75))
+    log.close()
+
+    # A killed run leaves a partial last line:
+    path_results = path_csv + result_log.RESULTS_POSTFIX
+    size = os.path.getsize(path_results)
+    with open(path_results, 'rb+') as f:
+        f.truncate(size - 10)
+
+    log = result_log.ResultLog(path_csv, SETTINGS, resume=True)
+    assert log.get('m1/', 'a.png', 'fp_a').tp == 10
+    assert log.get('m1/', 'b.png', 'fp_b') is None
+    log.append('m1/', 'b.png', 'fp_b', f_measure.PerformanceResult.from_counts(20, 1, 4, 75))
+    log.close()
+
+    # The result appended after the partial line is not lost on the next resume:
+    log = result_log.ResultLog(path_csv, SETTINGS, resume=True)
+    assert log.get('m1/', 'a.png', 'fp_a').tp == 10
+    assert log.get('m1/', 'b.png', 'fp_b').tp == 20
+    log.close()
+    with open(path_results, encoding='utf8') as f:
+        assert len(f.read().splitlines()) == 2
@@ -0,0 +1,43 @@
+import os
+import sys
+import subprocess
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def write_folders(tmp_path):
+    # Ground truth of 5 pages and the results of 2 methods (DIBCO convention: the foreground of the gt is black):
+    rng = np.random.default_rng(0)
+    path_gt = tmp_path / 'gt'
+    path_gt.mkdir()
+    for page in range(5):
+        gt = np.where(rng.random((40, 30)) < 0.2, 0, 255).astype(np.uint8)
+        cv2.imwrite(str(path_gt / ('p%d.png' % page)), gt)
+        for method in range(2):
+            path_img = tmp_path / 'img' / ('m%d' % method)
+            path_img.mkdir(parents=True, exist_ok=True)
+            flip = rng.random(gt.shape) < 0.1 * (method + 1)
+            cv2.imwrite(str(path_img / ('p%d.png' % page)), np.where(flip, gt, 255 - gt).astype(np.uint8))
+
+    return str(path_gt) + os.sep, str(tmp_path / 'img') + os.sep
+
+def run(*args):
+    subprocess.run([sys.executable] + list(args), cwd=ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def test_merged_shards(tmp_path):
+    path_gt, path_img = write_folders(tmp_path)
+    path_csv = str(tmp_path / 'results.csv')
+    path_sharded_csv = str(tmp_path / 'sharded.csv')
+    run('binar_eval.py', path_gt, path_img, path_csv, '-s', '-f')
+
+    # The shards run as concurrent processes:
+    num_shards = 3
+    processes = [subprocess.Popen([sys.executable, 'binar_eval.py', path_gt, path_img, path_sharded_csv, '-s',
+                    '--shard', '%d/%d' % (i, num_shards)], cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                    for i in range(num_shards)]
+    assert all(p.wait() == 0 for p in processes)
+    run('shards.py', path_sharded_csv, '-f')
+
+    with open(path_csv, 'rb') as f, open(path_sharded_csv, 'rb') as f_sharded:
+        assert f_sharded.read() == f.read()
@@ -0,0 +1,17 @@
+import os
+import sys
+import subprocess
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules, which are imported on demand only (see binar_eval.FolderMeasure.batch_measure):
+LAZY_MODULES = ['matplotlib', 'tqdm', 'dibco_measure', 'tiled_measure']
+
+@pytest.mark.parametrize('module', ['f_measure', 'binar_eval'])
+def test_lazy_imports(module):
+    # A fresh interpreter, as the other tests import the lazy modules:
+    code = 'import sys; import %s; print(" ".join(sys.modules))' % module
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    modules = output.split()
+    loaded = [m for m in LAZY_MODULES if any(name == m or name.startswith(m + '.') for name in modules)]
+    assert not loaded
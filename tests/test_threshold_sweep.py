@@ -0,0 +1,32 @@
+import cv2
+import numpy as np
+import pytest
+import constants
+import f_measure
+import threshold_sweep
+
+THRESHOLDS = [0, 1, 100, 127, 254, 255]
+
+@pytest.mark.parametrize('fg_type', [constants.FGType.REGULAR, constants.FGType.MSBIN_FG_1])
+def test_sweep_equals_thresholding(tmp_path, fg_type):
+    rng = np.random.default_rng(0)
+    shape = (41, 29)
+    if fg_type == constants.FGType.REGULAR:
+        gt = np.where(rng.random(shape) < 0.3, 0, 255).astype(np.uint8)
+    else:
+        # MSBin: white foreground and blue uncertain regions:
+        colors = np.array([[0, 0, 0], [255, 255, 255], [255, 0, 0]], np.uint8)
+        gt = colors[rng.integers(0, len(colors), shape)]
+    # The gray values include 0 and 255, i.e. the edges of the sweep:
+    img = rng.integers(0, 256, shape, dtype=np.uint8)
+    img[0, :2] = [0, 255]
+    cv2.imwrite(str(tmp_path / 'gt.png'), gt)
+    cv2.imwrite(str(tmp_path / 'img.png'), img)
+
+    counts = threshold_sweep.sweep_image(str(tmp_path / 'img.png'), str(tmp_path / 'gt.png'), fg_type)
+    sweep = threshold_sweep.SweepResult(['img.png'], [counts])
+    for t in THRESHOLDS:
+        # The foreground of threshold t are the values > t:
+        result = f_measure.PerformanceResult(np.where(img > t, 255, 0).astype(np.uint8), gt, fg_type)
+        assert tuple(counts[:, t]) == (result.tp, result.fp, result.fn, result.tn), t
+        assert sweep.fm[0, t] == pytest.approx(result.fm, abs=1e-12), t
@@ -0,0 +1,45 @@
+import cv2
+import numpy as np
+import f_measure
+import tiled_measure
+
+def write_page(tmp_path):
+    # Ground truth and result of a synthetic page (DIBCO convention: the foreground is black):
+    rng = np.random.default_rng(0)
+    gt = np.full((100, 80), 255, np.uint8)
+    gt[10:40, 5:70] = 0
+    gt[60:90, 20:30] = 0
+    img = gt.copy()
+    flip = rng.random(gt.shape) < 0.1
+    img[flip] = 255 - img[flip]
+    cv2.imwrite(str(tmp_path / 'gt.png'), gt)
+    # Result images are stored with a white foreground:
+    cv2.imwrite(str(tmp_path / 'img.png'), 255 - img)
+
+    return gt
+
+def test_npy_masks(tmp_path):
+    gt = write_page(tmp_path)
+    np.save(tmp_path / 'gt_bool.npy', gt == 0)
+    np.save(tmp_path / 'gt_int.npy', (gt == 0).astype(np.int32))
+    np.save(tmp_path / 'gt_uint8.npy', gt)
+
+    expected = f_measure.PerformanceMeasure(str(tmp_path), str(tmp_path)).calc('img.png', 'gt.png')
+    measure = tiled_measure.TiledMeasure(str(tmp_path), str(tmp_path), band_height=16)
+    for gt_name in ['gt.png', 'gt_bool.npy', 'gt_int.npy', 'gt_uint8.npy']:
+        result = measure.calc('img.png', gt_name)
+        assert (result.tp, result.fp, result.fn, result.tn) == (expected.tp, expected.fp, expected.fn, expected.tn), gt_name
+        assert result.fm == expected.fm
+
+def test_dibco_npy_mask(tmp_path):
+    gt = write_page(tmp_path)
+    np.save(tmp_path / 'gt_bool.npy', gt == 0)
+    # DIBCO convention: the foreground is black:
+    img = 255 - cv2.imread(str(tmp_path / 'img.png'), cv2.IMREAD_GRAYSCALE)
+    cv2.imwrite(str(tmp_path / 'img_dibco.png'), img)
+
+    measure = tiled_measure.TiledDibcoMeasure(str(tmp_path / 'cache'), band_height=16)
+    expected = measure.calc(str(tmp_path / 'img_dibco.png'), str(tmp_path / 'gt.png'))
+    result = measure.calc(str(tmp_path / 'img_dibco.png'), str(tmp_path / 'gt_bool.npy'))
+    for attr in ['fm', 'pseudo_fm', 'drd', 'psnr']:
+        assert getattr(result, attr) == getattr(expected, attr), attr
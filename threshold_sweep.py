@@ -0,0 +1,120 @@
+"""Evaluates grayscale / probability images for all 256 global thresholds at once.
+
+For a threshold t, the foreground of an image consists of the pixels with a value larger than t (as for the binary
+images, where the foreground is given by the values > 0). All confusion counts are derived from a single joint
+histogram of the gray values and the ground truth labels.
+"""
+
+import os
+import numpy as np
+import constants
+import f_measure
+import profiler
+
+NUM_THRESHOLDS = 256
+
+def joint_histogram(img, gt, chunk_size: int = 1 << 20):
+    """
+    Returns the joint histogram hist[v, g] of the uint8 image img and the boolean foreground gt.
+
+    Each pixel is encoded as 2 * v + g and the codes are counted with np.bincount, chunk by chunk.
+    """
+    img = np.ravel(img)
+    gt = np.ravel(gt)
+    hist = np.zeros(2 * NUM_THRESHOLDS, np.int64)
+    code = np.empty(min(chunk_size, img.size), np.uint16)
+    for start in range(0, img.size, chunk_size):
+        img_chunk = img[start:start + chunk_size]
+        c = code[:img_chunk.size]
+        np.left_shift(img_chunk, 1, out=c, dtype=np.uint16)
+        np.bitwise_or(c, gt[start:start + chunk_size].view(np.uint8), out=c)
+        hist += np.bincount(c, minlength=2 * NUM_THRESHOLDS)
+
+    return hist.reshape(NUM_THRESHOLDS, 2)
+
+def threshold_counts(hist):
+    """Returns the arrays (tp, fp, fn, tn) with the confusion counts for the thresholds 0, ..., 255."""
+    bg_hist = hist[:, 0]
+    fg_hist = hist[:, 1]
+    num_fg = np.sum(fg_hist)
+    num_bg = np.sum(bg_hist)
+    # The foreground for threshold t is formed by the values > t:
+    tp = num_fg - np.cumsum(fg_hist)
+    fp = num_bg - np.cumsum(bg_hist)
+
+    return tp, fp, num_fg - tp, num_bg - fp
+
+def performance_curves(tp, fp, fn, tn):
+    """Vectorized version of f_measure.performance_values: returns the arrays (recall, precision, fm, nrm)."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        recall = np.nan_to_num(tp / (tp + fn), nan=0.0)
+        precision = np.nan_to_num(tp / (tp + fp), nan=0.0)
+        fm = np.nan_to_num(2 * recall * precision / (recall + precision), nan=0.0)
+        nrm = (fn / (fn + tp) + fp / (fp + tn)) / 2
+
+    return recall, precision, fm, nrm
+
+def sweep_image(img_path: str, gt_path: str, fg_type: constants.FGType = constants.FGType.REGULAR, invert_img = False, 
+                gt_cache = None):
+    """Returns the confusion counts of the image for all thresholds as an array with shape (4, 256)."""
+    with profiler.stage('decode', img_path):
+        img = f_measure.read_img(img_path, fg_type)
+    if gt_cache is not None:
+        with profiler.stage('gt_cache', img_path):
+            gt, ignore = gt_cache.get(gt_path, fg_type)
+    else:
+        with profiler.stage('decode', img_path):
+            gt = f_measure.read_gt(gt_path, fg_type)
+        with profiler.stage('masking', img_path):
+            gt, ignore = f_measure.gt_masks(gt, fg_type)
+    if img.dtype != np.uint8:
+        raise Exception('The threshold sweep requires 8 bit images: %s' % img_path)
+
+    # As in f_measure.img_mask, ignored pixels are set to 0 before the inversion:
+    with profiler.stage('masking', img_path):
+        if ignore is not None:
+            img = np.where(ignore, 0, img).astype(np.uint8)
+        if invert_img:
+            img = 255 - img
+
+    with profiler.stage('counting', img_path):
+        return np.array(threshold_counts(joint_histogram(img, gt)))
+
+class SweepResult:
+    """
+    Performance curves of a folder.
+
+    The per-image curves (recall, precision, fm, nrm) have the shape (number of images, 256). Images without any
+    foreground pixel in the ground truth are excluded, as in FolderMeasure.batch_measure.
+    """
+
+    def __init__(self, img_names, counts):
+        counts = np.asarray(counts, dtype=np.int64).reshape(-1, 4, NUM_THRESHOLDS)
+        tp, fp, fn, tn = counts[:, 0], counts[:, 1], counts[:, 2], counts[:, 3]
+        valid = (tp[:, 0] + fn[:, 0]) > 0
+
+        self.img_names = [img_name for img_name, v in zip(img_names, valid) if v]
+        self.recall, self.precision, self.fm, self.nrm = performance_curves(tp[valid], fp[valid], fn[valid], tn[valid])
+
+        self.thresholds = np.arange(NUM_THRESHOLDS)
+        self.mean_recall = np.mean(self.recall, axis=0)
+        self.mean_precision = np.mean(self.precision, axis=0)
+        self.mean_fm = np.mean(self.fm, axis=0)
+        self.mean_nrm = np.mean(self.nrm, axis=0)
+
+        # The global threshold maximizes the mean fm, the per-image thresholds maximize the fm of each image:
+        self.best_threshold = int(np.argmax(self.mean_fm))
+        self.img_best_thresholds = np.argmax(self.fm, axis=1)
+
+    def img_values(self, idx: int):
+        """Returns the tuple (threshold, fm, precision, recall, nrm) at the best threshold of the image idx."""
+        t = self.img_best_thresholds[idx]
+        return t, self.fm[idx, t], self.precision[idx, t], self.recall[idx, t], self.nrm[idx, t]
+
+def gt_name(img_name: str) -> str:
+    # Pseudo (probability) images are named like the ground truth, extended by 'pseudo':
+    base, ext = os.path.splitext(os.path.basename(img_name))
+    for token in ['_pseudo', '-pseudo', 'pseudo']:
+        base = base.replace(token, '')
+
+    return base + ext
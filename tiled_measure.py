@@ -0,0 +1,281 @@
+"""Evaluation of very large images in horizontal bands.
+
+The images are read band by band - uncompressed (striped or tiled) TIFF files and .npy files through memory maps -
+and the confusion counts (or the sums of the DIBCO metrics) are accumulated over the bands. Hence, the peak memory
+is bounded by the band size and not by the page size. Other image formats are decoded completely by OpenCV, but are
+still evaluated band by band.
+Color images are returned in the channel order of OpenCV (BGR), also for TIFF files (which are stored as RGB).
+.npy files of another dtype than uint8 (e.g. bool or 0/1 integers) are foreground masks, whose nonzero pixels are the
+foreground. uint8 arrays follow the conventions of the images.
+"""
+
+import os
+import struct
+import cv2
+import numpy as np
+import constants
+import f_measure
+import dibco_measure
+import dibco_weights
+
+DEFAULT_BAND_HEIGHT = 1024
+
+# TIFF tags:
+TAG_IMAGE_WIDTH = 256
+TAG_IMAGE_LENGTH = 257
+TAG_BITS_PER_SAMPLE = 258
+TAG_COMPRESSION = 259
+TAG_PHOTOMETRIC = 262
+TAG_STRIP_OFFSETS = 273
+TAG_SAMPLES_PER_PIXEL = 277
+TAG_ROWS_PER_STRIP = 278
+TAG_STRIP_BYTE_COUNTS = 279
+TAG_PLANAR_CONFIGURATION = 284
+TAG_TILE_WIDTH = 322
+TAG_TILE_LENGTH = 323
+TAG_TILE_OFFSETS = 324
+
+# TIFF field types: type -> (struct format, size)
+TIFF_TYPES = {1: ('B', 1), 3: ('H', 2), 4: ('I', 4), 16: ('Q', 8)}
+
+class UnsupportedTiff(Exception):
+    pass
+
+class TiffReader:
+    """
+    Reads rows of uncompressed TIFF (and BigTIFF) files with 1 or 8 bits per sample through a memory map.
+
+    Raises UnsupportedTiff for other TIFF files.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(16)
+            byte_order = {b'II': '<', b'MM': '>'}.get(header[:2])
+            if byte_order is None:
+                raise UnsupportedTiff('Not a TIFF file: %s' % path)
+            version = struct.unpack(byte_order + 'H', header[2:4])[0]
+            if version == 42:
+                tags = self.read_ifd(f, byte_order, struct.unpack(byte_order + 'I', header[4:8])[0], False)
+            elif version == 43:
+                tags = self.read_ifd(f, byte_order, struct.unpack(byte_order + 'Q', header[8:16])[0], True)
+            else:
+                raise UnsupportedTiff('Unknown TIFF version: %s' % path)
+
+        if tags.get(TAG_COMPRESSION, [1])[0] != 1:
+            raise UnsupportedTiff('Compressed TIFF: %s' % path)
+        if tags.get(TAG_PLANAR_CONFIGURATION, [1])[0] != 1:
+            raise UnsupportedTiff('Planar TIFF: %s' % path)
+
+        self.width = tags[TAG_IMAGE_WIDTH][0]
+        self.height = tags[TAG_IMAGE_LENGTH][0]
+        self.samples = tags.get(TAG_SAMPLES_PER_PIXEL, [1])[0]
+        self.bits = tags.get(TAG_BITS_PER_SAMPLE, [1])[0]
+        self.photometric = tags.get(TAG_PHOTOMETRIC, [1])[0]
+        if self.bits not in (1, 8) or (self.bits == 1 and self.samples != 1):
+            raise UnsupportedTiff('Unsupported bit depth: %s' % path)
+
+        self.shape = (self.height, self.width) if self.samples == 1 else (self.height, self.width, self.samples)
+        self.data = np.memmap(path, dtype=np.uint8, mode='r')
+
+        if TAG_TILE_OFFSETS in tags:
+            self.segment_width = tags[TAG_TILE_WIDTH][0]
+            self.segment_height = tags[TAG_TILE_LENGTH][0]
+            self.offsets = tags[TAG_TILE_OFFSETS]
+        else:
+            self.segment_width = self.width
+            self.segment_height = min(tags.get(TAG_ROWS_PER_STRIP, [self.height])[0], self.height)
+            self.offsets = tags[TAG_STRIP_OFFSETS]
+        self.segments_across = -(-self.width // self.segment_width)
+
+    @staticmethod
+    def read_ifd(f, byte_order, offset, big):
+        tags = {}
+        f.seek(offset)
+        count_format, entry_size, value_size = ('Q', 20, 8) if big else ('H', 12, 4)
+        num_entries = struct.unpack(byte_order + count_format, f.read(struct.calcsize(count_format)))[0]
+        entries = f.read(num_entries * entry_size)
+        for i in range(num_entries):
+            entry = entries[i * entry_size:(i + 1) * entry_size]
+            tag, field_type = struct.unpack(byte_order + 'HH', entry[:4])
+            count = struct.unpack(byte_order + ('Q' if big else 'I'), entry[4:4 + (8 if big else 4)])[0]
+            if field_type not in TIFF_TYPES:
+                continue
+            fmt, size = TIFF_TYPES[field_type]
+            value = entry[entry_size - value_size:]
+            if count * size > value_size:
+                pos = f.tell()
+                f.seek(struct.unpack(byte_order + ('Q' if big else 'I'), value)[0])
+                value = f.read(count * size)
+                f.seek(pos)
+            tags[tag] = list(struct.unpack(byte_order + fmt * count, value[:count * size]))
+
+        return tags
+
+    def segment(self, idx: int, rows: int, cols: int):
+        # Returns the (decoded) rows x cols pixels of a strip or tile:
+        row_bytes = -(-cols // 8) if self.bits == 1 else cols * self.samples
+        seg = self.data[self.offsets[idx]:self.offsets[idx] + rows * row_bytes].reshape(rows, row_bytes)
+        if self.bits == 1:
+            seg = np.unpackbits(seg, axis=1, count=cols)
+            # Convert to 0 / 255 (for WhiteIsZero, 0 bits are white):
+            seg = (seg ^ 1 if self.photometric == 0 else seg) * np.uint8(255)
+            return seg
+        seg = seg.reshape(rows, cols, self.samples)
+        if self.photometric == 0:
+            seg = 255 - seg
+        return seg
+
+    def read_rows(self, y0: int, y1: int) -> np.ndarray:
+        band = np.empty((y1 - y0, self.width, self.samples), np.uint8)
+        sh, sw = self.segment_height, self.segment_width
+        for seg_row in range(y0 // sh, -(-y1 // sh)):
+            seg_y0 = seg_row * sh
+            # The segments at the bottom and right border can be padded (tiles) or cut off (strips):
+            rows = sh if sw != self.width else min(sh, self.height - seg_y0)
+            r0, r1 = max(y0, seg_y0), min(y1, seg_y0 + sh, self.height)
+            for seg_col in range(self.segments_across):
+                x0 = seg_col * sw
+                seg = self.segment(seg_row * self.segments_across + seg_col, rows, sw)
+                cols = min(sw, self.width - x0)
+                band[r0 - y0:r1 - y0, x0:x0 + cols] = seg[r0 - seg_y0:r1 - seg_y0, :cols].reshape(r1 - r0, cols, self.samples)
+
+        if self.samples == 1:
+            return band[:, :, 0]
+        # OpenCV channel order:
+        band = band[:, :, :3]
+        return np.ascontiguousarray(band[:, :, ::-1])
+
+class ArrayReader:
+    """Reads rows of an array, e.g. a memory mapped .npy file or a decoded image."""
+
+    def __init__(self, array):
+        self.array = array
+        self.shape = array.shape
+
+    def read_rows(self, y0: int, y1: int) -> np.ndarray:
+        return np.asarray(self.array[y0:y1])
+
+def open_reader(path: str):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.npy':
+        return ArrayReader(np.load(path, mmap_mode='r'))
+    if ext in ('.tif', '.tiff'):
+        try:
+            return TiffReader(path)
+        except UnsupportedTiff:
+            pass
+    # Fall back to a complete decode:
+    img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if img is None:
+        raise Exception('Cannot read the image %s.' % path)
+    if img.ndim == 3 and img.shape[2] == 4:
+        img = img[:, :, :3]
+    return ArrayReader(img)
+
+def img_band(band, fg_type: constants.FGType):
+    # Same channel selection as f_measure.read_img:
+    return f_measure.img_channel(band, fg_type)
+
+def gt_band(band, fg_type: constants.FGType):
+    # Same color conversion as f_measure.read_gt:
+    if fg_type == constants.FGType.REGULAR:
+        if band.ndim == 3:
+            return cv2.cvtColor(np.ascontiguousarray(band), cv2.COLOR_BGR2GRAY)
+        return band
+    if band.ndim == 2:
+        return cv2.cvtColor(np.ascontiguousarray(band), cv2.COLOR_GRAY2BGR)
+    return band
+
+def is_mask(band) -> bool:
+    # .npy files can contain foreground masks (bool or 0/1 integers), the 255 convention only applies to uint8 images:
+    return band.dtype != np.uint8
+
+def gt_band_masks(band, fg_type: constants.FGType):
+    """Returns the tuple (fg, ignore) of a ground truth band, like f_measure.gt_masks."""
+    if is_mask(band):
+        if band.ndim != 2:
+            raise Exception('Foreground masks must be single channel arrays.')
+        return band != 0, None
+    return f_measure.gt_masks(gt_band(band, fg_type), fg_type)
+
+def dibco_fg(band):
+    # DIBCO convention: the foreground is black (or nonzero in a mask):
+    if is_mask(band):
+        return band != 0
+    return gt_band(band, constants.FGType.REGULAR) < 128
+
+def check_shapes(img_reader, gt_reader, img_path):
+    if img_reader.shape[:2] != gt_reader.shape[:2]:
+        raise Exception('The image %s and the ground truth differ in size.' % img_path)
+
+class TiledMeasure:
+    """Band-wise version of f_measure.PerformanceMeasure."""
+
+    def __init__(self, img_path, gt_path, invert_imgs = False, band_height: int = DEFAULT_BAND_HEIGHT):
+        self.img_path = img_path
+        self.gt_path = gt_path
+        self.invert_imgs = invert_imgs
+        self.band_height = band_height
+
+    def calc(self, img_name: str, gt_name: str, fg_type: constants.FGType = constants.FGType.REGULAR) -> f_measure.PerformanceResult:
+
+        img_reader = open_reader(os.path.join(self.img_path, img_name))
+        gt_reader = open_reader(os.path.join(self.gt_path, gt_name))
+        check_shapes(img_reader, gt_reader, img_name)
+
+        counts = np.zeros(4, np.int64)
+        for y0 in range(0, gt_reader.shape[0], self.band_height):
+            y1 = min(y0 + self.band_height, gt_reader.shape[0])
+            gt, ignore = gt_band_masks(gt_reader.read_rows(y0, y1), fg_type)
+            img = img_band(img_reader.read_rows(y0, y1), fg_type)
+            # The nonzero pixels of a mask are the foreground, i.e. it is not inverted:
+            img = f_measure.img_mask(img, self.invert_imgs and not is_mask(img), ignore)
+            counts += f_measure.confusion_counts(img, gt)
+
+        return f_measure.PerformanceResult.from_counts(*counts)
+
+class TiledDibcoMeasure:
+    """
+    Band-wise version of dibco_measure.DibcoMeasure.
+
+    The weights are read band-wise from the (memory mapped) weight cache, which also holds the binary copies of the text
+    weight files. Note that the weights of a ground truth image without weight files, which are not in the cache yet,
+    are computed from the complete image, i.e. the memory is not bounded by the band size in this case.
+    """
+
+    def __init__(self, weight_cache_dir: str = None, band_height: int = DEFAULT_BAND_HEIGHT, weight_cache_size: int = None):
+        self.weight_cache = dibco_weights.WeightCache(weight_cache_dir, weight_cache_size)
+        # The bands have to be aligned to the blocks of the DRD:
+        self.band_height = max(dibco_measure.DRD_BLOCK_SIZE, band_height - band_height % dibco_measure.DRD_BLOCK_SIZE)
+
+    def calc(self, img_path: str, gt_path: str, recall_weight_path: str = None, precision_weight_path: str = None) -> dibco_measure.DibcoResult:
+
+        img_reader = open_reader(img_path)
+        gt_reader = open_reader(gt_path)
+        check_shapes(img_reader, gt_reader, img_path)
+        height = gt_reader.shape[0]
+
+        if recall_weight_path and precision_weight_path:
+            recall_weights = self.weight_cache.read_weights(recall_weight_path, gt_reader.shape[:2])
+            precision_weights = self.weight_cache.read_weights(precision_weight_path, gt_reader.shape[:2])
+        else:
+            # The weights are computed from the foreground of the complete page (e.g. of a .npy mask):
+            recall_weights, precision_weights = self.weight_cache.get(gt_path, lambda: dibco_fg(gt_reader.read_rows(0, height)))
+
+        # The DRD needs the ground truth in the 5x5 neighbourhood of each pixel:
+        halo = dibco_measure.DRD_WINDOW_SIZE // 2
+        sums = np.zeros(dibco_measure.NUM_SUMS)
+        for y0 in range(0, height, self.band_height):
+            y1 = min(y0 + self.band_height, height)
+            c0, c1 = max(0, y0 - halo), min(height, y1 + halo)
+            gt_context = dibco_fg(gt_reader.read_rows(c0, c1))
+            gt = gt_context[y0 - c0:y1 - c0]
+            img = dibco_fg(img_reader.read_rows(y0, y1))
+            sums += dibco_measure.dibco_sums(img, gt, recall_weights[y0:y1], precision_weights[y0:y1], gt_context, y0 - c0)
+
+        m = dibco_measure.dibco_result_from_sums(sums)
+        m.file_name = os.path.basename(img_path)
+
+        return m
@@ -0,0 +1,180 @@
+"""Watch mode: evaluates new and changed result images continuously (binar_eval.py --watch SECONDS).
+
+The watched folders are polled every interval seconds with os.scandir, which yields the modification time and size of
+the images without a glob per folder. Polling works on network file systems, which do not report changes to inotify.
+An image is evaluated, once its modification time and size are unchanged since the previous poll (or it was written
+more than an interval ago), so that images are not read while they are written. Hence, a written image is scored
+after at most two intervals (plus the evaluation time of the batch).
+
+The FolderMeasures of the folders are kept alive, so that the decoded ground truth stays in their gt_cache.GTCache, and
+the results of each folder are kept in a result_store.ResultStore, whose rows are replaced or removed if an image
+changes or is deleted. After each batch, the CSV file is rewritten.
+"""
+
+import os
+import glob
+import time
+import signal
+import fnmatch
+import result_store
+
+def scan_images(folder: str, extensions):
+    """Returns the dict image path -> (modification time, size) of the (non-pseudo) images in the folder."""
+    images = {}
+    try:
+        entries = list(os.scandir(folder))
+    except FileNotFoundError:
+        return images
+
+    for entry in entries:
+        # Hidden files are skipped like by glob, e.g. temporary files of atomic writes:
+        if entry.name.startswith('.') or 'pseudo' in entry.name:
+            continue
+        if not any(fnmatch.fnmatchcase(entry.name, ext) for ext in extensions):
+            continue
+        try:
+            st = entry.stat()
+        except FileNotFoundError:
+            continue
+        images[entry.path] = (st.st_mtime_ns, st.st_size)
+
+    return images
+
+class WatchedFolder:
+
+    def __init__(self, measure):
+        self.measure = measure
+        self.results = result_store.ResultStore(measure.result_fields())
+        # Row of each image in results:
+        self.rows = {}
+        # (modification time, size) of the images at the previous poll and when they were evaluated:
+        self.seen = {}
+        self.evaluated = {}
+
+    def update(self, img_names, store):
+        """Merges the results of the evaluated images, images without a result (e.g. an empty ground truth) are removed."""
+        new = dict(zip(store.img_names, range(len(store))))
+        for img_name in img_names:
+            row = self.rows.get(img_name)
+            if img_name in new:
+                result = ResultRow(store, new[img_name])
+                if row is None:
+                    self.rows[img_name] = len(self.results)
+                    self.results.append(img_name, result)
+                else:
+                    self.results.replace(row, result)
+            elif row is not None:
+                self.remove(img_name)
+
+    def remove(self, img_name):
+        row = self.rows.pop(img_name)
+        last_name = self.results.img_names[-1]
+        self.results.remove(row)
+        if last_name != img_name:
+            self.rows[last_name] = row
+
+class ResultRow:
+    # The metrics of a row of a ResultStore, as attributes (like a PerformanceResult):
+
+    def __init__(self, store, idx):
+        for field in store.fields:
+            setattr(self, field, store.columns[field][idx])
+
+class Watcher:
+
+    def __init__(self, path_img, subfolders: bool, folder_measure, fg_type, write, result_log = None):
+        # folder_measure: creates the FolderMeasure of a folder, write: writes the list of FolderMeasures (the CSV file)
+        self.path_img = path_img
+        self.subfolders = subfolders
+        self.folder_measure = folder_measure
+        self.fg_type = fg_type
+        self.write = write
+        self.result_log = result_log
+        self.folders = {}
+
+    def scan_folders(self):
+        # New subfolders are watched as soon as they are created:
+        if self.subfolders:
+            return sorted(glob.glob(os.path.join(self.path_img, '*', '')))
+        return [self.path_img]
+
+    def poll(self, interval: float):
+        """Evaluates the new and changed images, which are completely written, and returns the number of updates."""
+        num_updates = 0
+        now = time.time_ns()
+        for folder in self.scan_folders():
+            if folder not in self.folders:
+                self.folders[folder] = WatchedFolder(self.folder_measure(folder))
+                if self.result_log is not None:
+                    self.result_log.start_folder(folder)
+            watched = self.folders[folder]
+            measure = watched.measure
+
+            images = scan_images(folder, measure.img_extensions)
+            img_names = sorted(images)
+            if not measure.dibco_metrics:
+                img_names = measure.filter_img_names(img_names)
+            settled = [img_name for img_name in img_names if watched.evaluated.get(img_name) != images[img_name]
+                        and (watched.seen.get(img_name) == images[img_name] or now - images[img_name][0] >= interval * 1e9)]
+            deleted = [img_name for img_name in watched.rows if img_name not in images]
+            watched.seen = images
+
+            for img_name in deleted:
+                watched.remove(img_name)
+            watched.evaluated = {img_name: st for img_name, st in watched.evaluated.items() if img_name in images}
+            if settled:
+                try:
+                    measure.batch_measure(self.fg_type, settled)
+                    watched.update(settled, measure.results)
+                except Exception:
+                    # The images are evaluated one by one, so that a broken image does not drop the results of the others:
+                    self.measure_single(watched, settled)
+                for img_name in settled:
+                    watched.evaluated[img_name] = images[img_name]
+            num_updates += len(settled) + len(deleted)
+
+        return num_updates
+
+    def measure_single(self, watched, img_names):
+        """Evaluates the images separately, a failed image does not affect the results of the others."""
+        for img_name in img_names:
+            try:
+                watched.measure.batch_measure(self.fg_type, [img_name])
+                watched.update([img_name], watched.measure.results)
+            except Exception as e:
+                # A broken image must not stop the watch mode, it is evaluated again once it changes:
+                print('Evaluation of %s failed: %s' % (img_name, e))
+
+    def measures(self):
+        """Returns the FolderMeasures with the current results of the folders (ordered like a single run)."""
+        measures = []
+        for folder in sorted(self.folders):
+            watched = self.folders[folder]
+            if len(watched.results) > 0:
+                watched.measure.set_results(watched.results.sorted())
+                measures.append(watched.measure)
+
+        return measures
+
+    def run(self, interval: float):
+        """Polls the folders until the process is interrupted (Ctrl+C, SIGTERM) and returns the final measures()."""
+        def terminate(signum, frame):
+            raise KeyboardInterrupt()
+        signal.signal(signal.SIGTERM, terminate)
+
+        print('Watching %s every %g s (stop with Ctrl+C)' % (self.path_img, interval))
+        try:
+            while True:
+                start = time.time()
+                num_updates = self.poll(interval)
+                if num_updates > 0:
+                    measures = self.measures()
+                    self.write(measures)
+                    print('%s: %d images updated (%.1f s)' % (time.strftime('%H:%M:%S'), num_updates, time.time() - start))
+                    for measure in measures:
+                        print('%s mean FM: %f (%d images)' % (measure.path_img, measure.mean_fm, len(measure.results)))
+                time.sleep(max(0, interval - (time.time() - start)))
+        except KeyboardInterrupt:
+            print('Watch mode stopped.')
+
+        return self.measures()